@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventory.instrumentation.RequestStatsMiddleware',  # first, so it sees every query of the request
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,7 +57,7 @@ ROOT_URLCONF = 'a_up_inventory_v2.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'inventory.instrumentation.TimedDjangoTemplates',  # DjangoTemplates + render timing
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -140,3 +141,72 @@ LOGIN_URL = '/accounts/login/'
 MEDIA_URL = '/media/'  # URL prefix for media files
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # Local filesystem path where media is stored
 
+
+
+# Background export jobs
+EXPORT_JOB_WORKERS = 2  # threads generating export files in-process
+EXPORT_JOB_TTL = 60 * 60 * 24  # seconds a finished export stays downloadable
+EXPORT_JOB_DIR = os.path.join(BASE_DIR, 'exports')  # outside MEDIA_ROOT: only download_export_job serves these
+EXPORT_JOB_STALE_AFTER = 60 * 60 * 6  # seconds before an unfinished job is presumed lost to a restart and failed
+
+
+# History log writer: 'buffered' queues entries in-process when their transaction
+# commits and writes them with bulk_create from a background thread, woken when
+# each request finishes; 'sync' saves each entry immediately (tests, debugging).
+# A killed process (SIGKILL, OOM) loses the entries not yet written: those of
+# requests finished in the last moments, or up to one flush interval of entries
+# logged outside requests.
+AUDIT_LOG_MODE = 'buffered'
+AUDIT_LOG_FLUSH_INTERVAL = 1.0  # seconds between background flushes
+AUDIT_LOG_BATCH_SIZE = 500  # flush early once this many entries are queued
+
+
+# History log partitions (PostgreSQL): maintain_history_partitions keeps this
+# many months of future partitions ready and drops whole months past retention.
+HISTORY_LOG_PARTITIONS_AHEAD = 3
+HISTORY_LOG_RETENTION_MONTHS = 24
+
+# Cold archive: archive_history_logs moves whole months older than this into
+# compressed column files under HISTORY_ARCHIVE_DIR (kept indefinitely).
+HISTORY_ARCHIVE_AFTER_MONTHS = 12
+HISTORY_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive', 'history')
+
+# Borrow/return PDF receipts are cached on disk per record and content version;
+# the least recently downloaded are evicted once the cache passes the size cap.
+RECEIPT_CACHE_DIR = os.path.join(MEDIA_ROOT, 'receipts')
+RECEIPT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RECEIPT_PRERENDER = True  # render in the background right after a borrow/return commits
+RECEIPT_RENDER_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # xhtml2pdf worker processes; 0 renders inline
+RECEIPT_RENDER_QUEUE = 16  # renders allowed to wait for a worker before new requests are turned away
+RECEIPT_RENDER_WAIT = 10  # seconds a download waits for a queue slot before answering 503
+RECEIPT_BUNDLE_MAX = 1000  # receipts per bundle; ZIPs are streamed a receipt at a time
+RECEIPT_BUNDLE_PDF_MAX = 100  # receipts per merged PDF, which is assembled in memory
+
+# Device photos get scaled-down WebP/AVIF copies in device_images/derived/,
+# built in the background after upload (build_image_derivatives backfills).
+DEVICE_IMAGE_SIZES = {'thumb': (160, 160), 'medium': (640, 640)}  # bounding boxes in pixels
+DEVICE_IMAGE_QUALITY = {'webp': 80, 'avif': 55}
+# Device images are stored once per content hash; a file no device uses is deleted
+# unless it was (re-)uploaded within this many seconds and may be about to be used.
+DEVICE_IMAGE_GC_GRACE = 3600
+# Device list filter counts are cached per filter set; any device write starts a
+# new cache generation, so this only bounds how long unused entries are kept.
+DEVICE_FACET_CACHE_TIMEOUT = 600
+
+
+# Request instrumentation: query count, DB/template/total time per request, sent
+# as X-Query-Count / Server-Timing headers with DEBUG on and logged as JSON on the
+# inventory.requests logger otherwise. Views over their @query_budget log a
+# warning; with QUERY_BUDGETS_STRICT (the test suite) they raise instead.
+QUERY_BUDGETS_STRICT = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'inventory.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
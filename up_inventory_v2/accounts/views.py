@@ -6,9 +6,10 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from .models import CustomUser
 from inventory.models import StaffRecord
 from inventory.utils import log_action
+from inventory.instrumentation import query_budget
+from inventory.dates import filter_request_days
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from datetime import datetime
 from django.db import models
 
 def login_view(request):
@@ -30,6 +31,7 @@ def login_view(request):
         form = LoginForm()
     return render(request, 'login.html', {'form': form})
 
+@query_budget(6)
 @login_required
 def create_user_view(request):
     query = request.GET.get("q", "")
@@ -47,25 +49,7 @@ def create_user_view(request):
         )
     
  
-    if start_date and end_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            users = users.filter(date_joined__date__range=[start_date, end_date])
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
-    elif start_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            users = users.filter(date_joined__date__gte=start_date)
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
-    elif end_date:
-        try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            users = users.filter(date_joined__date__lte=end_date)
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
+    users = filter_request_days(request, users, 'date_joined')
 
 
     if request.method == 'POST' and 'create_user' in request.POST:
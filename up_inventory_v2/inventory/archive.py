@@ -0,0 +1,612 @@
+"""
+Cold storage for old HistoryLog rows.
+
+Each archived month is one file, HISTORY_ARCHIVE_DIR/history_YYYY_MM.hlar,
+laid out column by column in row groups:
+
+    MAGIC | column blocks ... | footer (JSON) | footer length (<Q) | MAGIC
+
+Every block is one zlib-compressed column of one row group: integers as
+little-endian int64 arrays, strings as a JSON list. The footer records each
+block's offset and length plus per-group statistics (timestamp range and the
+distinct action / model / user values), so a reader can skip whole groups and
+decompress only the columns a filter needs, straight from a memory map.
+"""
+import datetime
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .facets import forget_rows
+from .models import HistoryLog
+from .pagination import estimate_count
+from .partitions import (
+    DEFAULT_PARTITION, LOCK_TIMEOUT, TABLE, add_months, drop_empty_partitions_before, is_partitioned,
+    list_partitions, month_start, partition_name,
+)
+
+MAGIC = b'HLAR\x01'
+ROW_GROUP_SIZE = 8192
+NULL_INT = -2 ** 63
+
+# Per-row-group match counts of a filter are cached under the file's mtime and
+# size: files only change when archive_month() replaces them.
+COUNT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# (column, kind, HistoryLog lookup used to fill it)
+COLUMNS = [
+    ('id', 'int', 'id'),
+    ('timestamp', 'int', 'timestamp'),
+    ('user_id', 'int', 'user_id'),
+    ('user_email', 'str', 'user__email'),
+    ('action', 'str', 'action'),
+    ('model_name', 'str', 'model_name'),
+    ('object_id', 'int', 'object_id'),
+    ('details', 'str', 'details'),
+    ('ip_address', 'str', 'ip_address'),
+]
+COLUMN_NAMES = [name for name, _, _ in COLUMNS]
+COLUMN_KINDS = {name: kind for name, kind, _ in COLUMNS}
+TIMESTAMP = COLUMN_NAMES.index('timestamp')
+ROW_ID = COLUMN_NAMES.index('id')
+
+# Low-cardinality columns whose distinct values are kept per row group.
+INDEXED_COLUMNS = ('action', 'model_name', 'user_email')
+
+_FILE_NAME = re.compile(r'^history_(\d{4})_(\d{2})\.hlar$')
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def to_micros(value):
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_micros(value):
+    return _EPOCH + datetime.timedelta(microseconds=value)
+
+
+def archive_dir():
+    return settings.HISTORY_ARCHIVE_DIR
+
+
+def archive_path(month):
+    return os.path.join(archive_dir(), f'history_{month.year:04d}_{month.month:02d}.hlar')
+
+
+def archived_months():
+    """First day of every archived month, newest first."""
+    try:
+        names = os.listdir(archive_dir())
+    except FileNotFoundError:
+        return []
+    months = []
+    for name in names:
+        match = _FILE_NAME.match(name)
+        if match:
+            months.append(datetime.datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=datetime.timezone.utc))
+    return sorted(months, reverse=True)
+
+
+def _encode(kind, values):
+    if kind == 'int':
+        data = array('q', (NULL_INT if value is None else value for value in values))
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return zlib.compress(data.tobytes(), 6)
+    return zlib.compress(json.dumps(values, separators=(',', ':')).encode(), 6)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def _decode(kind, block):
+    raw = zlib.decompress(block)
+    if kind == 'int':
+        data = array('q')
+        data.frombytes(raw)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return [None if value == NULL_INT else value for value in data]
+    return json.loads(raw)
+
+
+class ArchiveWriter:
+    """Write rows (tuples in COLUMN_NAMES order, sorted by timestamp) to one file."""
+
+    def __init__(self, fh, row_group_size=ROW_GROUP_SIZE):
+        self._fh = fh
+        self._row_group_size = row_group_size
+        self._rows = []
+        self._groups = []
+        self._fh.write(MAGIC)
+        self.rows_written = 0
+
+    def add(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self._row_group_size:
+            self._flush_group()
+
+    def close(self):
+        self._flush_group()
+        footer = json.dumps({'columns': COLUMN_NAMES, 'groups': self._groups}).encode()
+        self._fh.write(footer)
+        self._fh.write(struct.pack('<Q', len(footer)))
+        self._fh.write(MAGIC)
+
+    def _flush_group(self):
+        if not self._rows:
+            return
+        columns = list(zip(*self._rows))
+        group = {
+            'rows': len(self._rows),
+            'ts_min': min(columns[TIMESTAMP]),
+            'ts_max': max(columns[TIMESTAMP]),
+            'values': {
+                name: sorted({value for value in columns[COLUMN_NAMES.index(name)] if value is not None})
+                for name in INDEXED_COLUMNS
+            },
+            'blocks': {},
+        }
+        for index, name in enumerate(COLUMN_NAMES):
+            block = _encode(COLUMN_KINDS[name], list(columns[index]))
+            group['blocks'][name] = [self._fh.tell(), len(block)]
+            self._fh.write(block)
+        self._groups.append(group)
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+
+class ArchiveFilter:
+    """
+    Row filter for archive scans. `start` is inclusive and `end` exclusive,
+    both aware datetimes; the other fields match exactly.
+    """
+
+    def __init__(self, action=None, model_name=None, user_email=None, start=None, end=None):
+        self.equals = {
+            name: value for name, value in
+            (('action', action), ('model_name', model_name), ('user_email', user_email))
+            if value
+        }
+        self.start = to_micros(start) if start else None
+        self.end = to_micros(end) if end else None
+
+    def key(self):
+        return (sorted(self.equals.items()), self.start, self.end)
+
+    def overlaps_month(self, month):
+        if self.start is not None and to_micros(add_months(month, 1)) <= self.start:
+            return False
+        if self.end is not None and to_micros(month) >= self.end:
+            return False
+        return True
+
+    def may_match(self, group):
+        if self.start is not None and group['ts_max'] < self.start:
+            return False
+        if self.end is not None and group['ts_min'] >= self.end:
+            return False
+        return all(value in group['values'][name] for name, value in self.equals.items())
+
+    def covers(self, group):
+        """True when every row of the group matches without looking at it."""
+        if self.equals:
+            return False
+        return (
+            (self.start is None or group['ts_min'] >= self.start) and
+            (self.end is None or group['ts_max'] < self.end)
+        )
+
+    def matching(self, group, column):
+        """Indices of the rows in `group` that pass the filter."""
+        indices = range(group['rows'])
+        if self.start is not None or self.end is not None:
+            timestamps = column('timestamp')
+            indices = [
+                i for i in indices
+                if (self.start is None or timestamps[i] >= self.start) and
+                   (self.end is None or timestamps[i] < self.end)
+            ]
+        for name, value in self.equals.items():
+            values = column(name)
+            indices = [i for i in indices if values[i] == value]
+        return list(indices)
+
+
+class ArchiveFile:
+    """Memory-mapped, read-only view of one archive file."""
+
+    def __init__(self, path):
+        self._fh = open(path, 'rb')
+        self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC or self._mm[-len(MAGIC):] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a history archive")
+        tail = len(self._mm) - len(MAGIC) - 8
+        (footer_length,) = struct.unpack('<Q', self._mm[tail:tail + 8])
+        footer = json.loads(self._mm[tail - footer_length:tail])
+        self.groups = footer['groups']
+
+    def close(self):
+        self._mm.close()
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _reader(self, group):
+        cache = {}
+
+        def column(name):
+            if name not in cache:
+                offset, length = group['blocks'][name]
+                cache[name] = _decode(COLUMN_KINDS[name], self._mm[offset:offset + length])
+            return cache[name]
+        return column
+
+    def group_counts(self, row_filter):
+        """The number of matching rows in each row group, in file order."""
+        counts = []
+        for group in self.groups:
+            if not row_filter.may_match(group):
+                counts.append(0)
+            elif row_filter.covers(group):
+                counts.append(group['rows'])
+            else:
+                counts.append(len(row_filter.matching(group, self._reader(group))))
+        return counts
+
+    def count(self, row_filter):
+        return sum(self.group_counts(row_filter))
+
+    def scan(self, row_filter, reverse=False, skip=0, counts=None):
+        """
+        Yield matching rows as tuples in COLUMN_NAMES order, leaving out the
+        first `skip`. Given this file's group_counts(), whole groups inside
+        the skipped part are passed over without being decompressed.
+        """
+        if counts is None or len(counts) != len(self.groups):
+            counts = [None] * len(self.groups)
+        groups = list(zip(self.groups, counts))
+        if reverse:
+            groups.reverse()
+        for group, count in groups:
+            if count is not None and count <= skip:
+                skip -= count
+                continue
+            if not row_filter.may_match(group):
+                continue
+            column = self._reader(group)
+            indices = row_filter.matching(group, column)
+            if reverse:
+                indices.reverse()
+            if skip:
+                indices, skip = indices[skip:], max(skip - len(indices), 0)
+            if not indices:
+                continue
+            columns = [column(name) for name in COLUMN_NAMES]
+            for i in indices:
+                yield tuple(values[i] for values in columns)
+
+
+class ArchivedLog:
+    """Read-only stand-in for a HistoryLog row served from the archive."""
+
+    archived = True
+    _action_labels = dict(HistoryLog.ACTION_CHOICES)
+
+    def __init__(self, row):
+        values = dict(zip(COLUMN_NAMES, row))
+        self.id = values['id']
+        self.timestamp = from_micros(values['timestamp'])
+        self.user_id = values['user_id']
+        self.user_email = values['user_email']
+        self.action = values['action']
+        self.model_name = values['model_name']
+        self.object_id = values['object_id']
+        self.details = values['details']
+        self.ip_address = values['ip_address']
+
+    @property
+    def user(self):
+        return {'email': self.user_email} if self.user_email else None
+
+    def get_action_display(self):
+        return self._action_labels.get(self.action, self.action)
+
+
+class ArchiveSearch:
+    """
+    Filtered, newest-first view over every archive file that can hold
+    matching rows. Supports count() and slicing so it can sit behind a
+    Paginator.
+    """
+
+    def __init__(self, action=None, model_name=None, user_email=None, start=None, end=None):
+        self.filter = ArchiveFilter(action, model_name, user_email, start, end)
+        months = archived_months()
+        self.months = [month for month in months if self.filter.overlaps_month(month)]
+        # Every archived row is older than this; hot rows before it arrived
+        # (or were back-dated) after their month was archived.
+        self.upper_bound = add_months(months[0], 1) if months else None
+        self._counts = {}
+
+    def group_counts(self, month):
+        """ArchiveFile.group_counts() of `month`'s file, cached across requests."""
+        if month not in self._counts:
+            path = archive_path(month)
+            stat = os.stat(path)
+            key = 'history-archive-counts:' + hashlib.sha1(
+                repr((path, stat.st_mtime_ns, stat.st_size, self.filter.key())).encode()
+            ).hexdigest()
+            counts = cache.get(key)
+            if counts is None:
+                with ArchiveFile(path) as archive:
+                    counts = archive.group_counts(self.filter)
+                cache.set(key, counts, COUNT_CACHE_TIMEOUT)
+            self._counts[month] = counts
+        return self._counts[month]
+
+    def count(self):
+        return sum(sum(self.group_counts(month)) for month in self.months)
+
+    def __len__(self):
+        return self.count()
+
+    def _scan(self, skip=0):
+        for month in self.months:
+            counts = self.group_counts(month) if skip else None
+            if counts is not None and sum(counts) <= skip:
+                skip -= sum(counts)
+                continue
+            with ArchiveFile(archive_path(month)) as archive:
+                yield from archive.scan(self.filter, reverse=True, skip=skip, counts=counts)
+            skip = 0
+
+    def rows(self, *lookups):
+        """
+        Matching rows, newest first, as tuples of the given HistoryLog
+        lookups (e.g. 'user__email'), like queryset.values_list().
+        """
+        columns = {lookup: index for index, (_, _, lookup) in enumerate(COLUMNS)}
+        indices = [columns[lookup] for lookup in lookups]
+        for row in self._scan():
+            yield tuple(from_micros(row[i]) if i == TIMESTAMP else row[i] for i in indices)
+
+    def __iter__(self):
+        return (ArchivedLog(row) for row in self._scan())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = index.start or 0
+            rows = self._scan(skip=start)
+            if index.stop is not None:
+                rows = islice(rows, max(index.stop - start, 0))
+            return [ArchivedLog(row) for row in rows]
+        return ArchivedLog(next(self._scan(skip=index)))
+
+
+def _newest_first(log):
+    return (log.timestamp, log.id)
+
+
+class LogsWithArchive:
+    """
+    A HistoryLog queryset merged with the archived rows that match the same
+    filters, newest first. Hot rows older than the archive's upper bound
+    (late or back-dated entries waiting for the next archive run) are few,
+    so they are fetched once and merged with the archive by timestamp;
+    every other hot row is newer than every archived one and comes first.
+
+    The newer hot rows are only counted when a slice starts past them; a
+    page that runs off their end tells us their number for free.
+    """
+
+    def __init__(self, queryset, archive):
+        self.queryset = queryset
+        self.archive = archive
+        self._late_queryset = None
+        self._late = None
+        self._hot_count = None
+        if archive.upper_bound is not None:
+            self.queryset = queryset.filter(timestamp__gte=archive.upper_bound)
+            self._late_queryset = queryset.filter(timestamp__lt=archive.upper_bound)
+
+    def _hot(self):
+        if self._hot_count is None:
+            self._hot_count = self.queryset.count()
+        return self._hot_count
+
+    def _late_rows(self):
+        if self._late is None:
+            late = list(self._late_queryset) if self._late_queryset is not None else []
+            self._late = sorted(late, key=_newest_first, reverse=True)
+        return self._late
+
+    def count(self):
+        return self._hot() + len(self._late_rows()) + self.archive.count()
+
+    def estimate_count(self):
+        """Planner estimate of the hot rows plus the late and (cached) archived counts."""
+        if self._hot_count is not None:
+            return self.count()
+        hot = estimate_count(self.queryset)
+        return None if hot is None else hot + len(self._late_rows()) + self.archive.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        items = []
+        if self._hot_count is None or start < self._hot_count:
+            items = list(self.queryset[start:stop])
+            if len(items) < stop - start and (items or start == 0):
+                self._hot_count = start + len(items)
+        if len(items) < stop - start:
+            offset = start + len(items) - self._hot()
+            items += self._older(offset, stop - self._hot())
+        return items
+
+    def _older(self, start, stop):
+        """Rows start:stop of the late hot rows merged with the archive."""
+        late = self._late_rows()
+        skipped = max(start - len(late), 0)
+        archived = self.archive[skipped:stop]
+        if skipped:
+            if not archived:
+                return []
+            # Exactly `skipped` archived rows precede archived[0], and so do
+            # the late rows newer than it.
+            newer = sum(1 for log in late if _newest_first(log) > _newest_first(archived[0]))
+            late = late[newer:]
+            start, stop = start - skipped - newer, stop - skipped - newer
+        merged = heapq.merge(late, archived, key=_newest_first, reverse=True)
+        return list(islice(merged, start, stop))
+
+
+def _archived_rows(path):
+    with ArchiveFile(path) as archive:
+        yield from archive.scan(ArchiveFilter())
+
+
+def _database_rows(start, end):
+    logs = HistoryLog.objects.filter(timestamp__gte=start, timestamp__lt=end).order_by('timestamp', 'id')
+    for row in logs.values_list(*[lookup for _, _, lookup in COLUMNS]).iterator(chunk_size=2000):
+        row = list(row)
+        row[TIMESTAMP] = to_micros(row[TIMESTAMP])
+        yield tuple(row)
+
+
+def archive_month(month):
+    """
+    Write every hot row of `month` to its archive file, merging with the
+    rows already archived for that month (late arrivals). Returns the number
+    of rows in the file. The database rows are not deleted here.
+
+    The new file is read back before it replaces the old one; ArchiveError
+    is raised if it does not hold every row of the month.
+    """
+    path = archive_path(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    end = add_months(month, 1)
+    read = 0
+
+    def database_rows():
+        nonlocal read
+        for row in _database_rows(month, end):
+            read += 1
+            yield row
+
+    sources = [database_rows()]
+    if os.path.exists(path):
+        sources.append(_archived_rows(path))
+
+    key = lambda row: (row[TIMESTAMP], row[ROW_ID])
+    seen = set()
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        writer = ArchiveWriter(fh)
+        # Database rows come first in the merge order, so they win when the
+        # same id is present in both.
+        for row in heapq.merge(*sources, key=key):
+            if row[ROW_ID] in seen:
+                continue
+            seen.add(row[ROW_ID])
+            writer.add(row)
+        writer.close()
+        fh.flush()
+        os.fsync(fh.fileno())
+    try:
+        hot = HistoryLog.objects.filter(timestamp__gte=month, timestamp__lt=end).count()
+        with ArchiveFile(tmp_path) as archive:
+            written = archive.count(ArchiveFilter())
+        if hot != read or written != writer.rows_written or written < read:
+            raise ArchiveError(
+                f'{month:%Y-%m}: {hot} rows in the database, {read} read, '
+                f'{writer.rows_written} written, {written} read back'
+            )
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return writer.rows_written
+
+
+def _lock_month(month):
+    """
+    Block writes to `month`'s rows until the transaction ends, so nothing
+    arrives between archiving them and deleting them. Reads carry on.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+    qn = connection.ops.quote_name
+    if is_partitioned():
+        # Lock the leaves only: a strong lock on the parent would queue
+        # behind (and block) every insert into the current month.
+        tables = [name for name, start in list_partitions() if start == month] + [DEFAULT_PARTITION]
+    else:
+        tables = [TABLE]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(f"LOCK TABLE {', '.join(qn(name) for name in tables)} IN EXCLUSIVE MODE")
+    return tables
+
+
+def archive_history(before):
+    """
+    Move every HistoryLog row from months that end on or before `before` into
+    the archive, then drop those months from the hot table (whole partitions
+    on PostgreSQL). Returns {month: rows in archive file}.
+
+    Each month is archived, checked and deleted in one transaction holding
+    its partition locked; the emptied partitions are dropped at the end. A
+    row that arrives later for an archived month stays hot until the next
+    run merges it in.
+    """
+    cutoff = month_start(before)
+    months = HistoryLog.objects.filter(timestamp__lt=cutoff).dates('timestamp', 'month')
+    qn = connection.ops.quote_name
+    archived = {}
+    for day in months:
+        month = datetime.datetime(day.year, day.month, 1, tzinfo=datetime.timezone.utc)
+        with transaction.atomic():
+            tables = _lock_month(month)
+            archived[month] = archive_month(month)
+            if partition_name(month) in tables:
+                # TRUNCATE fires no trigger on the parent.
+                forget_rows(partition_name(month))
+                with connection.cursor() as cursor:
+                    cursor.execute(f"TRUNCATE {qn(partition_name(month))}")
+            # Stragglers in the default partition (or the whole month when
+            # unpartitioned) go through the parent so the facets follow.
+            HistoryLog.objects.filter(timestamp__gte=month, timestamp__lt=add_months(month, 1)).delete()
+    if archived:
+        drop_empty_partitions_before(cutoff)
+    return archived
+
+
+def archive_cutoff(months=None):
+    if months is None:
+        months = settings.HISTORY_ARCHIVE_AFTER_MONTHS
+    return add_months(month_start(timezone.now()), -months)
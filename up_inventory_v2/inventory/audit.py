@@ -0,0 +1,121 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, IntegrityError, connection, transaction
+
+from .models import HistoryLog
+
+logger = logging.getLogger(__name__)
+
+
+class AuditBuffer:
+    """
+    Process-local queue of HistoryLog rows.
+
+    Entries are written with one bulk_create by a background thread: as soon
+    as the request that logged them has finished, when the batch fills up,
+    every AUDIT_LOG_FLUSH_INTERVAL seconds for entries logged outside a
+    request, and at interpreter exit. Requests no longer pay for an INSERT
+    round trip per logged action. Entries not yet written are lost if the
+    process is killed outright (SIGKILL, OOM): at most the last moments of
+    finished requests, or one flush interval of background logging.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+            full = len(self._entries) >= getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 500)
+            self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if not entries:
+            return 0
+        try:
+            HistoryLog.objects.bulk_create(entries)
+        except DatabaseError:
+            # One bad row (e.g. its user was deleted in the meantime) must
+            # not cost the rest of the batch.
+            for entry in entries:
+                self._save_one(entry)
+        return len(entries)
+
+    def flush_soon(self):
+        """Wake the flusher thread if anything is queued."""
+        if self.pending():
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _save_one(self, entry):
+        entry.pk = None
+        try:
+            entry.save()
+        except IntegrityError:
+            entry.pk = None
+            entry.user = None
+            try:
+                entry.save()
+            except DatabaseError:
+                logger.exception("Dropped audit log entry: %s", entry.details)
+        except DatabaseError:
+            logger.exception("Dropped audit log entry: %s", entry.details)
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='audit-log-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 1.0)
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit log flush failed")
+            finally:
+                connection.close()
+
+
+audit_buffer = AuditBuffer()
+atexit.register(audit_buffer.flush)
+
+
+def _flush_after_request(**kwargs):
+    audit_buffer.flush_soon()
+
+
+request_finished.connect(_flush_after_request, dispatch_uid='inventory.audit.flush_after_request')
+
+
+def write_entry(entry):
+    """
+    Queue a HistoryLog instance once the current transaction commits (right
+    away outside one), so an action that rolls back leaves no entry; or save
+    it in the transaction when AUDIT_LOG_MODE is 'sync' (used by the test
+    suite).
+    """
+    if getattr(settings, 'AUDIT_LOG_MODE', 'buffered') == 'sync':
+        entry.save()
+    else:
+        transaction.on_commit(lambda: audit_buffer.add(entry))
+
+
+def flush_audit_log():
+    return audit_buffer.flush()
@@ -0,0 +1,138 @@
+"""
+View benchmarks: run the list, export, dashboard and PDF views through the
+Django test client against whatever data is in the database (see the
+generate_data command) and compare the numbers with a saved baseline.
+"""
+import json
+import math
+import statistics
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.utils import timezone
+
+from .models import BorrowRecord, StaffRecord
+from .partitions import add_months, month_start
+
+Benchmark = namedtuple('Benchmark', ['name', 'method', 'path', 'data'])
+
+
+def default_benchmarks():
+    """The benchmarked requests; record and staff ids are picked from the data."""
+    month = month_start(timezone.now())
+    last_month = {'date_from': f'{add_months(month, -1):%Y-%m-%d}', 'date_to': f'{month:%Y-%m-%d}'}
+    borrowed = BorrowRecord.objects.filter(date_returned__isnull=True).order_by('-pk').values_list('pk', flat=True).first()
+    returned = BorrowRecord.objects.filter(date_returned__isnull=False).order_by('-pk').values_list('pk', flat=True).first()
+    staff = (
+        StaffRecord.objects.filter(borrowrecord__date_returned__isnull=True)
+        .order_by('-pk').values_list('pk', flat=True).first()
+    )
+
+    benchmarks = [
+        Benchmark('dashboard', 'get', '/dashboard', {}),
+        Benchmark('inventory', 'get', '/inventory', {}),
+        Benchmark('inventory search', 'get', '/inventory', {'q': 'LAPTOP'}),
+        Benchmark('staff', 'get', '/staff/', {}),
+        Benchmark('staff search', 'get', '/staff/', {'q': 'Santos'}),
+        Benchmark('departments', 'get', '/departments/', {}),
+        Benchmark('devices', 'get', '/devices/', {}),
+        Benchmark('devices search', 'get', '/devices/', {'q': 'LAPTOP', 'status': 'available'}),
+        Benchmark('locations', 'get', '/locations/', {}),
+        Benchmark('history', 'get', '/history/', {}),
+        Benchmark('history filtered', 'get', '/history/', {'action': 'login', **last_month}),
+        Benchmark('users', 'get', '/accounts/users/create/', {}),
+        Benchmark('export staff xlsx', 'get', '/export_staff_excel/', {}),
+        Benchmark('export departments xlsx', 'get', '/departments/export/', {}),
+        Benchmark('export locations xlsx', 'get', '/locations/export/', {}),
+        Benchmark('export devices xlsx', 'get', '/devices/export/', {}),
+        Benchmark('export devices csv', 'get', '/devices/export/', {'format': 'csv'}),
+        Benchmark('export inventory xlsx', 'get', '/inventory/export_excel/', {}),
+        Benchmark('export inventory csv', 'get', '/inventory/export_excel/', {'format': 'csv'}),
+        Benchmark('export history month xlsx', 'get', '/history/export/', last_month),
+        Benchmark('export history month csv', 'get', '/history/export/', {'format': 'csv', **last_month}),
+    ]
+    if borrowed:
+        benchmarks.append(Benchmark(
+            'pdf borrowed', 'post', '/download-inventory-pdf/', {'record_id': borrowed, 'record_type': 'borrowed'}
+        ))
+    if returned:
+        benchmarks.append(Benchmark(
+            'pdf returned', 'post', '/download-inventory-pdf/', {'record_id': returned, 'record_type': 'returned'}
+        ))
+    if staff:
+        benchmarks.append(Benchmark('receipt bundle zip', 'get', '/receipts/bundle/', {'staff': staff, 'open': '1'}))
+    return benchmarks
+
+
+def _fetch(client, benchmark):
+    response = getattr(client, benchmark.method)(benchmark.path, benchmark.data)
+    # Streaming responses only do their work while being consumed; the test
+    # client closes the response once it has been.
+    size = sum(len(chunk) for chunk in response.streaming_content) if response.streaming else len(response.content)
+    return response, size
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def run_benchmark(client, benchmark, runs=10, warmup=1):
+    """
+    Time `runs` requests after `warmup` unmeasured ones, then make one more
+    under tracemalloc for the peak Python heap (kept separate because
+    tracing slows everything down).
+    """
+    for _ in range(warmup):
+        _fetch(client, benchmark)
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response, size = _fetch(client, benchmark)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        _fetch(client, benchmark)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stats = getattr(response, 'request_stats', None)
+    return {
+        'status': response.status_code,
+        'p50_ms': round(statistics.median(timings), 1),
+        'p95_ms': round(percentile(timings, 0.95), 1),
+        'queries': stats.queries if stats else None,
+        'peak_kb': round(peak / 1024),
+        'bytes': size,
+    }
+
+
+def load_baseline(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)['results']
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as fh:
+        json.dump({'created': timezone.now().isoformat(), 'results': results}, fh, indent=2, sort_keys=True)
+
+
+def regressions(result, baseline, threshold):
+    """What got worse than `baseline` by more than `threshold` (a ratio)."""
+    if not baseline:
+        return []
+    found = []
+    if result['p50_ms'] > baseline['p50_ms'] * threshold:
+        found.append(f"p50 {baseline['p50_ms']} -> {result['p50_ms']} ms")
+    if result['peak_kb'] > baseline['peak_kb'] * threshold:
+        found.append(f"peak {baseline['peak_kb']} -> {result['peak_kb']} KB")
+    if result['queries'] is not None and baseline.get('queries') is not None and result['queries'] > baseline['queries']:
+        found.append(f"queries {baseline['queries']} -> {result['queries']}")
+    return found
@@ -0,0 +1,182 @@
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import BorrowRecord, Device, StaffRecord
+from .utils import record_action
+
+BulkResult = namedtuple('BulkResult', ['done', 'errors'])
+
+RETURN_STATUSES = ('available', 'damaged', 'maintenance', 'lost', 'condemned')
+
+
+class DeviceUnavailable(Exception):
+    pass
+
+
+class AlreadyReturned(Exception):
+    pass
+
+
+def issue_device(record):
+    """
+    Save an unsaved BorrowRecord and mark its device borrowed, or raise
+    DeviceUnavailable if someone else got there first.
+
+    The device is claimed with a conditional UPDATE ... WHERE status =
+    'available', which row-locks it and re-checks the condition after any
+    concurrent claim commits, so of two simultaneous requests exactly one
+    updates a row. The unique_open_borrow_per_device constraint backs this
+    up for writers that bypass this function.
+    """
+    device = record.device
+    try:
+        with transaction.atomic():
+            claimed = Device.objects.filter(
+                pk=device.pk, status='available', current_borrow__isnull=True
+            ).update(status='borrowed')
+            if not claimed:
+                raise DeviceUnavailable(f"{device} has just been issued or is no longer available.")
+            record.save()
+            Device.objects.filter(pk=device.pk).update(current_borrow=record)
+    except IntegrityError:
+        raise DeviceUnavailable(f"{device} already has an open borrow record.")
+    device.status = 'borrowed'
+    device.current_borrow = record
+    return record
+
+
+def return_record(record, device_status, remarks=''):
+    """
+    Close an open BorrowRecord and set its device's condition, or raise
+    AlreadyReturned if a concurrent return closed it first. Only the
+    changed columns are written, so concurrent edits to other fields of the
+    device survive.
+    """
+    if device_status not in RETURN_STATUSES:
+        raise ValueError(f"Invalid device status: {device_status}")
+
+    now = timezone.now()
+    with transaction.atomic():
+        closed = BorrowRecord.objects.filter(pk=record.pk, date_returned__isnull=True).update(
+            date_returned=now, remarks=remarks
+        )
+        if not closed:
+            raise AlreadyReturned("This record has already been returned.")
+        Device.objects.filter(pk=record.device_id).update(status=device_status, current_borrow=None)
+    record.date_returned = now
+    record.remarks = remarks
+    record.device.status = device_status
+    record.device.current_borrow = None
+    return record
+
+
+def bulk_issue(pairs, pr_number, remarks='', user=None, ip_address=None):
+    """
+    Issue many devices in one transaction. `pairs` is a list of
+    (staff_id, device_id).
+
+    The devices are locked with SELECT ... FOR UPDATE (in id order, so two
+    batches can't deadlock), the records are written with one bulk_create
+    and the devices with one bulk_update, and a single HistoryLog entry
+    covers the batch. Pairs that can't be issued are skipped and returned as
+    (line number, message).
+    """
+    errors = []
+    seen = set()
+    wanted = []
+    for line, (staff_id, device_id) in enumerate(pairs, start=1):
+        if device_id in seen:
+            errors.append((line, "device is listed more than once"))
+            continue
+        seen.add(device_id)
+        wanted.append((line, staff_id, device_id))
+
+    with transaction.atomic():
+        devices = Device.objects.select_for_update().filter(pk__in=seen).order_by('pk').in_bulk()
+        staff = StaffRecord.objects.filter(pk__in={staff_id for _, staff_id, _ in wanted}, status='active').in_bulk()
+
+        now = timezone.now()
+        issued = []
+        for line, staff_id, device_id in wanted:
+            device = devices.get(device_id)
+            if device is None:
+                errors.append((line, "device not found"))
+            elif device.status != 'available' or device.current_borrow_id is not None:
+                errors.append((line, f"{device} is not available"))
+            elif staff_id not in staff:
+                errors.append((line, "staff member not found or inactive"))
+            else:
+                issued.append(BorrowRecord(
+                    staff=staff[staff_id], device=device, pr_number=pr_number, remarks=remarks, date_issued=now
+                ))
+
+        if issued:
+            BorrowRecord.objects.bulk_create(issued)
+            for record in issued:
+                record.device.status = 'borrowed'
+                record.device.current_borrow = record
+            Device.objects.bulk_update([record.device for record in issued], ['status', 'current_borrow'])
+
+    if issued:
+        record_action(
+            user,
+            'borrow',
+            'BorrowRecord',
+            details=f"Bulk issued {len(issued)} device(s) under PR {pr_number}: " + ', '.join(
+                f"{record.device.serial_number} to {record.staff.full_name}" for record in issued
+            ),
+            ip_address=ip_address,
+        )
+    return BulkResult(issued, sorted(errors))
+
+
+def bulk_return(record_ids, device_status='available', remarks='', user=None, ip_address=None):
+    """
+    Close many open BorrowRecords in one transaction, locking the records
+    and their devices first. Ids that are unknown or already returned are
+    skipped and returned as (record id, message).
+    """
+    if device_status not in RETURN_STATUSES:
+        raise ValueError(f"Invalid device status: {device_status}")
+
+    errors = []
+    with transaction.atomic():
+        records = (
+            BorrowRecord.objects.select_for_update(of=('self', 'device'))
+            .select_related('device', 'staff')
+            .filter(pk__in=set(record_ids))
+            .order_by('device_id')
+            .in_bulk()
+        )
+        now = timezone.now()
+        returned = []
+        for record_id in dict.fromkeys(record_ids):
+            record = records.get(record_id)
+            if record is None:
+                errors.append((record_id, "record not found"))
+            elif record.date_returned is not None:
+                errors.append((record_id, "already returned"))
+            else:
+                record.date_returned = now
+                record.remarks = remarks
+                record.device.status = device_status
+                record.device.current_borrow = None
+                returned.append(record)
+
+        if returned:
+            BorrowRecord.objects.bulk_update(returned, ['date_returned', 'remarks'])
+            Device.objects.bulk_update([record.device for record in returned], ['status', 'current_borrow'])
+
+    if returned:
+        record_action(
+            user,
+            'return',
+            'BorrowRecord',
+            details=f"Bulk returned {len(returned)} device(s) as {device_status}: " + ', '.join(
+                f"{record.device.serial_number} from {record.staff.full_name}" for record in returned
+            ),
+            ip_address=ip_address,
+        )
+    return BulkResult(returned, errors)
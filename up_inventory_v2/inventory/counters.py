@@ -0,0 +1,106 @@
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import BorrowRecord, DashboardCounter, DashboardCounterDelta, Device, StaffRecord
+
+# The triggers append to inventory_dashboardcounterdelta (migration 0014)
+# rather than update the counter rows. compact_counters(), run periodically by
+# `rebuild_dashboard_counters --compact`, folds the pending deltas into the
+# counters: one session at a time, under an advisory lock keyed on the delta
+# table's oid (the others skip the fold), and upserting in name order. Writers
+# never take part, so nothing here makes them wait.
+COMPACT_SQL = """
+WITH moved AS (
+    DELETE FROM inventory_dashboardcounterdelta
+    WHERE (SELECT pg_try_advisory_xact_lock('inventory_dashboardcounterdelta'::regclass::oid::bigint))
+    RETURNING name, delta
+)
+INSERT INTO inventory_dashboardcounter (name, value)
+SELECT name, SUM(delta) FROM moved GROUP BY name ORDER BY name
+ON CONFLICT (name) DO UPDATE SET value = inventory_dashboardcounter.value + EXCLUDED.value
+"""
+
+# Readers only add up the counter rows and the deltas pending since the last
+# fold; they never write.
+READ_SQL = """
+SELECT name, SUM(value) FROM (
+    SELECT name, value FROM inventory_dashboardcounter
+    UNION ALL
+    SELECT name, delta FROM inventory_dashboardcounterdelta
+) counters
+GROUP BY name
+"""
+
+
+def read_counters():
+    """
+    All dashboard counters as a dict: the counter rows plus whatever deltas
+    are pending.
+    """
+    if connection.vendor != 'postgresql':
+        return dict(DashboardCounter.objects.values_list('name', 'value'))
+    with connection.cursor() as cursor:
+        cursor.execute(READ_SQL)
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+def compact_counters():
+    """
+    Fold the pending deltas into the counter rows so reads stay cheap.
+    Returns the number of counters updated (0 if another session was
+    already folding).
+    """
+    if connection.vendor != 'postgresql':
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(COMPACT_SQL)
+        return cursor.rowcount
+
+
+def device_status_counts(counters):
+    """
+    Per-status device counts in the shape the dashboard template expects,
+    largest first.
+    """
+    counts = [
+        {'status': name.split(':', 1)[1], 'count': value}
+        for name, value in counters.items()
+        if name.startswith('devices:') and value
+    ]
+    return sorted(counts, key=lambda item: -item['count'])
+
+
+def rebuild_counters():
+    """
+    Recompute every counter from the source tables. Writers are blocked for
+    the duration so no trigger increment is lost between the count and the
+    swap.
+    """
+    with transaction.atomic():
+        _lock_sources()
+
+        values = {
+            'devices': Device.objects.count(),
+            'staff': StaffRecord.objects.count(),
+            'staff:active': StaffRecord.objects.filter(status='active').count(),
+            'borrows:open': BorrowRecord.objects.filter(date_returned__isnull=True).count(),
+        }
+        for row in Device.objects.values('status').annotate(count=Count('id')).order_by():
+            values[f"devices:{row['status']}"] = row['count']
+
+        DashboardCounter.objects.all().delete()
+        DashboardCounterDelta.objects.all().delete()
+        DashboardCounter.objects.bulk_create(
+            [DashboardCounter(name=name, value=value) for name, value in values.items()]
+        )
+    return values
+
+
+def _lock_sources():
+    if connection.vendor != 'postgresql':
+        return
+    tables = ', '.join(connection.ops.quote_name(model._meta.db_table) for model in (Device, StaffRecord, BorrowRecord))
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {tables} IN SHARE MODE")
+        # Wait out a fold in progress and make later ones skip theirs.
+        cursor.execute("SELECT pg_advisory_xact_lock('inventory_dashboardcounterdelta'::regclass::oid::bigint)")
@@ -0,0 +1,97 @@
+"""
+Date filters as half-open timestamp ranges.
+
+`created_at__date__gte=...` or `date_issued__year=...` wrap the column in a
+cast or EXTRACT, which no btree index on the column can answer. The filter
+forms send calendar days (YYYY-MM-DD); these helpers turn them into aware
+datetimes at local midnight and compare the column itself:
+`start <= column < end`, where `end` is midnight after the last day.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.contrib import messages
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+INVALID_DATE_MESSAGE = "Invalid date format. Please use YYYY-MM-DD."
+
+
+class InvalidDate(ValueError):
+    pass
+
+
+def parse_day(value):
+    """A date for a YYYY-MM-DD string, None for an empty one."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        day = parse_date(value)
+    except ValueError:  # well formed but not a real day, e.g. 2024-02-30
+        day = None
+    if day is None:
+        raise InvalidDate(value)
+    return day
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(first=None, last=None):
+    """
+    (start, end) covering the days `first`..`last` inclusive. Either may be
+    empty, leaving that side of the range open (None).
+    """
+    first, last = parse_day(first), parse_day(last)
+    return (
+        day_start(first) if first else None,
+        day_start(last + timedelta(days=1)) if last else None,
+    )
+
+
+def period_range(year, month=None, day=None):
+    """(start, end) of a calendar year, or a month or day within it."""
+    try:
+        year = int(year)
+        if month and day:
+            first = date(year, int(month), int(day))
+            last = first + timedelta(days=1)
+        elif month:
+            first = date(year, int(month), 1)
+            last = date(year + first.month // 12, first.month % 12 + 1, 1)
+        else:
+            first, last = date(year, 1, 1), date(year + 1, 1, 1)
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidDate(f"{year}-{month}-{day}")
+    return day_start(first), day_start(last)
+
+
+def filter_range(queryset, field, start=None, end=None):
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lt': end})
+    return queryset
+
+
+def filter_days(queryset, field, first=None, last=None):
+    """
+    `queryset` narrowed to rows whose `field` falls on the days
+    `first`..`last` (inclusive, YYYY-MM-DD or dates, either may be empty).
+    Raises InvalidDate for a value that isn't a day.
+    """
+    return filter_range(queryset, field, *day_range(first, last))
+
+
+def filter_request_days(request, queryset, field, first='start_date', last='end_date'):
+    """
+    filter_days() on the `first` and `last` GET parameters of a list or
+    export view. A bad value is reported with messages.error and ignored.
+    """
+    try:
+        return filter_days(queryset, field, request.GET.get(first), request.GET.get(last))
+    except InvalidDate:
+        messages.error(request, INVALID_DATE_MESSAGE)
+        return queryset
@@ -0,0 +1,231 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .dates import filter_range
+from .models import DEVICE_STATUS_CHOICES, Device, HistoryFacet, HistoryLog
+from .search import search_devices
+
+# Adds (sign 1) or takes away (sign -1) the facet counts of `rows`, a table
+# or transition table shaped like inventory_historylog. The migration's
+# triggers run the same statement over their transition tables.
+APPLY_FACETS_SQL = """
+INSERT INTO inventory_historyfacet (facet, value, count)
+SELECT facet, value, SUM(n) FROM (
+    SELECT 'action' AS facet, action AS value, {sign} * COUNT(*) AS n FROM {rows} GROUP BY action
+    UNION ALL
+    SELECT 'model', model_name, {sign} * COUNT(*) FROM {rows} GROUP BY model_name
+    UNION ALL
+    SELECT 'user', user_id::text, {sign} * COUNT(*) FROM {rows} WHERE user_id IS NOT NULL GROUP BY user_id
+) deltas
+GROUP BY facet, value
+ON CONFLICT (facet, value) DO UPDATE SET count = inventory_historyfacet.count + EXCLUDED.count
+"""
+
+PRUNE_FACETS_SQL = "DELETE FROM inventory_historyfacet WHERE count <= 0"
+
+FIELDS = {'action': 'action', 'model': 'model_name', 'user': 'user_id'}
+
+
+def _compute():
+    facets = {}
+    for facet, field in FIELDS.items():
+        rows = HistoryLog.objects.filter(**{f'{field}__isnull': False}).values(field).annotate(count=Count('pk')).order_by()
+        facets[facet] = {str(row[field]): row['count'] for row in rows}
+    return facets
+
+
+def read_facets():
+    """
+    {'action': {value: count}, 'model': {...}, 'user': {user id: count}}
+    from the summary table, one query whatever the size of the log. Outside
+    PostgreSQL there are no triggers, so the log itself is grouped.
+    """
+    if connection.vendor != 'postgresql':
+        return _compute()
+    facets = {facet: {} for facet in FIELDS}
+    for facet, value, count in HistoryFacet.objects.values_list('facet', 'value', 'count'):
+        facets.setdefault(facet, {})[value] = count
+    return facets
+
+
+def forget_rows(table):
+    """
+    Take the rows of `table` (a partition about to be dropped or detached,
+    which fires no trigger) out of the facet counts.
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(APPLY_FACETS_SQL.format(sign=-1, rows=qn(table)))
+        cursor.execute(PRUNE_FACETS_SQL)
+
+
+def rebuild_facets():
+    """
+    Recompute the facet table from the whole log, blocking log writes for
+    the duration so no trigger update falls between the two.
+    """
+    if connection.vendor != 'postgresql':
+        return _compute()
+    table = connection.ops.quote_name(HistoryLog._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {table} IN SHARE MODE")
+        cursor.execute("DELETE FROM inventory_historyfacet")
+        cursor.execute(APPLY_FACETS_SQL.format(sign=1, rows=table))
+    return read_facets()
+
+
+def filter_choices(facets):
+    """
+    The history log dropdowns from read_facets(): (action, label, count),
+    (model name, count) and (user, count) lists.
+    """
+    labels = dict(HistoryLog.ACTION_CHOICES)
+    order = {action: i for i, action in enumerate(labels)}
+    actions = sorted(facets['action'].items(), key=lambda item: (order.get(item[0], len(order)), item[0]))
+    users = get_user_model().objects.filter(pk__in=[int(pk) for pk in facets['user']]).order_by('email')
+    return {
+        'action_choices': [(action, labels.get(action, action.title()), count) for action, count in actions],
+        'model_choices': sorted(facets['model'].items()),
+        'user_choices': [(user, facets['user'][str(user.pk)]) for user in users],
+    }
+
+
+# Advanced by a trigger on inventory_device (migration 0013) for every row
+# written, however it is written, as the writing transaction commits; part
+# of every device facet cache key, so a cached entry is not served after the
+# devices change.
+DEVICE_WRITES_SEQUENCE = 'inventory_device_writes_seq'
+
+DEVICE_FACETS_SQL = """
+SELECT GROUPING(name), GROUPING(status), name, status, location_id,
+       COUNT(*) FILTER (WHERE {status_ok} AND {location_ok}),
+       COUNT(*) FILTER (WHERE {name_ok} AND {location_ok}),
+       COUNT(*) FILTER (WHERE {name_ok} AND {status_ok})
+FROM ({devices}) devices
+GROUP BY GROUPING SETS ((name), (status), (location_id))
+"""
+
+
+def _device_base(query, start, end):
+    devices = Device.objects.all()
+    if query:
+        devices = search_devices(devices, query)
+    return filter_range(devices, 'created_at', start, end)
+
+
+def _count_device_facets(query='', start=None, end=None, name='', status='', location=None):
+    """
+    Each facet is counted under the other two selections but not its own,
+    so every option shows how many devices picking it would list.
+    """
+    devices = _device_base(query, start, end)
+    facets = {'name': {}, 'status': {}, 'location': {}}
+    if connection.vendor != 'postgresql':
+        selected = {'name': {'name__iexact': name}, 'status': {'status': status}, 'location': {'location_id': location}}
+        columns = {'name': 'name', 'status': 'status', 'location': 'location_id'}
+        for facet, column in columns.items():
+            others = {
+                lookup: value for other, filters in selected.items() if other != facet
+                for lookup, value in filters.items() if value not in ('', None)
+            }
+            rows = devices.filter(**others).values(column).annotate(count=Count('pk')).order_by()
+            facets[facet] = {row[column]: row['count'] for row in rows if row['count']}
+        return facets
+
+    inner, inner_params = devices.values_list('name', 'status', 'location_id').order_by().query.sql_with_params()
+    predicates = {
+        'name_ok': ('UPPER(name) = UPPER(%s)', name),
+        'status_ok': ('status = %s', status),
+        'location_ok': ('location_id = %s', location),
+    }
+    params = []
+    clauses = {}
+    # Placeholders are filled in the order they appear in the statement.
+    for first, second in [('status_ok', 'location_ok'), ('name_ok', 'location_ok'), ('name_ok', 'status_ok')]:
+        for predicate in (first, second):
+            sql, value = predicates[predicate]
+            if value in ('', None):
+                clauses.setdefault(predicate, 'TRUE')
+            else:
+                clauses.setdefault(predicate, sql)
+                params.append(value)
+    sql = DEVICE_FACETS_SQL.format(devices=inner, **clauses)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + list(inner_params))
+        for by_name, by_status, name_value, status_value, location_id, names, statuses, locations in cursor.fetchall():
+            if not by_name:
+                facet, value, count = 'name', name_value, names
+            elif not by_status:
+                facet, value, count = 'status', status_value, statuses
+            else:
+                facet, value, count = 'location', location_id, locations
+            if count:
+                facets[facet][value] = count
+    return facets
+
+
+def device_facets(query='', start=None, end=None, name='', status='', location=''):
+    """
+    Device counts per name, status and location for the device list's
+    current filters (`start`/`end` as from dates.day_range()), in one
+    grouped pass, cached per filter set until the next device write.
+    """
+    try:
+        location = int(location) if location else None
+    except ValueError:
+        location = None
+    filters = {
+        'query': ' '.join(query.split()).lower(),
+        'start': start,
+        'end': end,
+        'name': name.strip().upper(),
+        'status': status,
+        'location': location,
+    }
+    if connection.vendor != 'postgresql':
+        return _count_device_facets(**filters)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT last_value FROM {connection.ops.quote_name(DEVICE_WRITES_SEQUENCE)}")
+        version = cursor.fetchone()[0]
+    digest = hashlib.sha1(json.dumps(filters, sort_keys=True, default=str).encode()).hexdigest()
+    key = f'device-facets:{version}:{digest}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = _count_device_facets(**filters)
+        cache.set(key, facets, getattr(settings, 'DEVICE_FACET_CACHE_TIMEOUT', 600))
+    return facets
+
+
+def device_filter_choices(facets, locations, name='', status='', location=''):
+    """
+    The device list dropdowns from device_facets(): (name, count),
+    (status, label, count) and (location, count) lists. Options with no
+    devices are left out unless selected; the known statuses are always
+    listed.
+    """
+    name = name.strip().upper()
+    names = {}
+    for value, count in facets['name'].items():
+        names[value.upper()] = names.get(value.upper(), 0) + count  # the name filter is case-insensitive
+    if name:
+        names.setdefault(name, 0)
+    statuses = [(value, label, facets['status'].get(value, 0)) for value, label in DEVICE_STATUS_CHOICES]
+    known = dict(DEVICE_STATUS_CHOICES)
+    statuses += [
+        (value, value.title(), count) for value, count in sorted(facets['status'].items()) if value not in known
+    ]
+    return {
+        'name_choices': sorted(names.items()),
+        'status_choices': statuses,
+        'location_choices': [
+            (loc, facets['location'].get(loc.pk, 0)) for loc in locations
+            if facets['location'].get(loc.pk) or str(loc.pk) == location
+        ],
+    }
@@ -58,7 +58,7 @@ class DeviceForm(forms.ModelForm):
 
 class ReturnForm(forms.Form):
     borrow_record = forms.ModelChoiceField(
-        queryset=BorrowRecord.objects.filter(date_returned__isnull=True),
+        queryset=BorrowRecord.objects.filter(date_returned__isnull=True).select_related('staff', 'device'),
         label="Select Borrowed Record"
     )
     return_remarks = forms.CharField(required=False, widget=forms.Textarea)
@@ -119,8 +119,11 @@ class ReturnEditForm(forms.ModelForm):
         device_status = self.cleaned_data['device_status']
         # Update device status as well
         device = borrow_record.device
-        device.status = device_status
-        device.save()
+        # A returned record only speaks for the device while it is not lent
+        # out again; the condition is checked by the UPDATE itself so a
+        # concurrent issue is never overwritten.
+        if Device.objects.filter(pk=device.pk, current_borrow__isnull=True).update(status=device_status):
+            device.status = device_status
         if commit:
             borrow_record.save()
         return borrow_record
@@ -0,0 +1,123 @@
+"""
+Resized WebP/AVIF derivatives of uploaded device images.
+
+Derivatives live next to the originals, in a `derived/` folder of the same
+directory: device_images/photo.png -> device_images/derived/photo.thumb.webp.
+They are built off the request path after upload and by the
+build_image_derivatives command for existing files.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Defaults for DEVICE_IMAGE_SIZES (name -> bounding box; images are only
+# ever scaled down) and DEVICE_IMAGE_QUALITY (format -> encoder quality).
+SIZES = {
+    'thumb': (160, 160),
+    'medium': (640, 640),
+}
+QUALITY = {
+    'webp': 80,
+    'avif': 55,
+}
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'method': 4},
+    'avif': {'format': 'AVIF'},
+}
+
+_lock = threading.Lock()
+_executor = None
+
+
+def sizes():
+    return getattr(settings, 'DEVICE_IMAGE_SIZES', SIZES)
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if features.check(fmt)]
+
+
+def derivative_name(image_name, size, fmt):
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return f"{directory}/derived/{stem}.{size}.{fmt}" if directory else f"derived/{stem}.{size}.{fmt}"
+
+
+def derivative_url(image_name, size, fmt):
+    """URL of a derivative, or None if it has not been built (yet)."""
+    name = derivative_name(image_name, size, fmt)
+    if default_storage.exists(name):
+        return default_storage.url(name)
+    return None
+
+
+def build_derivatives(image_name, force=False):
+    """
+    Build every size x format derivative of `image_name`; existing ones are
+    kept unless `force`. Returns the names written.
+    """
+    wanted = [
+        (size, fmt) for size in sizes() for fmt in available_formats()
+        if force or not default_storage.exists(derivative_name(image_name, size, fmt))
+    ]
+    if not wanted:
+        return []
+
+    with default_storage.open(image_name, 'rb') as fh:
+        original = ImageOps.exif_transpose(Image.open(fh))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info or original.mode in ('LA', 'PA') else 'RGB')
+
+    quality = {**QUALITY, **getattr(settings, 'DEVICE_IMAGE_QUALITY', {})}
+    written = []
+    for size, fmt in wanted:
+        image = original.copy()
+        image.thumbnail(sizes()[size], Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, quality=quality[fmt], **FORMATS[fmt])
+        name = derivative_name(image_name, size, fmt)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        written.append(default_storage.save(name, ContentFile(buffer.getvalue())))
+    return written
+
+
+def delete_derivatives(image_name):
+    for size in sizes():
+        for fmt in FORMATS:
+            name = derivative_name(image_name, size, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+
+
+def _build(image_name):
+    try:
+        build_derivatives(image_name)
+    except Exception:
+        logger.exception("Building derivatives for %s failed", image_name)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+    return _executor
+
+
+def schedule_derivatives(image_name):
+    """Build the derivatives in the background once the upload has committed."""
+    if image_name:
+        transaction.on_commit(lambda: _get_executor().submit(_build, image_name))
@@ -0,0 +1,165 @@
+import csv
+import io
+import os
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from openpyxl import load_workbook
+
+from .models import Device, Location
+from .utils import record_action
+
+# Rows per INSERT statement.
+IMPORT_CHUNK_SIZE = 1000
+
+# Accepted header spellings for each Device field, compared case-insensitively.
+DEVICE_IMPORT_HEADERS = {
+    'name': ('name', 'asset name', 'device name', 'device'),
+    'model_brand': ('model/brand', 'model_brand', 'model', 'brand'),
+    'serial_number': ('serial number', 'serial_number', 'serial', 'serial no'),
+    'location': ('location',),
+}
+REQUIRED_FIELDS = ('name', 'model_brand', 'serial_number')
+
+# errors are (row number, message) pairs; non_line_errors are messages about
+# the import as a whole.
+ImportResult = namedtuple('ImportResult', ['rows', 'created', 'errors', 'non_line_errors'], defaults=[()])
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def iter_sheet_rows(fileobj, filename):
+    """
+    Yield the rows of an uploaded .xlsx or .csv file as tuples of cell values,
+    header row included. Workbooks are opened in read-only mode, so rows are
+    streamed from the zip instead of building the whole sheet in memory.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif extension == '.csv':
+        text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+        try:
+            for row in csv.reader(text):
+                yield tuple(row)
+        finally:
+            text.detach()
+    else:
+        raise ImportFormatError("Upload an .xlsx or .csv file.")
+
+
+def _column_map(header):
+    names = [str(cell).strip().lower() if cell is not None else '' for cell in header]
+    columns = {}
+    for field, spellings in DEVICE_IMPORT_HEADERS.items():
+        for index, name in enumerate(names):
+            if name in spellings:
+                columns[field] = index
+                break
+    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}.")
+    return columns
+
+
+def _cell(row, index):
+    if index is None or index >= len(row) or row[index] is None:
+        return ''
+    return str(row[index]).strip()
+
+
+def import_devices(rows, user=None, ip_address=None, source='upload', dry_run=False):
+    """
+    Validate and insert devices from `rows` (header first, as produced by
+    iter_sheet_rows()).
+
+    Every row is checked up front, serial-number uniqueness for the whole
+    batch takes one query, and the valid rows are inserted with bulk_create
+    in chunks inside one transaction. Invalid rows are skipped and reported
+    as (row number, message) pairs; a failure of the insert itself is
+    reported in non_line_errors. One HistoryLog entry summarizes the run.
+    """
+    rows = iter(rows)
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise ImportFormatError("The file is empty.")
+    columns = _column_map(header)
+    max_lengths = {field: Device._meta.get_field(field).max_length for field in REQUIRED_FIELDS}
+    locations = {name.lower(): pk for pk, name in Location.objects.values_list('id', 'name')}
+
+    candidates = []
+    errors = []
+    seen_serials = {}
+    total = 0
+    for row_number, row in enumerate(rows, start=2):
+        values = {field: _cell(row, columns.get(field)) for field in DEVICE_IMPORT_HEADERS}
+        if not any(values.values()):
+            continue
+        total += 1
+
+        problems = [f"{field} is required" for field in REQUIRED_FIELDS if not values[field]]
+        problems += [
+            f"{field} is longer than {length} characters"
+            for field, length in max_lengths.items() if len(values[field]) > length
+        ]
+        location_id = None
+        if values['location']:
+            location_id = locations.get(values['location'].lower())
+            if location_id is None:
+                problems.append(f"unknown location '{values['location']}'")
+        serial = values['serial_number']
+        if serial in seen_serials:
+            problems.append(f"serial number {serial} repeats row {seen_serials[serial]}")
+        elif serial:
+            seen_serials[serial] = row_number
+
+        if problems:
+            errors.append((row_number, '; '.join(problems)))
+            continue
+        candidates.append((row_number, Device(
+            name=values['name'].upper(),
+            model_brand=values['model_brand'],
+            serial_number=serial,
+            location_id=location_id,
+            status='available',
+        )))
+
+    existing = set(
+        Device.objects.filter(serial_number__in=[device.serial_number for _, device in candidates])
+        .values_list('serial_number', flat=True)
+    )
+    devices = []
+    for row_number, device in candidates:
+        if device.serial_number in existing:
+            errors.append((row_number, f"serial number {device.serial_number} already exists"))
+        else:
+            devices.append(device)
+    errors.sort()
+
+    if dry_run or not devices:
+        return ImportResult(total, 0, errors)
+
+    try:
+        with transaction.atomic():
+            Device.objects.bulk_create(devices, batch_size=IMPORT_CHUNK_SIZE)
+    except IntegrityError:
+        # Another writer added one of these serial numbers after the check.
+        return ImportResult(total, 0, errors, [
+            "A serial number was added by someone else during the import; nothing was imported.",
+        ])
+
+    record_action(
+        user,
+        'create',
+        'Device',
+        details=f"Imported {len(devices)} device(s) from {source}; {len(errors)} row(s) rejected",
+        ip_address=ip_address,
+    )
+    return ImportResult(total, len(devices), errors)
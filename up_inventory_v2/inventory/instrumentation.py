@@ -0,0 +1,173 @@
+"""
+Per-request SQL and timing instrumentation.
+
+RequestStatsMiddleware counts the queries a request runs (and how many of
+them repeat an earlier statement, the usual N+1 signature), the time spent
+in the database and in template rendering, and the total latency. With
+DEBUG on the numbers go out as response headers, otherwise as one JSON log
+line per request on the "inventory.requests" logger.
+
+Views declare how many queries they may run with @query_budget(n); going
+over is logged, and raises QueryBudgetExceeded with QUERY_BUDGETS_STRICT on
+(the test suite), so a regression fails CI instead of slowing production.
+"""
+import contextvars
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('inventory.requests')
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """Declare the most SQL queries a view may run per request."""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements = Counter()
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.budget = None
+        self._template_depth = 0
+
+    @property
+    def queries(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    def most_repeated(self):
+        sql, count = self.statements.most_common(1)[0] if self.statements else ('', 0)
+        return sql if count > 1 else None
+
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook; `sql` still has its placeholders,
+        # so the same statement with different parameters counts as a repeat.
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.statements[sql] += 1
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'duplicates': self.duplicates,
+            'db_ms': round(self.db_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'total_ms': round(self.total_time * 1000, 1),
+            'budget': self.budget,
+        }
+
+
+def current_stats():
+    """Stats of the request being handled in this thread, or None."""
+    return _current.get()
+
+
+class RequestStatsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            stats.total_time = time.perf_counter() - start
+            _current.reset(token)
+
+        response.request_stats = stats
+        self.report(request, response, stats)
+        if stats.over_budget() and getattr(settings, 'QUERY_BUDGETS_STRICT', False):
+            raise QueryBudgetExceeded(
+                f"{request.method} {request.path} ran {stats.queries} queries, budget is {stats.budget}"
+                f" (most repeated: {stats.most_repeated()})"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_stats()
+        if stats is not None:
+            stats.budget = getattr(view_func, 'query_budget', None)
+
+    def report(self, request, response, stats):
+        if settings.DEBUG:
+            response['X-Query-Count'] = stats.queries
+            response['X-Duplicate-Queries'] = stats.duplicates
+            if stats.budget is not None:
+                response['X-Query-Budget'] = stats.budget
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                f'tpl;dur={stats.template_time * 1000:.1f}, '
+                f'total;dur={stats.total_time * 1000:.1f}'
+            )
+        else:
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'view': getattr(request.resolver_match, 'view_name', None),
+                **stats.as_dict(),
+            }))
+
+        if stats.over_budget():
+            logger.warning(
+                "%s %s ran %d queries (budget %d); most repeated: %s",
+                request.method, request.path, stats.queries, stats.budget, stats.most_repeated(),
+            )
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = current_stats()
+        if stats is None:
+            return super().render(context, request)
+        stats._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats._template_depth -= 1
+            if stats._template_depth == 0:
+                stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that adds render time to the request's stats."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
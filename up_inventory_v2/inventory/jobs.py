@@ -0,0 +1,136 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .exports import iter_xlsx
+from .models import ExportJob
+from .utils import record_action
+
+# Persist progress every this many rows.
+PROGRESS_EVERY_ROWS = 1000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'EXPORT_JOB_WORKERS', 2),
+                thread_name_prefix='export-job',
+            )
+    return _executor
+
+
+def _export_plan(job):
+    """
+    Return (sources, sheets, model_name, details) for a job, reusing the
+    same filters and sheet layout as the synchronous export views. Each
+    source is a queryset or archive search, counted for progress.
+    """
+    from . import views
+
+    if job.kind == 'inventory':
+        borrowed_records, returned_records, details = views.filter_inventory_export(job.params)
+        sheets = views.inventory_export_sheets(borrowed_records, returned_records)
+        return [borrowed_records, returned_records], sheets, 'Inventory', details
+    if job.kind == 'history':
+        logs, details = views.filter_history_export(job.params)
+        archived = views.archived_history(job.params)
+        sources = [logs] if archived is None else [logs, archived]
+        return sources, views.history_export_sheets(logs, archived), 'HistoryLog', details
+    raise ValueError(f"Unknown export kind: {job.kind}")
+
+
+def _counted(job, rows):
+    for row in rows:
+        yield row
+        job.rows_written += 1
+        if job.rows_written % PROGRESS_EVERY_ROWS == 0:
+            ExportJob.objects.filter(pk=job.pk).update(rows_written=job.rows_written)
+
+
+def run_export_job(job_id):
+    close_old_connections()
+    job = ExportJob.objects.select_related('user').get(pk=job_id)
+    try:
+        job.status = 'running'
+        job.save(update_fields=['status'])
+
+        sources, sheets, model_name, details = _export_plan(job)
+        job.rows_total = sum(source.count() for source in sources)
+        job.save(update_fields=['rows_total'])
+
+        name = f"exports/{job.kind}_export_{job.pk}.xlsx"
+        path = job.file.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            for chunk in iter_xlsx([sheet._replace(rows=_counted(job, sheet.rows)) for sheet in sheets]):
+                fh.write(chunk)
+
+        job.file.name = name
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        job.expires_at = job.finished_at + timedelta(seconds=getattr(settings, 'EXPORT_JOB_TTL', 60 * 60 * 24))
+        job.save(update_fields=['file', 'status', 'rows_written', 'finished_at', 'expires_at'])
+
+        record_action(job.user, 'export', model_name, None, details, job.ip_address)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+    finally:
+        connection.close()
+
+
+def submit_export_job(user, kind, params, ip_address=None):
+    """
+    Create an export job and queue it on the local worker pool once the
+    surrounding transaction commits.
+    """
+    purge_expired_export_jobs()
+    job = ExportJob.objects.create(user=user, kind=kind, params=params, ip_address=ip_address)
+    transaction.on_commit(lambda: _get_executor().submit(run_export_job, job.pk))
+    return job
+
+
+def fail_stale_export_jobs(jobs=None):
+    """
+    Mark pending or running jobs older than EXPORT_JOB_STALE_AFTER as failed.
+    Jobs run on an in-process pool, so one that old was lost to a restart and
+    would otherwise be polled forever. Returns the number failed.
+    """
+    if jobs is None:
+        jobs = ExportJob.objects.all()
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'EXPORT_JOB_STALE_AFTER', 60 * 60 * 6))
+    return jobs.filter(status__in=['pending', 'running'], created_at__lte=cutoff).update(
+        status='failed',
+        error="The export was interrupted, probably by a server restart. Please start it again.",
+        finished_at=now,
+    )
+
+
+def purge_expired_export_jobs():
+    """
+    Fail jobs lost to a restart, then delete finished artifacts whose TTL has
+    passed. Returns the number purged.
+    """
+    fail_stale_export_jobs()
+    expired = ExportJob.objects.filter(status='done', expires_at__lte=timezone.now())
+    count = 0
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+        job.status = 'expired'
+        job.save(update_fields=['file', 'status'])
+        count += 1
+    return count
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory.archive import archive_cutoff, archive_history
+
+
+class Command(BaseCommand):
+    help = (
+        "Move history log months older than HISTORY_ARCHIVE_AFTER_MONTHS into "
+        "compressed archive files and drop them from the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=None,
+            help=f"Keep this many months in the database (default: {settings.HISTORY_ARCHIVE_AFTER_MONTHS}).",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['months'])
+        archived = archive_history(cutoff)
+        for month, rows in sorted(archived.items()):
+            self.stdout.write(f"{month:%Y-%m}: {rows} row(s) archived")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {len(archived)} month(s) older than {cutoff:%Y-%m-%d}."
+        ))
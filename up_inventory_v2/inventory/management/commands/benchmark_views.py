@@ -0,0 +1,71 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from inventory.benchmarks import (
+    default_benchmarks, load_baseline, regressions, run_benchmark, save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the list, export, dashboard and PDF views through the test client and "
+        "report p50/p95 latency, query count and peak Python memory per view against "
+        "a saved baseline. Load data with generate_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10, help="Timed requests per view.")
+        parser.add_argument('--warmup', type=int, default=1, help="Untimed requests per view first.")
+        parser.add_argument('--only', default='', help="Only benchmarks whose name contains this text.")
+        parser.add_argument(
+            '--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+            help="Baseline file to compare against.",
+        )
+        parser.add_argument('--save', action='store_true', help="Write these results as the new baseline.")
+        parser.add_argument(
+            '--threshold', type=float, default=1.25,
+            help="Flag views slower or bigger than baseline by more than this ratio.",
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--host', default='localhost', help="Host header (must be in ALLOWED_HOSTS).")
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+        if user is None:
+            raise CommandError("The benchmarks log in as a superuser; create one first.")
+        client = Client(HTTP_HOST=options['host'])
+        client.force_login(user)
+
+        baseline = load_baseline(options['baseline'])
+        results = {}
+        failed = []
+        self.stdout.write(f"{'view':<28}{'status':>7}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'peak KB':>10}")
+        for benchmark in default_benchmarks():
+            if options['only'] not in benchmark.name:
+                continue
+            result = run_benchmark(client, benchmark, runs=options['runs'], warmup=options['warmup'])
+            results[benchmark.name] = result
+            worse = regressions(result, baseline.get(benchmark.name), options['threshold'])
+            line = (
+                f"{benchmark.name:<28}{result['status']:>7}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                f"{'-' if result['queries'] is None else result['queries']:>9}{result['peak_kb']:>10}"
+            )
+            if worse:
+                failed.append(benchmark.name)
+                self.stdout.write(self.style.ERROR(f"{line}  REGRESSION: {'; '.join(worse)}"))
+            else:
+                self.stdout.write(line)
+
+        if options['save']:
+            os.makedirs(os.path.dirname(options['baseline']) or '.', exist_ok=True)
+            save_baseline(options['baseline'], {**baseline, **results})
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}."))
+        elif not baseline:
+            self.stdout.write("No baseline yet; run with --save to record one.")
+
+        if failed and options['fail_on_regression']:
+            raise CommandError(f"{len(failed)} view(s) regressed: {', '.join(failed)}")
@@ -0,0 +1,45 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from inventory.images import build_derivatives
+from inventory.models import Device
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the thumbnail/preview WebP and AVIF derivatives for device images "
+        "that don't have them yet (every file in device_images/ plus any image a "
+        "device points to elsewhere)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild derivatives that already exist.")
+
+    def handle(self, *args, **options):
+        names = set()
+        if default_storage.exists('device_images'):
+            _, files = default_storage.listdir('device_images')
+            names.update(f'device_images/{filename}' for filename in files)
+        names.update(
+            Device.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True)
+        )
+
+        built = failed = 0
+        for name in sorted(names):
+            if not default_storage.exists(name):
+                self.stderr.write(f"{name}: missing")
+                failed += 1
+                continue
+            try:
+                written = build_derivatives(name, force=options['force'])
+            except Exception as e:
+                self.stderr.write(f"{name}: {e}")
+                failed += 1
+                continue
+            if written:
+                built += 1
+                self.stdout.write(f"{name}: {len(written)} derivative(s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built derivatives for {built} of {len(names)} image(s); {failed} failed."
+        ))
@@ -0,0 +1,96 @@
+import os
+import posixpath
+
+from django.core.management.base import BaseCommand
+
+from inventory.images import build_derivatives, delete_derivatives
+from inventory.models import Device
+from inventory.storage import content_hash, device_image_storage, image_removable, remove_image
+
+DIRECTORY = 'device_images'
+
+
+class Command(BaseCommand):
+    help = (
+        "Move device images to content-addressed names: identical files are "
+        "merged into one, devices are repointed at it, and image files no "
+        "device uses are deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without touching anything.")
+        parser.add_argument(
+            '--keep-unused', action='store_true', help="Don't delete files that no device refers to.",
+        )
+
+    def handle(self, *args, **options):
+        storage = device_image_storage()
+        dry_run = options['dry_run']
+        if not storage.exists(DIRECTORY):
+            self.stdout.write("No device images.")
+            return
+
+        _, files = storage.listdir(DIRECTORY)
+        moves = {}
+        # Targets this run creates, with their mtime once written (None in a
+        # dry run, where nothing is).
+        written = {}
+        renamed = merged = freed = 0
+        for filename in sorted(files):
+            name = posixpath.join(DIRECTORY, filename)
+            with storage.open(name, 'rb') as fh:
+                target = posixpath.join(DIRECTORY, content_hash(fh) + posixpath.splitext(filename)[1].lower())
+            duplicate = target in moves.values() or (target != name and storage.exists(target))
+            moves[name] = target
+            if target == name:
+                continue
+
+            size = storage.size(name)
+            if dry_run:
+                self.stdout.write(f"{name} -> {target}")
+                if not storage.exists(target):
+                    written[target] = None
+            else:
+                if not storage.exists(target):
+                    with storage.open(name, 'rb') as fh:
+                        storage.save(target, fh)
+                    written[target] = os.path.getmtime(storage.path(target))
+                Device.objects.filter(image=name).update(image=target)
+                storage.delete(name)
+                delete_derivatives(name)
+            if duplicate:
+                merged += 1
+                freed += size
+            else:
+                renamed += 1
+
+        targets = sorted(set(moves.values()))
+        removed = 0
+        if not options['keep_unused']:
+            used = {
+                moves.get(image, image)
+                for image in Device.objects.exclude(image='').values_list('image', flat=True)
+            }
+            for name in targets:
+                if name in used:
+                    continue
+                # The grace period protects files an upload may have just
+                # (re)written. A copy this run made, untouched since, needs none.
+                fresh = name in written and (dry_run or os.path.getmtime(storage.path(name)) == written[name])
+                grace = 0 if fresh else None
+                if dry_run:
+                    if fresh or image_removable(storage, name, grace):
+                        self.stdout.write(f"{name}: unused")
+                        removed += 1
+                elif remove_image(storage, name, grace=grace):
+                    removed += 1
+
+        if not dry_run:
+            for name in targets:
+                if storage.exists(name):
+                    build_derivatives(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would rename' if dry_run else 'Renamed'} {renamed} file(s), merged {merged} duplicate(s) "
+            f"({freed / 1024:.0f} KB) and {'would remove' if dry_run else 'removed'} {removed} unused file(s)."
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.synthetic import Generator
+
+
+class Command(BaseCommand):
+    help = (
+        "Append synthetic departments, locations, users, staff, devices, borrow records "
+        "and history logs for benchmarking, e.g. --devices 1000000 --staff 200000 "
+        "--borrows 5000000 --history 20000000. Never run this against production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=10000)
+        parser.add_argument('--staff', type=int, default=2000)
+        parser.add_argument('--borrows', type=int, default=50000)
+        parser.add_argument('--history', type=int, default=200000)
+        parser.add_argument('--departments', type=int, default=50)
+        parser.add_argument('--locations', type=int, default=100)
+        parser.add_argument('--users', type=int, default=50, help="App accounts the history entries belong to.")
+        parser.add_argument('--months', type=int, default=24, help="Spread dates over this many past months.")
+        parser.add_argument('--open-ratio', type=float, default=0.3, help="Share of devices left on loan.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['borrows'] and not (options['devices'] and options['staff']):
+            raise CommandError("--borrows needs at least one device and one staff member.")
+
+        started = time.monotonic()
+        Generator(
+            devices=options['devices'],
+            staff=options['staff'],
+            borrows=options['borrows'],
+            history=options['history'],
+            departments=options['departments'],
+            locations=options['locations'],
+            users=options['users'],
+            months=options['months'],
+            open_ratio=options['open_ratio'],
+            seed=options['seed'],
+            log=self.stdout.write,
+        ).run()
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.monotonic() - started:.1f}s."))
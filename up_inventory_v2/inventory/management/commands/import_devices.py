@@ -0,0 +1,45 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.imports import ImportFormatError, import_devices, iter_sheet_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk-import devices from an .xlsx or .csv file (header: Asset Name, Model/Brand, Serial Number, Location)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', help="Email of the account the import is logged under.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without importing.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}.")
+
+        path = options['path']
+        try:
+            with open(path, 'rb') as fh:
+                result = import_devices(
+                    iter_sheet_rows(fh, path),
+                    user=user,
+                    source=os.path.basename(path),
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        for message in result.non_line_errors:
+            self.stdout.write(self.style.ERROR(message))
+        for row_number, message in result.errors:
+            self.stdout.write(self.style.WARNING(f"Row {row_number}: {message}"))
+        verb = "Would import" if options['dry_run'] else "Imported"
+        valid = result.rows - len(result.errors) if options['dry_run'] else result.created
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {valid} of {result.rows} row(s); {len(result.errors)} rejected."
+        ))
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory.partitions import drop_partitions_before, ensure_partitions, is_partitioned, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly history log partitions and drop (or detach) "
+        "the ones older than the retention window. Run daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-months', type=int, default=None,
+            help=f"Months of history to keep (default: {settings.HISTORY_LOG_RETENTION_MONTHS}).",
+        )
+        parser.add_argument(
+            '--detach', action='store_true',
+            help="Detach expired partitions and keep them as standalone tables instead of dropping them.",
+        )
+        parser.add_argument(
+            '--no-prune', action='store_true',
+            help="Only create upcoming partitions.",
+        )
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            self.stdout.write(self.style.WARNING("inventory_historylog is not partitioned; nothing to do."))
+            return
+
+        for name in ensure_partitions():
+            self.stdout.write(f"Created {name}")
+
+        if options['no_prune']:
+            return
+        cutoff = retention_cutoff(options['retention_months'])
+        removed = drop_partitions_before(cutoff, detach=options['detach'])
+        verb = "Detached" if options['detach'] else "Dropped"
+        for name in removed:
+            self.stdout.write(f"{verb} {name}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(removed)} partition(s) older than {cutoff:%Y-%m-%d}."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventory.jobs import purge_expired_export_jobs
+
+
+class Command(BaseCommand):
+    help = "Delete export files whose download window has expired."
+
+    def handle(self, *args, **options):
+        count = purge_expired_export_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} expired export(s)."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from inventory.counters import compact_counters, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard counters table from the device, staff and borrow tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compact', action='store_true',
+            help="Only fold pending counter changes into the counters table. Run every few minutes from cron.",
+        )
+
+    def handle(self, *args, **options):
+        if options['compact']:
+            count = compact_counters()
+            self.stdout.write(self.style.SUCCESS(f"Folded pending changes into {count} counter(s)."))
+            return
+
+        values = rebuild_counters()
+        for name, value in sorted(values.items()):
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS("Dashboard counters rebuilt."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from inventory.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Recompute the history log filter facets (actions, models, users and their counts) from the log."
+
+    def handle(self, *args, **options):
+        facets = rebuild_facets()
+        for facet, values in facets.items():
+            self.stdout.write(f"{facet}: {len(values)} value(s), {sum(values.values())} row(s)")
+        self.stdout.write(self.style.SUCCESS("History facets rebuilt."))
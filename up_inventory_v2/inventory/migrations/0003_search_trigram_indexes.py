@@ -0,0 +1,49 @@
+from django.db import migrations
+
+TRIGRAM_INDEXED_COLUMNS = {
+    'inventory_device': ['name', 'model_brand', 'serial_number', 'status'],
+    'inventory_staffrecord': ['full_name', 'email', 'status'],
+    'inventory_location': ['name'],
+    'inventory_department': ['name'],
+}
+
+
+def _has_pg_trgm(schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Django's icontains compiles to UPPER(col::text) LIKE UPPER(%s), so the
+    # index is built on the same expression.
+    if not _has_pg_trgm(schema_editor):
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, columns in TRIGRAM_INDEXED_COLUMNS.items():
+        for column in columns:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{table}_{column}_trgm" '
+                f'ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, columns in TRIGRAM_INDEXED_COLUMNS.items():
+        for column in columns:
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_{column}_trgm"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_export_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def close_duplicate_open_borrows(apps, schema_editor):
+    """
+    Before this migration two requests could both issue the same device,
+    leaving it with more than one open record, which the constraint below
+    would reject. Keep the newest open record of each device (the one the
+    backfill points at) and close the others as of its issue date, saying
+    why in their remarks.
+    """
+    BorrowRecord = apps.get_model('inventory', 'BorrowRecord')
+    devices = (
+        BorrowRecord.objects.filter(date_returned__isnull=True)
+        .values('device').annotate(open_records=models.Count('pk')).filter(open_records__gt=1)
+        .values_list('device', flat=True)
+    )
+    for device_id in devices:
+        current, *stale = BorrowRecord.objects.filter(
+            device_id=device_id, date_returned__isnull=True
+        ).order_by('-date_issued', '-pk')
+        for record in stale:
+            note = f"Closed by migration: device was issued again under record #{current.pk}."
+            record.date_returned = current.date_issued
+            record.remarks = f"{record.remarks}\n{note}" if record.remarks else note
+        BorrowRecord.objects.bulk_update(stale, ['date_returned', 'remarks'])
+
+
+def backfill_current_borrow(apps, schema_editor):
+    Device = apps.get_model('inventory', 'Device')
+    BorrowRecord = apps.get_model('inventory', 'BorrowRecord')
+    open_borrow = BorrowRecord.objects.filter(
+        device=models.OuterRef('pk'), date_returned__isnull=True
+    ).order_by('-date_issued', '-pk').values('pk')[:1]
+    Device.objects.update(current_borrow=models.Subquery(open_borrow))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='device',
+            name='current_borrow',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='current_for', to='inventory.borrowrecord'),
+        ),
+        migrations.RunPython(close_duplicate_open_borrows, migrations.RunPython.noop),
+        migrations.RunPython(backfill_current_borrow, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='borrowrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('date_returned__isnull', True)), fields=('device',), name='unique_open_borrow_per_device'),
+        ),
+    ]
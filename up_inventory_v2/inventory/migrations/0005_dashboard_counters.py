@@ -0,0 +1,134 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:07
+
+from django.db import migrations, models
+
+# Row-level triggers keep inventory_dashboardcounter in step with every write,
+# including queryset.update() and bulk_create(), inside the writer's own
+# transaction.
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION inventory_bump_counter(counter_name text, delta bigint) RETURNS void AS $$
+BEGIN
+    IF delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO inventory_dashboardcounter (name, value) VALUES (counter_name, delta)
+    ON CONFLICT (name) DO UPDATE SET value = inventory_dashboardcounter.value + EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inventory_device_counters() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM inventory_bump_counter('devices', 1);
+        PERFORM inventory_bump_counter('devices:' || NEW.status, 1);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM inventory_bump_counter('devices', -1);
+        PERFORM inventory_bump_counter('devices:' || OLD.status, -1);
+    ELSIF NEW.status IS DISTINCT FROM OLD.status THEN
+        PERFORM inventory_bump_counter('devices:' || OLD.status, -1);
+        PERFORM inventory_bump_counter('devices:' || NEW.status, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inventory_staff_counters() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM inventory_bump_counter('staff', 1);
+        PERFORM inventory_bump_counter('staff:active', CASE WHEN NEW.status = 'active' THEN 1 ELSE 0 END);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM inventory_bump_counter('staff', -1);
+        PERFORM inventory_bump_counter('staff:active', CASE WHEN OLD.status = 'active' THEN -1 ELSE 0 END);
+    ELSE
+        PERFORM inventory_bump_counter('staff:active',
+            (CASE WHEN NEW.status = 'active' THEN 1 ELSE 0 END) -
+            (CASE WHEN OLD.status = 'active' THEN 1 ELSE 0 END));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inventory_borrow_counters() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM inventory_bump_counter('borrows:open', CASE WHEN NEW.date_returned IS NULL THEN 1 ELSE 0 END);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM inventory_bump_counter('borrows:open', CASE WHEN OLD.date_returned IS NULL THEN -1 ELSE 0 END);
+    ELSE
+        PERFORM inventory_bump_counter('borrows:open',
+            (CASE WHEN NEW.date_returned IS NULL THEN 1 ELSE 0 END) -
+            (CASE WHEN OLD.date_returned IS NULL THEN 1 ELSE 0 END));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER inventory_device_counters
+    AFTER INSERT OR DELETE OR UPDATE OF status ON inventory_device
+    FOR EACH ROW EXECUTE FUNCTION inventory_device_counters();
+
+CREATE TRIGGER inventory_staff_counters
+    AFTER INSERT OR DELETE OR UPDATE OF status ON inventory_staffrecord
+    FOR EACH ROW EXECUTE FUNCTION inventory_staff_counters();
+
+CREATE TRIGGER inventory_borrow_counters
+    AFTER INSERT OR DELETE OR UPDATE OF date_returned ON inventory_borrowrecord
+    FOR EACH ROW EXECUTE FUNCTION inventory_borrow_counters();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS inventory_device_counters ON inventory_device;
+DROP TRIGGER IF EXISTS inventory_staff_counters ON inventory_staffrecord;
+DROP TRIGGER IF EXISTS inventory_borrow_counters ON inventory_borrowrecord;
+DROP FUNCTION IF EXISTS inventory_device_counters();
+DROP FUNCTION IF EXISTS inventory_staff_counters();
+DROP FUNCTION IF EXISTS inventory_borrow_counters();
+DROP FUNCTION IF EXISTS inventory_bump_counter(text, bigint);
+"""
+
+POPULATE = """
+INSERT INTO inventory_dashboardcounter (name, value)
+SELECT 'devices', COUNT(*) FROM inventory_device
+UNION ALL
+SELECT 'devices:' || status, COUNT(*) FROM inventory_device GROUP BY status
+UNION ALL
+SELECT 'staff', COUNT(*) FROM inventory_staffrecord
+UNION ALL
+SELECT 'staff:active', COUNT(*) FROM inventory_staffrecord WHERE status = 'active'
+UNION ALL
+SELECT 'borrows:open', COUNT(*) FROM inventory_borrowrecord WHERE date_returned IS NULL;
+"""
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("LOCK TABLE inventory_device, inventory_staffrecord, inventory_borrowrecord IN SHARE MODE")
+    schema_editor.execute(CREATE_TRIGGERS)
+    schema_editor.execute(POPULATE)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_device_current_borrow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
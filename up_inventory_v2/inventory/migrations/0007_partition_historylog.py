@@ -0,0 +1,123 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:02
+
+from django.db import migrations
+
+# inventory_historylog becomes a table range-partitioned by month of
+# "timestamp". PostgreSQL requires the partition key in every unique
+# constraint, so the primary key is (id, timestamp) in the database while the
+# model keeps `id` as its pk; ids still come from a single identity sequence
+# and stay unique. Rows outside every monthly partition land in
+# inventory_historylog_default until the maintenance command creates theirs.
+PARTITION_AHEAD = 3
+
+CREATE_PARENT = """
+CREATE TABLE inventory_historylog_partitioned (
+    "id" bigint NOT NULL GENERATED BY DEFAULT AS IDENTITY,
+    "action" varchar(20) NOT NULL,
+    "model_name" varchar(50) NOT NULL,
+    "object_id" integer NULL CHECK ("object_id" >= 0),
+    "details" text NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    "ip_address" inet NULL,
+    "user_id" bigint NULL
+) PARTITION BY RANGE ("timestamp");
+CREATE TABLE inventory_historylog_default PARTITION OF inventory_historylog_partitioned DEFAULT;
+"""
+
+COPY_ROWS = """
+INSERT INTO inventory_historylog_partitioned
+    (id, action, model_name, object_id, details, timestamp, ip_address, user_id)
+OVERRIDING SYSTEM VALUE
+SELECT id, action, model_name, object_id, details, timestamp, ip_address, user_id
+FROM inventory_historylog;
+"""
+
+SWAP_TABLES = """
+DROP TABLE inventory_historylog;
+ALTER TABLE inventory_historylog_partitioned RENAME TO inventory_historylog;
+ALTER SEQUENCE inventory_historylog_partitioned_id_seq RENAME TO inventory_historylog_id_seq;
+SELECT setval('inventory_historylog_id_seq', COALESCE((SELECT MAX(id) FROM inventory_historylog), 0) + 1, false);
+ALTER TABLE inventory_historylog ADD CONSTRAINT inventory_historylog_pkey PRIMARY KEY (id, timestamp);
+ALTER TABLE inventory_historylog ADD CONSTRAINT inventory_historylog_user_id_5d9a38ca_fk_accounts_customuser_id
+    FOREIGN KEY (user_id) REFERENCES accounts_customuser (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX inventory_historylog_user_id_5d9a38ca ON inventory_historylog (user_id);
+CREATE INDEX inventory_historylog_timestamp_idx ON inventory_historylog (timestamp);
+"""
+
+UNPARTITION = """
+CREATE TABLE inventory_historylog_plain (
+    "id" bigint NOT NULL PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    "action" varchar(20) NOT NULL,
+    "model_name" varchar(50) NOT NULL,
+    "object_id" integer NULL CHECK ("object_id" >= 0),
+    "details" text NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    "ip_address" inet NULL,
+    "user_id" bigint NULL
+);
+INSERT INTO inventory_historylog_plain
+    (id, action, model_name, object_id, details, timestamp, ip_address, user_id)
+OVERRIDING SYSTEM VALUE
+SELECT id, action, model_name, object_id, details, timestamp, ip_address, user_id
+FROM inventory_historylog;
+DROP TABLE inventory_historylog;
+ALTER TABLE inventory_historylog_plain RENAME TO inventory_historylog;
+ALTER TABLE inventory_historylog RENAME CONSTRAINT inventory_historylog_plain_pkey TO inventory_historylog_pkey;
+ALTER SEQUENCE inventory_historylog_plain_id_seq RENAME TO inventory_historylog_id_seq;
+SELECT setval('inventory_historylog_id_seq', COALESCE((SELECT MAX(id) FROM inventory_historylog), 0) + 1, false);
+ALTER TABLE inventory_historylog ADD CONSTRAINT inventory_historylog_user_id_5d9a38ca_fk_accounts_customuser_id
+    FOREIGN KEY (user_id) REFERENCES accounts_customuser (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX inventory_historylog_user_id_5d9a38ca ON inventory_historylog (user_id);
+"""
+
+
+def partition_history(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("SET LOCAL TIME ZONE 'UTC'")
+    schema_editor.execute("LOCK TABLE inventory_historylog IN EXCLUSIVE MODE")
+    schema_editor.execute(CREATE_PARENT)
+
+    # One partition per month from the oldest row up to PARTITION_AHEAD
+    # months past the current one, created before the copy so no row goes
+    # through the default partition.
+    schema_editor.execute(f"""
+        DO $$
+        DECLARE
+            month timestamptz;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE((SELECT MIN(timestamp) FROM inventory_historylog), now()) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{PARTITION_AHEAD} months',
+                    interval '1 month'
+                ) AT TIME ZONE 'UTC'
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF inventory_historylog_partitioned FOR VALUES FROM (%L) TO (%L)',
+                    'inventory_historylog_p' || to_char(month AT TIME ZONE 'UTC', 'YYYY_MM'),
+                    month, month + interval '1 month'
+                );
+            END LOOP;
+        END
+        $$;
+    """, params=None)
+    schema_editor.execute(COPY_ROWS)
+    schema_editor.execute(SWAP_TABLES)
+
+
+def unpartition_history(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(UNPARTITION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_historylog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_history, unpartition_history),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:25
+
+import inventory.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_partition_historylog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='device',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=inventory.storage.device_image_storage, upload_to='device_images/'),
+        ),
+    ]
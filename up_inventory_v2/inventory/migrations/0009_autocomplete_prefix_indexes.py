@@ -0,0 +1,39 @@
+from django.db import migrations
+
+PREFIX_INDEXED_COLUMNS = {
+    'inventory_device': ['serial_number', 'name', 'model_brand'],
+    'inventory_staffrecord': ['full_name', 'email'],
+}
+
+
+def create_prefix_indexes(apps, schema_editor):
+    # istartswith compiles to UPPER(col::text) LIKE UPPER(%s); text_pattern_ops
+    # lets a btree on that expression answer the LIKE 'abc%' whatever the
+    # database collation is.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, columns in PREFIX_INDEXED_COLUMNS.items():
+        for column in columns:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{table}_{column}_prefix" '
+                f'ON "{table}" ((UPPER("{column}"::text)) text_pattern_ops)'
+            )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, columns in PREFIX_INDEXED_COLUMNS.items():
+        for column in columns:
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_{column}_prefix"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_device_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
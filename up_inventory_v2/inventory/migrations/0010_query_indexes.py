@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_autocomplete_prefix_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('date_returned__isnull', True)), fields=['-date_issued'], name='borrow_open_issued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('date_returned__isnull', True)), fields=['staff', '-date_issued'], name='borrow_staff_open_issued_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('date_returned__isnull', False)), fields=['-date_returned'], name='borrow_returned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('date_returned__isnull', False)), fields=['staff', '-date_returned'], name='borrow_staff_returned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['-created_at', '-id'], name='device_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='device_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historylog',
+            index=models.Index(fields=['action', '-timestamp'], name='history_action_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historylog',
+            index=models.Index(fields=['model_name', '-timestamp'], name='history_model_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historylog',
+            index=models.Index(fields=['user', '-timestamp'], name='history_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staffrecord',
+            index=models.Index(fields=['-created_at', '-id'], name='staff_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='staffrecord',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='staff_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+# Statement-level triggers keep inventory_historyfacet in step with the log:
+# one grouped upsert per INSERT (a whole audit batch or COPY), DELETE or
+# UPDATE (user set to NULL) statement, read from its transition tables.
+# They sit on the partitioned parent, which every write goes through.
+APPLY = """
+    INSERT INTO inventory_historyfacet (facet, value, count)
+    SELECT facet, value, SUM(n) FROM (
+        SELECT 'action' AS facet, action AS value, {sign} * COUNT(*) AS n FROM {rows} GROUP BY action
+        UNION ALL
+        SELECT 'model', model_name, {sign} * COUNT(*) FROM {rows} GROUP BY model_name
+        UNION ALL
+        SELECT 'user', user_id::text, {sign} * COUNT(*) FROM {rows} WHERE user_id IS NOT NULL GROUP BY user_id
+    ) deltas
+    GROUP BY facet, value
+    ON CONFLICT (facet, value) DO UPDATE SET count = inventory_historyfacet.count + EXCLUDED.count;
+"""
+
+CREATE_TRIGGERS = f"""
+CREATE OR REPLACE FUNCTION inventory_history_facets() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM inventory_historyfacet;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        {APPLY.format(sign=1, rows='new_rows')}
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        {APPLY.format(sign=-1, rows='old_rows')}
+        DELETE FROM inventory_historyfacet WHERE count <= 0;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER inventory_history_facets_insert
+    AFTER INSERT ON inventory_historylog REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_history_facets();
+
+CREATE TRIGGER inventory_history_facets_delete
+    AFTER DELETE ON inventory_historylog REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_history_facets();
+
+CREATE TRIGGER inventory_history_facets_update
+    AFTER UPDATE ON inventory_historylog REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_history_facets();
+
+CREATE TRIGGER inventory_history_facets_truncate
+    AFTER TRUNCATE ON inventory_historylog
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_history_facets();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS inventory_history_facets_insert ON inventory_historylog;
+DROP TRIGGER IF EXISTS inventory_history_facets_delete ON inventory_historylog;
+DROP TRIGGER IF EXISTS inventory_history_facets_update ON inventory_historylog;
+DROP TRIGGER IF EXISTS inventory_history_facets_truncate ON inventory_historylog;
+DROP FUNCTION IF EXISTS inventory_history_facets();
+"""
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("LOCK TABLE inventory_historylog IN SHARE MODE")
+    schema_editor.execute(CREATE_TRIGGERS)
+    schema_editor.execute(APPLY.format(sign=1, rows='inventory_historylog'))
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=10)),
+                ('value', models.CharField(max_length=50)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='unique_history_facet')],
+            },
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
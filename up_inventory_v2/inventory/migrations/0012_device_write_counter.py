@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# One bump of the 'writes:devices' dashboard counter per statement that
+# writes inventory_device; the device list facet cache keys on it.
+CREATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION inventory_device_writes() RETURNS trigger AS $$
+BEGIN
+    PERFORM inventory_bump_counter('writes:devices', 1);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER inventory_device_writes
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON inventory_device
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_device_writes();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS inventory_device_writes ON inventory_device;
+DROP FUNCTION IF EXISTS inventory_device_writes();
+DELETE FROM inventory_dashboardcounter WHERE name = 'writes:devices';
+"""
+
+
+def create_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_TRIGGER)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_history_facets'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
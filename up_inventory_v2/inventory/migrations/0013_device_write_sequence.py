@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# The device facet cache version becomes a sequence: nextval() takes no row
+# lock and is never rolled back, so device writers no longer queue on one
+# counter row. The trigger is deferred to commit and fires per changed row,
+# so a compare-and-set UPDATE that matched nothing doesn't bump it, and a
+# reader can't pick up the new version long before the write is visible.
+CREATE_TRIGGERS = """
+DROP TRIGGER IF EXISTS inventory_device_writes ON inventory_device;
+DELETE FROM inventory_dashboardcounter WHERE name = 'writes:devices';
+
+CREATE SEQUENCE IF NOT EXISTS inventory_device_writes_seq;
+
+CREATE OR REPLACE FUNCTION inventory_device_writes() RETURNS trigger AS $$
+BEGIN
+    PERFORM nextval('inventory_device_writes_seq');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER inventory_device_writes
+    AFTER INSERT OR UPDATE OR DELETE ON inventory_device
+    DEFERRABLE INITIALLY DEFERRED
+    FOR EACH ROW EXECUTE FUNCTION inventory_device_writes();
+
+CREATE TRIGGER inventory_device_truncate
+    AFTER TRUNCATE ON inventory_device
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_device_writes();
+"""
+
+# Back to 0012's statement trigger on the 'writes:devices' counter row.
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS inventory_device_writes ON inventory_device;
+DROP TRIGGER IF EXISTS inventory_device_truncate ON inventory_device;
+DROP SEQUENCE IF EXISTS inventory_device_writes_seq;
+
+CREATE OR REPLACE FUNCTION inventory_device_writes() RETURNS trigger AS $$
+BEGIN
+    PERFORM inventory_bump_counter('writes:devices', 1);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER inventory_device_writes
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON inventory_device
+    FOR EACH STATEMENT EXECUTE FUNCTION inventory_device_writes();
+"""
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_TRIGGERS)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_device_write_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+# The counter triggers used to upsert the shared inventory_dashboardcounter
+# rows, which stayed locked until the writer committed: every issue and return
+# queued on 'borrows:open' and 'devices:<status>', and took those locks in
+# different orders (device first on issue, record first on return), which
+# could deadlock. inventory_bump_counter() now appends to a delta table
+# instead; read_counters() adds the deltas up and compact_counters() folds them in.
+BUMP_INTO_DELTAS = """
+CREATE OR REPLACE FUNCTION inventory_bump_counter(counter_name text, delta bigint) RETURNS void AS $$
+BEGIN
+    IF delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO inventory_dashboardcounterdelta (name, delta) VALUES (counter_name, delta);
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+BUMP_IN_PLACE = """
+CREATE OR REPLACE FUNCTION inventory_bump_counter(counter_name text, delta bigint) RETURNS void AS $$
+BEGIN
+    IF delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO inventory_dashboardcounter (name, value) VALUES (counter_name, delta)
+    ON CONFLICT (name) DO UPDATE SET value = inventory_dashboardcounter.value + EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+FOLD_DELTAS = """
+WITH moved AS (DELETE FROM inventory_dashboardcounterdelta RETURNING name, delta)
+INSERT INTO inventory_dashboardcounter (name, value)
+SELECT name, SUM(delta) FROM moved GROUP BY name ORDER BY name
+ON CONFLICT (name) DO UPDATE SET value = inventory_dashboardcounter.value + EXCLUDED.value;
+"""
+
+
+def bump_into_deltas(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(BUMP_INTO_DELTAS)
+
+
+def bump_in_place(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("LOCK TABLE inventory_dashboardcounterdelta IN EXCLUSIVE MODE")
+    schema_editor.execute(BUMP_IN_PLACE)
+    schema_editor.execute(FOLD_DELTAS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_device_write_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounterDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('delta', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(bump_into_deltas, bump_in_place),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:05
+
+import inventory.storage
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def expire_public_exports(apps, schema_editor):
+    # Finished exports used to be written under MEDIA_ROOT, where anyone who
+    # guessed exports/<kind>_export_<id>.xlsx could fetch them. Delete those
+    # files and expire their jobs rather than move them.
+    ExportJob = apps.get_model('inventory', 'ExportJob')
+    for job in ExportJob.objects.filter(status='done'):
+        if job.file.name:
+            default_storage.delete(job.file.name)
+    ExportJob.objects.filter(status='done').update(status='expired', file='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_dashboard_counter_deltas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=inventory.storage.export_storage, upload_to='exports/'),
+        ),
+        migrations.RunPython(expire_public_exports, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,8 @@
 from django.db import models
+from django.utils import timezone
+
+from .images import derivative_url
+from .storage import device_image_storage, export_storage
 
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -28,6 +32,13 @@ class StaffRecord(models.Model):
     user_account_created = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # staff_list pages newest-first on (created_at, id), optionally by status.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='staff_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='staff_status_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.full_name} ({self.email})"
 
@@ -46,8 +57,19 @@ class Device(models.Model):
     serial_number = models.CharField(max_length=100, unique=True)
     status = models.CharField(max_length=20, choices=DEVICE_STATUS_CHOICES, default='available')
     location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
-    image = models.ImageField(upload_to='device_images/', null=True, blank=True)
+    image = models.ImageField(upload_to='device_images/', storage=device_image_storage, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Open BorrowRecord for this device, kept in step by the borrow/return views.
+    current_borrow = models.OneToOneField(
+        'BorrowRecord', on_delete=models.SET_NULL, null=True, blank=True, related_name='current_for'
+    )
+
+    class Meta:
+        # device_list pages newest-first on (created_at, id), optionally by status.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='device_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='device_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.serial_number})"
@@ -56,6 +78,30 @@ class Device(models.Model):
         """Get human-readable status"""
         return dict(DEVICE_STATUS_CHOICES).get(self.status, self.status)
 
+    def _image_variant(self, size, fmt, fallback=True):
+        if not self.image:
+            return None
+        url = derivative_url(self.image.name, size, fmt)
+        if url is None and fallback:
+            return self.image.url  # not built yet
+        return url
+
+    @property
+    def thumbnail_url(self):
+        return self._image_variant('thumb', 'webp')
+
+    @property
+    def thumbnail_avif_url(self):
+        return self._image_variant('thumb', 'avif', fallback=False)
+
+    @property
+    def preview_url(self):
+        return self._image_variant('medium', 'webp')
+
+    @property
+    def preview_avif_url(self):
+        return self._image_variant('medium', 'avif', fallback=False)
+
 class BorrowRecord(models.Model):
     staff = models.ForeignKey(StaffRecord, on_delete=models.CASCADE)
     device = models.ForeignKey(Device, on_delete=models.PROTECT)
@@ -63,6 +109,40 @@ class BorrowRecord(models.Model):
     date_issued = models.DateTimeField(auto_now_add=True)
     date_returned = models.DateTimeField(null=True, blank=True)
     remarks = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['device'],
+                condition=models.Q(date_returned__isnull=True),
+                name='unique_open_borrow_per_device',
+            ),
+        ]
+        # The borrowed and returned lists on the inventory page and dashboard,
+        # each newest-first and optionally for one staff member. Partial, so
+        # each index only holds the rows its list can show.
+        indexes = [
+            models.Index(
+                fields=['-date_issued'],
+                condition=models.Q(date_returned__isnull=True),
+                name='borrow_open_issued_idx',
+            ),
+            models.Index(
+                fields=['staff', '-date_issued'],
+                condition=models.Q(date_returned__isnull=True),
+                name='borrow_staff_open_issued_idx',
+            ),
+            models.Index(
+                fields=['-date_returned'],
+                condition=models.Q(date_returned__isnull=False),
+                name='borrow_returned_idx',
+            ),
+            models.Index(
+                fields=['staff', '-date_returned'],
+                condition=models.Q(date_returned__isnull=False),
+                name='borrow_staff_returned_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.staff.full_name} - {self.device.name}"
@@ -89,13 +169,111 @@ class HistoryLog(models.Model):
     model_name = models.CharField(max_length=50)
     object_id = models.PositiveIntegerField(null=True, blank=True)
     details = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the action happens, not when the buffered row is flushed.
+    timestamp = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
 
     class Meta:
         ordering = ['-timestamp']
         verbose_name = 'History Log'
         verbose_name_plural = 'History Logs'
+        # history_log filters on one of these and shows the newest first; the
+        # unfiltered list uses the timestamp index from 0007. Created on the
+        # partitioned parent, so every monthly partition gets its own copy.
+        indexes = [
+            models.Index(fields=['action', '-timestamp'], name='history_action_ts_idx'),
+            models.Index(fields=['model_name', '-timestamp'], name='history_model_ts_idx'),
+            models.Index(fields=['user', '-timestamp'], name='history_user_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.model_name} by {self.user} at {self.timestamp}"
+
+class ExportJob(models.Model):
+    KIND_CHOICES = [
+        ('inventory', 'Inventory'),
+        ('history', 'History Log'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ]
+
+    user = models.ForeignKey('accounts.CustomUser', on_delete=models.SET_NULL, null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    rows_total = models.PositiveIntegerField(null=True, blank=True)
+    rows_written = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to='exports/', storage=export_storage, null=True, blank=True)
+    error = models.TextField(blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} export #{self.pk} ({self.status})"
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_written * 100 / self.rows_total))
+
+
+class DashboardCounter(models.Model):
+    """
+    Running totals behind the dashboard, one row per counter name
+    ('devices', 'devices:<status>', 'staff', 'staff:active', 'borrows:open'),
+    as of the last compaction of DashboardCounterDelta. Kept current by
+    database triggers on Device, StaffRecord and BorrowRecord; see the
+    rebuild_dashboard_counters command.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class DashboardCounterDelta(models.Model):
+    """
+    Changes to the dashboard counters not yet folded into DashboardCounter.
+    The triggers only ever insert here, so writers never wait on each other
+    for a counter; readers add the pending deltas, and
+    `rebuild_dashboard_counters --compact` folds them in.
+    """
+    name = models.CharField(max_length=50)
+    delta = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} {self.delta:+d}"
+
+
+class HistoryFacet(models.Model):
+    """
+    The distinct actions, model names and users (by id) in HistoryLog, with
+    how many rows each has, behind the history log filter dropdowns. Kept
+    current by statement triggers on HistoryLog; see the
+    rebuild_history_facets command.
+    """
+    facet = models.CharField(max_length=10)  # 'action', 'model' or 'user'
+    value = models.CharField(max_length=50)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_history_facet'),
+        ]
 
     def __str__(self):
-        return f"{self.get_action_display()} {self.model_name} by {self.user} at {self.timestamp}"
\ No newline at end of file
+        return f"{self.facet}={self.value}: {self.count}"
@@ -0,0 +1,274 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections, models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _json_default(value):
+    # Full microsecond precision; DjangoJSONEncoder truncates to milliseconds,
+    # which would make neighbouring rows compare equal.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=_json_default).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def _seek(keys, values, lookup):
+    """
+    Row-value comparison (k1, k2, ...) < (v1, v2, ...) spelled out as ORs,
+    which Django can express and the planner turns into an index range.
+    """
+    condition = Q()
+    for i, key in enumerate(keys):
+        prefix = dict(zip(keys[:i], values[:i]))
+        prefix[f'{key}__{lookup}'] = values[i]
+        condition |= Q(**prefix)
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, keys, has_next, has_previous):
+        self.object_list = object_list
+        self.keys = keys
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _cursor(self, obj):
+        return encode_cursor([getattr(obj, key) for key in self.keys])
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.object_list:
+            return None
+        return self._cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        return self._cursor(self.object_list[0])
+
+
+class KeysetPaginator:
+    """
+    Descending keyset pagination, by default newest-first on (created_at, id).
+
+    Each page is a single indexed range query regardless of table size: no
+    COUNT(*) and no OFFSET. Pass related fields in `select_related` so the
+    rows come back with their foreign keys already joined. `keys` may start
+    with an annotation (e.g. a search rank) as long as it ends in a unique
+    column.
+    """
+
+    def __init__(self, queryset, per_page=15, keys=('created_at', 'pk'), select_related=()):
+        self.queryset = queryset
+        if select_related:
+            self.queryset = self.queryset.select_related(*select_related)
+        self.per_page = per_page
+        self.keys = list(keys)
+
+    def _decode(self, cursor):
+        values = decode_cursor(cursor, len(self.keys))
+        for i, key in enumerate(self.keys):
+            try:
+                field = self.queryset.model._meta.get_field(key)
+            except FieldDoesNotExist:
+                continue
+            if isinstance(field, models.DateTimeField):
+                try:
+                    values[i] = parse_datetime(values[i])
+                except (ValueError, TypeError):
+                    values[i] = None
+                if values[i] is None:
+                    raise InvalidCursor(cursor)
+        return values
+
+    def page(self, after=None, before=None):
+        if before:
+            values = self._decode(before)
+            rows = list(
+                self.queryset
+                .filter(_seek(self.keys, values, 'gt'))
+                .order_by(*self.keys)[:self.per_page + 1]
+            )
+            if not rows:
+                return self.page()
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return KeysetPage(rows, self.keys, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset.order_by(*[f'-{key}' for key in self.keys])
+        if after:
+            queryset = queryset.filter(_seek(self.keys, self._decode(after), 'lt'))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self.keys, has_next=has_next, has_previous=bool(after))
+
+    def get_page(self, after=None, before=None):
+        """
+        Like page(), but falls back to the first page on a tampered or
+        stale cursor instead of raising.
+        """
+        try:
+            return self.page(after=after, before=before)
+        except InvalidCursor:
+            return self.page()
+
+
+# Leaf tables only: a partitioned parent has no statistics of its own, and
+# reltuples is -1 for a table that has never been analyzed.
+TABLE_ESTIMATE_SQL = """
+SELECT SUM(GREATEST(c.reltuples, 0)), BOOL_OR(c.reltuples >= 0)
+FROM pg_class c
+WHERE (c.oid = %s::regclass AND c.relkind = 'r')
+   OR c.oid IN (SELECT relid FROM pg_partition_tree(%s::regclass) WHERE isleaf)
+"""
+
+
+def estimate_count(queryset):
+    """
+    The number of rows PostgreSQL expects `queryset` to return, without
+    counting them: the table statistics when it has no filter, otherwise
+    the planner's row estimate. None when there is nothing to go on.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    query = queryset.query
+    if not query.where and not query.distinct and not query.combinator and not query.is_sliced:
+        table = query.get_meta().db_table
+        with connection.cursor() as cursor:
+            cursor.execute(TABLE_ESTIMATE_SQL, [table, table])
+            rows, analyzed = cursor.fetchone()
+        return int(rows) if analyzed else None
+    plan = queryset.explain(format='json')
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    OFFSET pagination that doesn't COUNT(*) a large result on every page.
+
+    Each page fetches one row more than it shows to know whether there is a
+    next one. `count` is then exact on the last page (the rows seen so far),
+    an exact COUNT(*) when PostgreSQL expects fewer than `exact_below` rows,
+    and estimate_count() otherwise; `is_approximate` then says so, for
+    templates to show "about N results". Anything else is counted, unless it
+    has an estimate_count() method of its own.
+    """
+
+    def __init__(self, object_list, per_page, exact_below=10000, allow_empty_first_page=True):
+        super().__init__(object_list, per_page, allow_empty_first_page=allow_empty_first_page)
+        self.exact_below = exact_below
+        self._approximate = False
+        self._seen = None
+
+    @property
+    def is_approximate(self):
+        self.count
+        return self._approximate
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows and (number > 1 or not self.allow_empty_first_page):
+            raise EmptyPage(self.error_messages['no_results'])
+        # What this page tells us about the total replaces any estimate.
+        self._seen = (bottom + len(rows), has_next)
+        for name in ('count', 'num_pages'):
+            self.__dict__.pop(name, None)
+        return EstimatedPage(rows, number, self, has_next)
+
+    def get_page(self, number):
+        try:
+            number = self.validate_number(number)
+        except (PageNotAnInteger, EmptyPage):
+            number = 1
+        try:
+            return self.page(number)
+        except EmptyPage:
+            # Past the end, e.g. a stale link; find the real last page.
+            last = max(1, -(-self._exact_count() // self.per_page))
+            return self.page(last)
+
+    def _exact_count(self):
+        self._approximate = False
+        return Paginator.count.func(self)
+
+    @cached_property
+    def count(self):
+        seen, has_next = self._seen or (0, True)
+        if not has_next:
+            self._approximate = False
+            return seen
+        if isinstance(self.object_list, models.QuerySet):
+            estimate = estimate_count(self.object_list)
+        elif hasattr(self.object_list, 'estimate_count'):
+            estimate = self.object_list.estimate_count()
+        else:
+            return self._exact_count()
+        if estimate is None or estimate < self.exact_below:
+            return self._exact_count()
+        self._approximate = True
+        return max(estimate, seen + 1)
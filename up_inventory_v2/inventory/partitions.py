@@ -0,0 +1,197 @@
+import datetime
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .facets import forget_rows
+from .models import HistoryLog
+
+TABLE = HistoryLog._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+# Partition DDL needs a brief exclusive lock; give up rather than queue behind
+# a long-running reader and stall every writer queued behind us.
+LOCK_TIMEOUT = '5s'
+
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month.year:04d}_{month.month:02d}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """
+    Attached monthly partitions as (name, first day of month), oldest first.
+    The default partition is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            year, month = int(match.group(1)), int(match.group(2))
+            partitions.append((name, datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def ensure_partitions(months_ahead=None, since=None):
+    """
+    Create the monthly partitions from the current month (or the month of
+    `since`) up to `months_ahead` months after the current one. Rows that
+    already fell into the default partition for one of those months are
+    moved into the new partition before it is attached. Returns the names of
+    the partitions created.
+    """
+    if not is_partitioned():
+        return []
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'HISTORY_LOG_PARTITIONS_AHEAD', 3)
+
+    existing = {name for name, _ in list_partitions()}
+    last = add_months(month_start(timezone.now()), months_ahead)
+    month = month_start(since) if since is not None else month_start(timezone.now())
+    created = []
+    while month <= last:
+        name = partition_name(month)
+        if name not in existing:
+            _create_partition(name, month, add_months(month, 1))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def _create_partition(name, start, end):
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(DEFAULT_PARTITION)} "
+            f"WHERE timestamp >= %s AND timestamp < %s RETURNING *) "
+            f"INSERT INTO {qn(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(TABLE)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+
+
+def drop_partitions_before(cutoff, detach=False):
+    """
+    Remove every monthly partition that ends on or before `cutoff`, plus any
+    older stragglers in the default partition. With `detach`, partitions are
+    detached and kept as standalone tables (for archiving) instead of dropped.
+    Returns the names of the partitions removed.
+    """
+    if not is_partitioned():
+        HistoryLog.objects.filter(timestamp__lt=cutoff).delete()
+        return []
+
+    qn = connection.ops.quote_name
+    removed = []
+    for name, month in list_partitions():
+        if add_months(month, 1) > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            # Partition DDL fires no row or statement triggers.
+            forget_rows(name)
+            if detach:
+                cursor.execute(f"ALTER TABLE {qn(TABLE)} DETACH PARTITION {qn(name)}")
+            else:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+        removed.append(name)
+
+    # Through the parent, so the facet triggers see the deleted rows; the
+    # partitions left all start at or after the cutoff and are pruned.
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {qn(TABLE)} WHERE timestamp < %s", [cutoff])
+    return removed
+
+
+def drop_empty_partitions_before(cutoff):
+    """
+    Drop the monthly partitions that end on or before `cutoff` and hold no
+    rows. A partition that is not empty (a row arrived after its month was
+    archived) is kept for the next run. Returns the names dropped.
+    """
+    if not is_partitioned():
+        return []
+
+    qn = connection.ops.quote_name
+    dropped = []
+    for name, month in list_partitions():
+        if add_months(month, 1) > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            # DROP takes this lock anyway; taking it first keeps a row from
+            # landing between the check and the drop.
+            cursor.execute(f"LOCK TABLE {qn(TABLE)} IN ACCESS EXCLUSIVE MODE")
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {qn(name)})")
+            if cursor.fetchone()[0]:
+                continue
+            cursor.execute(f"DROP TABLE {qn(name)}")
+        dropped.append(name)
+    return dropped
+
+
+def retention_cutoff(months=None):
+    """
+    First instant that is still kept under HISTORY_LOG_RETENTION_MONTHS;
+    retention works in whole months so it lines up with partitions.
+    """
+    if months is None:
+        months = settings.HISTORY_LOG_RETENTION_MONTHS
+    return add_months(month_start(timezone.now()), -months)
+
+
+def truncate_history():
+    """
+    Empty the history log in constant time. Returns the planner's row
+    estimate, since counting millions of rows exactly would cost more than
+    the TRUNCATE itself.
+    """
+    if connection.vendor != 'postgresql':
+        count = HistoryLog.objects.count()
+        HistoryLog.objects.all().delete()
+        return count
+
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint FROM pg_class "
+            "WHERE oid = %s::regclass OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+            [TABLE, TABLE],
+        )
+        count = cursor.fetchone()[0]
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(f"TRUNCATE {qn(TABLE)}")
+    return count
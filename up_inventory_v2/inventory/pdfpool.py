@@ -0,0 +1,101 @@
+"""
+Out-of-process xhtml2pdf rendering.
+
+xhtml2pdf is pure Python and CPU-bound, so it runs in a pool of worker
+processes: callers render the (cheap) HTML in their own thread and only the
+HTML -> PDF conversion crosses the process boundary. Workers import nothing
+but this module, so it must stay free of Django models and database access.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+
+from xhtml2pdf import pisa  # type: ignore
+
+
+class PdfRenderError(Exception):
+    pass
+
+
+class RenderQueueFull(Exception):
+    pass
+
+
+def html_to_pdf(html, resources):
+    """
+    Convert `html` to PDF bytes. `resources` maps the URIs the document
+    links to onto files, and URL prefixes ending in '/' (MEDIA_URL) onto the
+    directories they are served from.
+    """
+    def fetch_resources(uri, rel):
+        if uri in resources:
+            return resources[uri]
+        for prefix, root in resources.items():
+            if prefix.endswith('/') and uri.startswith(prefix):
+                return os.path.join(root, uri[len(prefix):])
+        return None
+
+    result = BytesIO()
+    pdf = pisa.pisaDocument(
+        BytesIO(html.encode("UTF-8")),
+        result,
+        encoding='UTF-8',
+        link_callback=fetch_resources
+    )
+    if pdf.err:
+        raise PdfRenderError("Error generating PDF")
+    return result.getvalue()
+
+
+class RenderPool:
+    """
+    ProcessPoolExecutor with a bounded queue: at most `workers + queue_size`
+    documents are in flight, and submit() waits up to `timeout` seconds for
+    a slot before raising RenderQueueFull. With `workers` = 0 documents are
+    rendered inline in the calling thread.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._slots = threading.BoundedSemaphore(max(self.capacity, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: the web process has threads (audit
+                # flusher, export jobs) and open database connections.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+        return self._executor
+
+    def submit(self, html, resources, timeout=None):
+        if self.workers == 0:
+            future = Future()
+            try:
+                future.set_result(html_to_pdf(html, resources))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if not self._slots.acquire(timeout=timeout):
+            raise RenderQueueFull("The PDF renderer is busy, please try again.")
+        try:
+            future = self._get_executor().submit(html_to_pdf, html, resources)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
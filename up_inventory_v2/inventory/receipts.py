@@ -0,0 +1,250 @@
+import glob
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.db import close_old_connections, connection, transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import BorrowRecord
+from .pdfpool import PdfRenderError, RenderPool
+
+logger = logging.getLogger(__name__)
+
+BORROWED_TEMPLATE = 'inventory-pdf/borrowed_pdf.html'
+RETURNED_TEMPLATE = 'inventory-pdf/returned_pdf.html'
+
+_lock = threading.Lock()
+_executor = None
+_pool = None
+
+
+class ReceiptError(Exception):
+    pass
+
+
+def receipt_queryset():
+    return BorrowRecord.objects.select_related('staff__department', 'device__location')
+
+
+def receipt_template(record):
+    return BORROWED_TEMPLATE if record.date_returned is None else RETURNED_TEMPLATE
+
+
+def receipt_filename(record):
+    status = "borrowed" if record.date_returned is None else "returned"
+    return f"{status}_record_{record.pk}.pdf"
+
+
+def receipt_html(record):
+    return get_template(receipt_template(record)).render({
+        'record': record,
+        'now': timezone.now(),
+        'MEDIA_URL': settings.MEDIA_URL,
+        'STATIC_URL': settings.STATIC_URL,
+    })
+
+
+def _resources(html):
+    """
+    Files behind what `html` links to, for html_to_pdf(): MEDIA_URL maps onto
+    MEDIA_ROOT, and each STATIC_URL reference onto the file the staticfiles
+    finders locate, since STATIC_ROOT is only set where collectstatic runs.
+    The workers import no Django, so the lookups happen here.
+    """
+    resources = {settings.MEDIA_URL: settings.MEDIA_ROOT}
+    static_url = settings.STATIC_URL
+    for uri in set(re.findall(r'["\'(](' + re.escape(static_url) + r'[^"\')\s]+)', html)):
+        path = finders.find(uri[len(static_url):])
+        if path:
+            resources[uri] = path
+    return resources
+
+
+def render_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = RenderPool(
+                getattr(settings, 'RECEIPT_RENDER_WORKERS', 2),
+                getattr(settings, 'RECEIPT_RENDER_QUEUE', 16),
+            )
+    return _pool
+
+
+def submit_receipt(record, timeout=None):
+    """Queue `record`'s receipt on the render pool; returns a Future of PDF bytes."""
+    html = receipt_html(record)
+    return render_pool().submit(html, _resources(html), timeout=timeout)
+
+
+def render_receipt(record):
+    """Render the borrowed/returned receipt for `record` to PDF bytes."""
+    future = submit_receipt(record, timeout=getattr(settings, 'RECEIPT_RENDER_WAIT', 10))
+    try:
+        return future.result()
+    except PdfRenderError:
+        raise ReceiptError(f"Error generating PDF for record {record.pk}")
+
+
+def receipt_version(record):
+    """
+    Digest of everything the receipt shows, plus the template's mtime, so a
+    return, an edit of the record, staff or device, or a template change
+    all produce a new cache entry.
+    """
+    device, staff = record.device, record.staff
+    template = get_template(receipt_template(record))
+    parts = [
+        template.origin.name,
+        os.path.getmtime(template.origin.name),
+        record.pr_number, record.remarks, record.date_issued, record.date_returned,
+        staff.full_name, staff.department.name if staff.department else None,
+        device.name, device.model_brand, device.serial_number, device.status,
+        device.location.name if device.location else None,
+        device.image.name if device.image else None,
+    ]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+class ReceiptCache:
+    """
+    Rendered receipts on disk as <record id>-<version>.pdf. A hit bumps the
+    file's mtime, and once the directory grows past `max_bytes` the files
+    with the oldest mtime are evicted first (LRU by total size).
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, record_id, version):
+        return os.path.join(self.directory, f'{record_id}-{version}.pdf')
+
+    def get(self, record_id, version):
+        path = self.path(record_id, version)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, record_id, version, data):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(record_id, version)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+        for stale in glob.glob(os.path.join(self.directory, f'{record_id}-*.pdf')):
+            if stale != path:
+                self._remove(stale)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        with _lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.pdf'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                self._remove(path)
+                total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def receipt_cache():
+    return ReceiptCache(settings.RECEIPT_CACHE_DIR, settings.RECEIPT_CACHE_MAX_BYTES)
+
+
+def get_receipt(record):
+    """Path of the cached PDF for `record`, rendering it on a miss."""
+    cache = receipt_cache()
+    version = receipt_version(record)
+    path = cache.get(record.pk, version)
+    if path is None:
+        path = cache.put(record.pk, version, render_receipt(record))
+    return path
+
+
+def iter_receipts(records):
+    """
+    Yield (record, pdf bytes) for `records` in order. Cache misses are
+    rendered in parallel on the pool, a bounded window ahead of the record
+    being yielded, and stored in the cache as they complete.
+    """
+    cache = receipt_cache()
+    window = max(render_pool().capacity, 1)
+    pending = deque()
+
+    def finish(record, version, path, future):
+        if path is None:
+            try:
+                data = future.result()
+            except PdfRenderError:
+                raise ReceiptError(f"Error generating PDF for record {record.pk}")
+            cache.put(record.pk, version, data)
+            return record, data
+        with open(path, 'rb') as fh:
+            return record, fh.read()
+
+    for record in records:
+        if len(pending) >= window:
+            yield finish(*pending.popleft())
+        version = receipt_version(record)
+        path = cache.get(record.pk, version)
+        future = submit_receipt(record) if path is None else None
+        pending.append((record, version, path, future))
+    while pending:
+        yield finish(*pending.popleft())
+
+
+def _prerender(record_id):
+    close_old_connections()
+    try:
+        record = receipt_queryset().filter(pk=record_id).first()
+        if record is not None:
+            get_receipt(record)
+    except Exception:
+        logger.exception("Pre-rendering receipt %s failed", record_id)
+    finally:
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='receipt')
+    return _executor
+
+
+def prerender_receipt(record_id):
+    """
+    With RECEIPT_PRERENDER on, render the receipt in the background once the
+    current transaction commits, so the first download is a plain file send.
+    """
+    if getattr(settings, 'RECEIPT_PRERENDER', False):
+        transaction.on_commit(lambda: _get_executor().submit(_prerender, record_id))
@@ -0,0 +1,111 @@
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import BorrowRecord, Department, Device, Location, StaffRecord
+
+# Relevance tiers: a whole-field match beats a prefix match beats a substring.
+EXACT, PREFIX, SUBSTRING = 3, 2, 1
+
+AUTOCOMPLETE_LIMIT = 20
+# Shorter queries only match prefixes: pg_trgm can't index fewer than three
+# characters, while the UPPER(col) text_pattern_ops indexes (migration 0009)
+# serve prefix LIKEs of any length.
+MIN_SUBSTRING_QUERY = 3
+
+
+def _rank(query, fields):
+    return Case(
+        *[When(**{f'{field}__iexact': query}, then=Value(EXACT)) for field in fields],
+        *[When(**{f'{field}__istartswith': query}, then=Value(PREFIX)) for field in fields],
+        default=Value(SUBSTRING),
+        output_field=IntegerField(),
+    )
+
+
+def _contains_any(query, fields):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def search_devices(devices, query):
+    """
+    Filter devices on the multi-field `q` search and annotate `rank`.
+
+    Every branch of the OR is served by a pg_trgm index (migration 0003) or
+    the location FK index, so PostgreSQL answers it with a BitmapOr instead
+    of a sequential scan. The location name is matched through an id
+    subquery rather than a join so the OR stays on indexed Device columns.
+    """
+    fields = ['name', 'model_brand', 'serial_number']
+    matching_locations = Location.objects.filter(name__icontains=query).values('id')
+    return devices.filter(
+        _contains_any(query, fields) |
+        Q(status__icontains=query) |
+        Q(location_id__in=matching_locations)
+    ).annotate(rank=_rank(query, fields))
+
+
+def search_staff(staff_records, query):
+    """
+    Filter staff on the multi-field `q` search and annotate `rank`; the
+    department is matched through an id subquery, as in search_devices().
+    """
+    fields = ['full_name', 'email']
+    matching_departments = Department.objects.filter(name__icontains=query).values('id')
+    return staff_records.filter(
+        _contains_any(query, fields) |
+        Q(status__icontains=query) |
+        Q(department_id__in=matching_departments)
+    ).annotate(rank=_rank(query, fields))
+
+
+def _starts_with_any(query, fields):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__istartswith': query})
+    return condition
+
+
+def _autocomplete(queryset, query, fields, limit):
+    query = query.strip()
+    if not query:
+        return queryset.none()
+    if len(query) < MIN_SUBSTRING_QUERY:
+        condition = _starts_with_any(query, fields)
+    else:
+        condition = _contains_any(query, fields)
+    return queryset.filter(condition).annotate(rank=_rank(query, fields)).order_by('-rank', *fields, 'pk')[:limit]
+
+
+def autocomplete_staff(query, limit=AUTOCOMPLETE_LIMIT, active_only=True):
+    """Staff (by default only active staff) matching `query` on name or email, best matches first."""
+    staff = StaffRecord.objects.select_related('department')
+    if active_only:
+        staff = staff.filter(status='active')
+    return _autocomplete(staff, query, ['full_name', 'email'], limit)
+
+
+def autocomplete_devices(query, limit=AUTOCOMPLETE_LIMIT):
+    """Devices that can be issued matching `query` on serial number, name or model."""
+    devices = Device.objects.filter(status='available', current_borrow__isnull=True).select_related('location')
+    return _autocomplete(devices, query, ['serial_number', 'name', 'model_brand'], limit)
+
+
+def autocomplete_open_records(query, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Open borrow records whose staff member or device matches `query`,
+    newest first; both sides are matched through id subqueries.
+    """
+    query = query.strip()
+    if not query:
+        return BorrowRecord.objects.none()
+    lookup = _starts_with_any if len(query) < MIN_SUBSTRING_QUERY else _contains_any
+    staff_ids = StaffRecord.objects.filter(lookup(query, ['full_name', 'email'])).values('id')
+    device_ids = Device.objects.filter(lookup(query, ['serial_number', 'name'])).values('id')
+    return (
+        BorrowRecord.objects.filter(date_returned__isnull=True)
+        .filter(Q(staff_id__in=staff_ids) | Q(device_id__in=device_ids))
+        .select_related('staff', 'device')
+        .order_by('-date_issued', '-pk')[:limit]
+    )
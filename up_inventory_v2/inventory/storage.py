@@ -0,0 +1,127 @@
+"""
+Content-addressed storage for device images, and private storage for
+background export files.
+
+Uploads are saved as device_images/<sha256 of the bytes>.<ext>, so the same
+photo uploaded twice is stored once and every stored file has an immutable
+URL. A file can therefore back several devices; release_image() deletes it
+only once no device refers to it any more.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+from .images import delete_derivatives
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that ignores the uploaded file name (except for its
+    extension) and names files by the SHA-256 of their contents. Saving
+    bytes that are already stored writes nothing and just refreshes the
+    file's mtime, which release_image() treats as "in use".
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = posixpath.join(directory, content_hash(content) + extension)
+
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        saved = super().save(name, content, max_length=max_length)
+        if saved != name:
+            # Lost a race with an identical upload: keep theirs.
+            self.delete(saved)
+        return name
+
+
+def device_image_storage():
+    return ContentAddressedStorage()
+
+
+def image_in_use(name):
+    from .models import Device
+    return Device.objects.filter(image=name).exists()
+
+
+def image_removable(storage, name, grace=None):
+    """
+    True if `name` is stored, no device uses it and it hasn't been written
+    or re-uploaded within the last `grace` seconds (a newer upload of the
+    same bytes may not have committed yet).
+    """
+    if grace is None:
+        grace = getattr(settings, 'DEVICE_IMAGE_GC_GRACE', 3600)
+    if not name or image_in_use(name) or not storage.exists(name):
+        return False
+    return time.time() - os.path.getmtime(storage.path(name)) >= grace
+
+
+def remove_image(storage, name, grace=None):
+    """
+    Delete `name` and its derivatives if image_removable(). Returns True if
+    the file was removed.
+    """
+    if not image_removable(storage, name, grace):
+        return False
+    storage.delete(name)
+    delete_derivatives(name)
+    return True
+
+
+def release_image(name):
+    """
+    Once the current transaction commits, delete `name` if the device that
+    used it was the last one. Files still inside the grace period are left
+    for dedupe_device_images to sweep up.
+    """
+    def release():
+        try:
+            remove_image(device_image_storage(), name)
+        except Exception:
+            logger.exception("Releasing image %s failed", name)
+
+    if name:
+        transaction.on_commit(release)
+
+
+class ExportStorage(FileSystemStorage):
+    """
+    Finished export files, kept under EXPORT_JOB_DIR rather than MEDIA_ROOT
+    so that nothing serves them at a guessable URL: download_export_job is
+    the only way out, and it checks the owner and the expiry.
+    """
+
+    @property
+    def base_location(self):
+        return settings.EXPORT_JOB_DIR
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    def url(self, name):
+        raise ValueError("Export files have no public URL; use download_export_job.")
+
+
+def export_storage():
+    return ExportStorage()
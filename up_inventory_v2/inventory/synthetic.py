@@ -0,0 +1,249 @@
+"""
+Synthetic data for benchmarks and load testing.
+
+Rows are produced as plain tuples by generators and streamed into the
+tables with COPY FROM STDIN on PostgreSQL (bulk_create elsewhere), with
+explicit ids so foreign keys can be filled in without reading anything
+back. Output is deterministic for a given seed and starting ids.
+"""
+import datetime
+import random
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .counters import rebuild_counters
+from .exports import _can_copy
+from .models import BorrowRecord, Department, Device, HistoryLog, Location, StaffRecord
+from .partitions import ensure_partitions
+
+BATCH_SIZE = 5000
+
+# Row triggers that keep the dashboard counters in step; disabled during a
+# load and replaced by one rebuild_counters() at the end.
+COUNTER_TRIGGERS = {
+    Device: 'inventory_device_counters',
+    StaffRecord: 'inventory_staff_counters',
+    BorrowRecord: 'inventory_borrow_counters',
+}
+
+DEVICE_NAMES = ['LAPTOP', 'DESKTOP', 'MONITOR', 'PRINTER', 'PROJECTOR', 'TABLET', 'ROUTER', 'SCANNER', 'CAMERA', 'UPS']
+BRANDS = ['Dell', 'HP', 'Lenovo', 'Acer', 'Asus', 'Apple', 'Epson', 'Canon', 'Samsung', 'Cisco']
+IDLE_STATUSES = ['available'] * 16 + ['maintenance', 'damaged', 'lost', 'condemned']
+STAFF_STATUSES = ['active'] * 8 + ['terminated', 'resigned']
+FIRST_NAMES = ['Maria', 'Jose', 'Juan', 'Ana', 'Mark', 'Grace', 'John', 'Liza', 'Paolo', 'Carla', 'Miguel', 'Rosa']
+LAST_NAMES = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Ramos', 'Flores', 'Villanueva']
+ACTIONS = ['create', 'update', 'delete', 'borrow', 'return', 'login', 'logout']
+ACTION_MODELS = {
+    'create': ['Device', 'StaffRecord', 'Department', 'Location'],
+    'update': ['Device', 'StaffRecord', 'BorrowRecord'],
+    'delete': ['Device', 'StaffRecord', 'Location'],
+    'borrow': ['BorrowRecord'],
+    'return': ['BorrowRecord'],
+    'login': ['User'],
+    'logout': ['User'],
+}
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def load_rows(model, fields, rows):
+    """
+    Insert `rows` (tuples in `fields` order; attnames, ids included) into
+    `model`'s table. Returns the number of rows written.
+    """
+    count = 0
+    if _can_copy(connection):
+        qn = connection.ops.quote_name
+        columns = ', '.join(qn(model._meta.get_field(name).column) for name in fields)
+        with connection.cursor() as cursor:
+            with cursor.cursor.copy(f"COPY {qn(model._meta.db_table)} ({columns}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+        return count
+
+    while True:
+        batch = [model(**dict(zip(fields, row))) for row in islice(rows, BATCH_SIZE)]
+        if not batch:
+            return count
+        model.objects.bulk_create(batch)
+        count += len(batch)
+
+
+def _set_counter_triggers(enabled):
+    if connection.vendor != 'postgresql':
+        return
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        # Django's foreign keys are deferred; run their checks now, since a
+        # table with pending trigger events can't be altered.
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        for model, trigger in COUNTER_TRIGGERS.items():
+            cursor.execute(
+                f"ALTER TABLE {qn(model._meta.db_table)} {'ENABLE' if enabled else 'DISABLE'} TRIGGER {qn(trigger)}"
+            )
+
+
+def _reset_sequences(models):
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def _moment(rng, start, span):
+    return start + datetime.timedelta(seconds=rng.random() * span.total_seconds())
+
+
+def _person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+class Generator:
+    """
+    Appends a data set of the given size to whatever is already in the
+    database: `departments`, `locations` and `users` (app accounts, who own
+    the history entries) plus `devices`, `staff`, `borrows` and `history`
+    spread over the last `months` months.
+    """
+
+    def __init__(self, devices, staff, borrows, history, departments=50, locations=100, users=50,
+                 months=24, open_ratio=0.3, seed=0, log=None):
+        self.sizes = {
+            'departments': departments, 'locations': locations, 'users': users,
+            'devices': devices, 'staff': staff, 'borrows': borrows, 'history': history,
+        }
+        self.months = months
+        self.open_ratio = open_ratio
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        self.start = self.now - datetime.timedelta(days=30.5 * months)
+
+    def run(self):
+        User = get_user_model()
+        models = [Department, Location, User, StaffRecord, Device, BorrowRecord]
+        self.first = {model: next_id(model) for model in models}
+        self.first[HistoryLog] = next_id(HistoryLog)
+
+        with transaction.atomic():
+            _set_counter_triggers(False)
+            self._load(Department, ['id', 'name', 'created_at'], self.departments())
+            self._load(Location, ['id', 'name', 'created_at'], self.locations())
+            self._load(User, ['id', 'email', 'full_name', 'password', 'is_active', 'is_staff', 'is_superuser', 'date_joined'], self.users())
+            self._load(StaffRecord, [
+                'id', 'full_name', 'email', 'status', 'department_id', 'user_account_created', 'created_at',
+            ], self.staff())
+            self._load(Device, ['id', 'name', 'model_brand', 'serial_number', 'status', 'location_id', 'created_at'],
+                       self.devices())
+            self._load(BorrowRecord, ['id', 'staff_id', 'device_id', 'pr_number', 'date_issued', 'date_returned', 'remarks'],
+                       self.borrow_records())
+            self._link_open_borrows()
+            _set_counter_triggers(True)
+            _reset_sequences(models)
+
+        ensure_partitions(since=self.start)
+        with transaction.atomic():
+            self._load(HistoryLog, [
+                'id', 'user_id', 'action', 'model_name', 'object_id', 'details', 'timestamp', 'ip_address',
+            ], self.history())
+            _reset_sequences([HistoryLog])
+        rebuild_counters()
+
+    def _load(self, model, fields, rows):
+        count = load_rows(model, fields, rows)
+        self.log(f"{model.__name__}: {count} row(s)")
+
+    def _ids(self, model, size):
+        first = self.first[model]
+        return range(first, first + self.sizes[size])
+
+    def departments(self):
+        for pk in self._ids(Department, 'departments'):
+            yield pk, f"Department {pk}", self.start
+
+    def locations(self):
+        for pk in self._ids(Location, 'locations'):
+            yield pk, f"Building {pk % 20 + 1} Room {pk}", self.start
+
+    def users(self):
+        password = make_password('benchmark')
+        for pk in self._ids(get_user_model(), 'users'):
+            yield pk, f"user{pk}@bench.example.com", _person(self.rng), password, True, True, False, self.start
+
+    def staff(self):
+        rng = self.rng
+        departments = self._ids(Department, 'departments')
+        for pk in self._ids(StaffRecord, 'staff'):
+            yield (
+                pk, _person(rng), f"staff{pk}@bench.example.com", rng.choice(STAFF_STATUSES),
+                rng.choice(departments) if departments else None, False, _moment(rng, self.start, self.now - self.start),
+            )
+
+    def devices(self):
+        rng = self.rng
+        locations = self._ids(Location, 'locations')
+        for pk in self._ids(Device, 'devices'):
+            # Borrowed devices get their status and current_borrow in
+            # _link_open_borrows once the records exist.
+            yield (
+                pk, rng.choice(DEVICE_NAMES), f"{rng.choice(BRANDS)} {rng.randint(100, 9999)}", f"SN{pk:09d}",
+                rng.choice(IDLE_STATUSES), rng.choice(locations) if locations else None,
+                _moment(rng, self.start, self.now - self.start),
+            )
+
+    def borrow_records(self):
+        """
+        Record k goes to device k % devices, so each device gets a run of
+        consecutive, non-overlapping loans spread over the period; a device's
+        last loan is still open with probability `open_ratio`.
+        """
+        rng = self.rng
+        devices = list(self._ids(Device, 'devices'))
+        staff = self._ids(StaffRecord, 'staff')
+        total = self.sizes['borrows']
+        if not devices or not staff:
+            return
+        rounds = -(-total // len(devices))
+        slot = (self.now - self.start) / rounds
+        first = self.first[BorrowRecord]
+        for k in range(total):
+            device_round, index = divmod(k, len(devices))
+            issued = self.start + slot * (device_round + rng.random() * 0.5)
+            last = k + len(devices) >= total
+            if last and rng.random() < self.open_ratio:
+                returned, remarks = None, ''
+            else:
+                returned, remarks = issued + slot * (0.1 + rng.random() * 0.3), 'available'
+            yield (
+                first + k, rng.choice(staff), devices[index], f"PR-{rng.randint(2020, 2030)}-{k % 100000:05d}",
+                issued, returned, remarks,
+            )
+
+    def _link_open_borrows(self):
+        generated = Device.objects.filter(pk__gte=self.first[Device])
+        open_record = BorrowRecord.objects.filter(device=OuterRef('pk'), date_returned__isnull=True).values('pk')[:1]
+        generated.update(current_borrow=Subquery(open_record))
+        generated.filter(current_borrow__isnull=False).update(status='borrowed')
+
+    def history(self):
+        rng = self.rng
+        users = self._ids(get_user_model(), 'users')
+        devices = self._ids(Device, 'devices')
+        span = self.now - self.start
+        for pk in self._ids(HistoryLog, 'history'):
+            action = rng.choice(ACTIONS)
+            model_name = rng.choice(ACTION_MODELS[action])
+            object_id = rng.choice(devices) if devices and model_name in ('Device', 'BorrowRecord') else rng.randint(1, 10000)
+            yield (
+                pk, rng.choice(users) if users else None, action, model_name, object_id,
+                f"{action.title()} {model_name} {object_id}", _moment(rng, self.start, span),
+                f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            )
@@ -1,3 +1,1231 @@
-from django.test import TestCase
+import csv
+import hashlib
+import json
+from datetime import datetime, timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import zipfile
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import openpyxl
+from PIL import Image
+from pypdf import PdfReader
+
+from .archive import (
+    ArchiveFile, ArchiveFilter, ArchiveSearch, ArchiveWriter, LogsWithArchive, archive_dir, archive_history, from_micros,
+)
+from .audit import audit_buffer
+from .benchmarks import default_benchmarks, regressions, run_benchmark
+from .borrowing import bulk_issue, bulk_return, issue_device, return_record
+from .counters import read_counters, rebuild_counters
+from .dates import InvalidDate, day_range, period_range
+from .exports import XLSX_CONTENT_TYPE, Sheet, iter_copy, iter_xlsx
+from .facets import _compute, device_facets, read_facets, rebuild_facets
+from .images import (
+    available_formats, build_derivatives, delete_derivatives, derivative_name, derivative_url, schedule_derivatives,
+)
+from .imports import ImportFormatError, import_devices, iter_sheet_rows
+from .instrumentation import QueryBudgetExceeded, RequestStatsMiddleware, query_budget
+from .jobs import run_export_job
+from .models import (
+    BorrowRecord, DashboardCounterDelta, Department, Device, ExportJob, HistoryFacet, HistoryLog, Location, StaffRecord,
+)
+from .pagination import EstimatedCountPaginator
+from .partitions import (
+    DEFAULT_PARTITION, add_months, drop_partitions_before, ensure_partitions, is_partitioned, list_partitions,
+    month_start, partition_name, truncate_history,
+)
+from .pdfpool import html_to_pdf
+from .receipts import ReceiptCache, _resources, get_receipt, receipt_filename, receipt_queryset, receipt_version
+from .search import EXACT, PREFIX, SUBSTRING, search_devices, search_staff
+from .storage import device_image_storage, release_image
+from .synthetic import Generator
+from .utils import record_action
+
+REQUEST_LOG = logging.getLogger('inventory.requests')
+
+
+def setUpModule():
+    # One JSON line per request would drown the test output.
+    REQUEST_LOG.disabled = True
+
+
+def tearDownModule():
+    REQUEST_LOG.disabled = False
+
+
+# Audit entries are saved as they are logged and receipts are rendered inline,
+# never in the background, so each test sees its own writes and starts no
+# threads or worker processes.
+TEST_SETTINGS = override_settings(AUDIT_LOG_MODE='sync', RECEIPT_PRERENDER=False, RECEIPT_RENDER_WORKERS=0)
+
+
+def temp_dir_setting(test, name):
+    """Point setting `name` at a fresh temporary directory for one test."""
+    path = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    test.enterContext(override_settings(**{name: path}))
+    return path
+
+
+@TEST_SETTINGS
+class InventoryTestCase(TestCase):
+    pass
+
+
+@TEST_SETTINGS
+class InventoryTransactionTestCase(TransactionTestCase):
+    pass
+
+
+class ConcurrentBorrowTests(InventoryTransactionTestCase):
+    """
+    Fire parallel borrow / return POSTs at inventory_view from real threads,
+    each with its own database connection, and check that exactly one wins.
+    """
+    WORKERS = 8
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        department = Department.objects.create(name='IT')
+        self.staff = [
+            StaffRecord.objects.create(full_name=f'Staff {i}', email=f'staff{i}@up.edu', department=department)
+            for i in range(self.WORKERS)
+        ]
+        self.device = Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number='SN-RACE')
+
+    def race(self, payloads):
+        barrier = threading.Barrier(len(payloads))
+        responses = [None] * len(payloads)
+
+        def worker(index, payload):
+            try:
+                client = Client()
+                client.force_login(self.user)
+                barrier.wait()
+                responses[index] = client.post(reverse('inventory'), payload)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(i, payload)) for i, payload in enumerate(payloads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_parallel_borrows_issue_device_once(self):
+        responses = self.race([
+            {'borrow_submit': '1', 'staff': staff.pk, 'device': self.device.pk, 'pr_number': f'PR-{i}'}
+            for i, staff in enumerate(self.staff)
+        ])
+
+        self.assertEqual(sum(response.status_code == 302 for response in responses), 1)
+        self.assertTrue(all(response.status_code in (200, 302) for response in responses))
+        self.assertEqual(BorrowRecord.objects.filter(device=self.device).count(), 1)
+        record = BorrowRecord.objects.get(device=self.device)
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.status, 'borrowed')
+        self.assertEqual(self.device.current_borrow_id, record.pk)
+
+    def test_parallel_returns_close_record_once(self):
+        record = issue_device(BorrowRecord(staff=self.staff[0], device=self.device, pr_number='PR-1'))
+
+        responses = self.race([
+            {'return_submit': '1', 'borrow_record': record.pk, 'device_status': status, 'return_remarks': status}
+            for status in ['available', 'damaged'] * (self.WORKERS // 2)
+        ])
+
+        self.assertEqual(sum(response.status_code == 302 for response in responses), 1)
+        record.refresh_from_db()
+        self.device.refresh_from_db()
+        self.assertIsNotNone(record.date_returned)
+        self.assertEqual(self.device.status, record.remarks)
+        self.assertIsNone(self.device.current_borrow_id)
+
+    def test_second_open_record_is_rejected_by_database(self):
+        BorrowRecord.objects.create(staff=self.staff[0], device=self.device, pr_number='PR-1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BorrowRecord.objects.create(staff=self.staff[1], device=self.device, pr_number='PR-2')
+
+    def test_migration_closes_duplicate_open_records(self):
+        # Records left by the race before unique_open_borrow_per_device existed.
+        close_duplicates = import_module('inventory.migrations.0004_device_current_borrow').close_duplicate_open_borrows
+        constraint = next(c for c in BorrowRecord._meta.constraints if c.name == 'unique_open_borrow_per_device')
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(BorrowRecord, constraint)
+        try:
+            first, second, newest = [
+                BorrowRecord.objects.create(staff=staff, device=self.device, pr_number=f'PR-{i}')
+                for i, staff in enumerate(self.staff[:3])
+            ]
+            close_duplicates(django_apps, None)
+        finally:
+            BorrowRecord.objects.filter(date_returned__isnull=True).exclude(pk=newest.pk).update(date_returned=timezone.now())
+            with connection.schema_editor() as editor:
+                editor.add_constraint(BorrowRecord, constraint)
+
+        newest.refresh_from_db()
+        self.assertIsNone(newest.date_returned)
+        for record in (first, second):
+            record.refresh_from_db()
+            self.assertEqual(record.date_returned, newest.date_issued)
+            self.assertIn(f"record #{newest.pk}", record.remarks)
+        self.assertEqual(BorrowRecord.objects.filter(date_returned__isnull=True).count(), 1)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "the counter triggers are PostgreSQL's")
+    def test_issue_and_return_run_side_by_side(self):
+        # issue_device() writes the device and then the record, return_record()
+        # the record and then the device. Each pauses after its first UPDATE
+        # until the other has made its own: the interleaving that deadlocked
+        # when the triggers updated shared counter rows.
+        other = Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number='SN-BACK')
+        record = issue_device(BorrowRecord(staff=self.staff[0], device=other, pr_number='PR-1'))
+        barrier = threading.Barrier(2, timeout=10)
+        errors = []
+
+        def worker(action):
+            paused = []
+
+            def pause_after_first_update(execute, sql, params, many, context):
+                result = execute(sql, params, many, context)
+                if not paused and sql.startswith('UPDATE'):
+                    paused.append(sql)
+                    barrier.wait()
+                return result
+
+            try:
+                with connection.execute_wrapper(pause_after_first_update):
+                    action()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(
+                lambda: issue_device(BorrowRecord(staff=self.staff[1], device=self.device, pr_number='PR-2')),
+            )),
+            threading.Thread(target=worker, args=(lambda: return_record(record, 'available'),)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        counters = read_counters()
+        self.assertEqual(counters['borrows:open'], 1)
+        self.assertEqual(counters['devices:borrowed'], 1)
+        self.assertEqual(counters['devices:available'], 1)
+
+        pending = DashboardCounterDelta.objects.count()
+        self.assertGreater(pending, 0)
+        self.assertEqual(read_counters(), counters)
+        self.assertEqual(DashboardCounterDelta.objects.count(), pending)  # reads never fold
+        call_command('rebuild_dashboard_counters', '--compact', stdout=StringIO())
+        self.assertEqual(DashboardCounterDelta.objects.count(), 0)
+        self.assertEqual(read_counters(), counters)
+        self.assertEqual({name: value for name, value in counters.items() if value}, rebuild_counters())
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "the counter triggers are PostgreSQL's")
+    def test_device_writes_do_not_wait_for_each_other(self):
+        other = Device.objects.create(name='MONITOR', model_brand='Dell', serial_number='SN-OTHER')
+        holding, release = threading.Event(), threading.Event()
+
+        def hold():
+            try:
+                with transaction.atomic():
+                    Device.objects.filter(pk=self.device.pk).update(status='maintenance')
+                    holding.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        try:
+            self.assertTrue(holding.wait(10))
+            # Fails with a lock timeout if the two writes share a locked row.
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = '2s'")
+                Device.objects.filter(pk=other.pk).update(status='maintenance')
+                Device.objects.create(name='UPS', model_brand='APC', serial_number='SN-NEW')
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(read_counters()['devices:maintenance'], 2)
+
+
+class ExportTests(InventoryTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        self.client.force_login(self.user)
+
+    def test_streamed_xlsx_opens_in_openpyxl(self):
+        rows = [(i, f'Device <{i}> & "co"', i / 4, i % 2 == 0, None if i % 3 else '') for i in range(1, 601)]
+        sheets = [
+            Sheet('Devices', ['ID', 'Name', 'Ratio', 'Even', 'Blank'], iter(rows), [10, 30, 10, 10, 10]),
+            Sheet('A sheet title that is longer than Excel allows', ['Text'], iter([('bell\x07 and tab\t',)])),
+        ]
+        workbook = openpyxl.load_workbook(BytesIO(b''.join(iter_xlsx(sheets))))
+        self.assertEqual(workbook.sheetnames, ['Devices', 'A sheet title that is longer th'])
+        devices = list(workbook['Devices'].values)
+        self.assertEqual(devices[0], ('ID', 'Name', 'Ratio', 'Even', 'Blank'))
+        self.assertEqual(devices[1:], [(i, name, ratio, even, None) for i, name, ratio, even, _ in rows])
+        self.assertEqual(list(workbook.worksheets[1].values), [('Text',), ('bell and tab\t',)])
+
+    def test_xlsx_cells_excel_cannot_hold_become_text_or_local_dates(self):
+        created = timezone.make_aware(datetime(2026, 3, 1, 9, 30))
+        sheet = Sheet('Values', ['Created', 'Inf', 'NaN'], iter([(created, float('inf'), float('nan'))]))
+        workbook = openpyxl.load_workbook(BytesIO(b''.join(iter_xlsx([sheet]))))
+        cell = workbook['Values']['A2']
+        self.assertEqual(cell.value, datetime(2026, 3, 1, 9, 30))
+        self.assertTrue(cell.is_date)
+        self.assertEqual([c.value for c in workbook['Values'][2][1:]], ['inf', 'nan'])
+
+    def test_device_export_view_lists_every_device(self):
+        location = Location.objects.create(name='Lab')
+        for i in range(3):
+            Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number=f'SN-{i}', location=location if i else None)
+        response = self.client.get(reverse('export_device_excel'))
+        self.assertEqual(response['Content-Type'], XLSX_CONTENT_TYPE)
+        rows = list(openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))['Devices'].values)
+        self.assertEqual(rows[0][:3], ('Name', 'Model/Brand', 'Serial Number'))
+        self.assertEqual(sorted((row[2], row[4]) for row in rows[1:]), [('SN-0', None), ('SN-1', 'Lab'), ('SN-2', 'Lab')])
+
+    def test_copy_formats_match_the_orm_rows(self):
+        location = Location.objects.create(name='Lab, "North"')
+        for i in range(5):
+            Device.objects.create(name='LAPTOP', model_brand=f'Dell\nLine {i}', serial_number=f'SN-{i}', location=location if i % 2 else None)
+        columns = [('Serial Number', 'serial_number'), ('Brand', 'model_brand'), ('Location', 'location__name'), ('Created', 'created_at')]
+        devices = Device.objects.order_by('serial_number')
+        expected = list(devices.values_list(*[field for _, field in columns]))
+
+        text = b''.join(iter_copy(devices, columns, 'csv')).decode()
+        rows = list(csv.reader(StringIO(text)))
+        self.assertEqual(rows[0], [header for header, _ in columns])
+        self.assertEqual(
+            [(serial, brand, location or None, parse_datetime(created)) for serial, brand, location, created in rows[1:]],
+            expected,
+        )
+
+        lines = b''.join(iter_copy(devices, columns, 'ndjson', extra_rows=[('SN-X', 'HP', None, None)])).decode().splitlines()
+        documents = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [(d['Serial Number'], d['Brand'], d['Location'], d['Created'] and parse_datetime(d['Created'])) for d in documents],
+            expected + [('SN-X', 'HP', None, None)],
+        )
+
+        response = self.client.get(reverse('export_device_excel'), {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))), 6)
+
+
+class ExportJobTests(InventoryTransactionTestCase):
+    """run_export_job() closes its connection, so these run outside a test transaction."""
+
+    def setUp(self):
+        temp_dir_setting(self, 'EXPORT_JOB_DIR')
+        self.user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        self.client.force_login(self.user)
+        for i in range(3):
+            record_action(self.user, 'create', 'Device', i, f'Added {i}')
+
+    def status(self, job):
+        return self.client.get(reverse('export_job_status', args=[job.pk])).json()
+
+    def test_job_runs_downloads_and_expires(self):
+        job = ExportJob.objects.create(user=self.user, kind='history', params={'action': 'create'})
+        self.assertEqual(self.status(job)['progress'], 0)
+
+        run_export_job(job.pk)
+        status = self.status(job)
+        self.assertEqual((status['status'], status['progress'], status['rows_written'], status['rows_total']), ('done', 100, 3, 3))
+        response = self.client.get(status['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(zipfile.is_zipfile(BytesIO(b''.join(response.streaming_content))))
+        response.close()
+        self.assertTrue(HistoryLog.objects.filter(action='export', model_name='HistoryLog').exists())
+
+        job.refresh_from_db()
+        path = job.file.path
+        self.assertTrue(path.startswith(settings.EXPORT_JOB_DIR))
+        self.assertRaises(ValueError, lambda: job.file.url)  # never served from MEDIA_URL
+        call_command('purge_export_jobs', stdout=StringIO())
+        self.assertTrue(os.path.exists(path))  # not expired yet
+
+        ExportJob.objects.filter(pk=job.pk).update(expires_at=timezone.now())
+        out = StringIO()
+        call_command('purge_export_jobs', stdout=out)
+        self.assertIn('Purged 1', out.getvalue())
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.status(job)['status'], 'expired')
+        self.assertEqual(self.client.get(reverse('download_export_job', args=[job.pk])).status_code, 404)
+
+    def test_failed_job_reports_its_error(self):
+        job = ExportJob.objects.create(user=self.user, kind='unknown')
+        run_export_job(job.pk)
+        status = self.status(job)
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn('unknown', status['error'])
+        self.assertIsNone(status['download_url'])
+
+    def test_jobs_lost_to_a_restart_fail_instead_of_polling_forever(self):
+        lost = ExportJob.objects.create(user=self.user, kind='history', status='running')
+        queued = ExportJob.objects.create(user=self.user, kind='history')
+        fresh = ExportJob.objects.create(user=self.user, kind='history', status='running')
+        ExportJob.objects.filter(pk__in=[lost.pk, queued.pk]).update(created_at=timezone.now() - timedelta(hours=7))
+
+        status = self.status(lost)
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn('interrupted', status['error'])
+        self.assertEqual(self.status(fresh)['status'], 'running')
+
+        call_command('purge_export_jobs', stdout=StringIO())
+        self.assertEqual(
+            dict(ExportJob.objects.values_list('pk', 'status')),
+            {lost.pk: 'failed', queued.pk: 'failed', fresh.pk: 'running'},
+        )
+
+    def test_other_users_cannot_see_a_job(self):
+        job = ExportJob.objects.create(user=self.user, kind='history')
+        other = get_user_model().objects.create_user('other@up.edu', 'pw', full_name='Other')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('export_job_status', args=[job.pk])).status_code, 404)
+
+
+class SearchTests(InventoryTestCase):
+    def test_whole_matches_rank_above_prefixes_and_substrings(self):
+        room = Location.objects.create(name='Dell Room')
+        devices = {
+            label: Device.objects.create(name='LAPTOP', model_brand=brand, serial_number=f'SN-{label}', location=location)
+            for label, brand, location in [
+                ('substring', 'Old Dell box', None), ('prefix', 'Dell Latitude', None), ('exact', 'DELL', None),
+                ('location', 'HP', room), ('none', 'HP', None),
+            ]
+        }
+        found = search_devices(Device.objects.all(), 'dell').order_by('-rank', 'pk')
+        self.assertEqual(
+            [(device.serial_number, device.rank) for device in found],
+            [('SN-exact', EXACT), ('SN-prefix', PREFIX), ('SN-substring', SUBSTRING), ('SN-location', SUBSTRING)],
+        )
+        self.assertEqual(list(search_devices(Device.objects.all(), 'maintenance')), [])
+        Device.objects.filter(pk=devices['none'].pk).update(status='maintenance')
+        self.assertEqual([device.pk for device in search_devices(Device.objects.all(), 'maintenance')], [devices['none'].pk])
+
+        self.client.force_login(get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk'))
+        response = self.client.get(reverse('devices'), {'q': 'dell'})
+        self.assertEqual([device.serial_number for device in response.context['devices']][:2], ['SN-exact', 'SN-prefix'])
+
+    def test_staff_match_on_name_email_or_department(self):
+        finance = Department.objects.create(name='Finance')
+        santos = StaffRecord.objects.create(full_name='Ana Santos', email='ana@up.edu')
+        exact = StaffRecord.objects.create(full_name='Santos', email='s@up.edu')
+        clerk = StaffRecord.objects.create(full_name='Ben Cruz', email='santos.b@up.edu', department=finance)
+        found = search_staff(StaffRecord.objects.all(), 'santos').order_by('-rank', 'pk')
+        self.assertEqual([(staff.pk, staff.rank) for staff in found], [(exact.pk, EXACT), (clerk.pk, PREFIX), (santos.pk, SUBSTRING)])
+        self.assertEqual(list(search_staff(StaffRecord.objects.all(), 'finance')), [clerk])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "the history log is only partitioned on PostgreSQL")
+class HistoryPartitionTests(InventoryTestCase):
+    def partition_of(self, log):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM inventory_historylog WHERE id = %s", [log.pk])
+            return cursor.fetchone()[0]
+
+    def test_new_partition_takes_rows_from_the_default_partition(self):
+        self.assertTrue(is_partitioned())
+        month = add_months(month_start(timezone.now()), 12)
+        early = HistoryLog.objects.create(action='login', model_name='User', timestamp=month + timedelta(days=2))
+        late = HistoryLog.objects.create(action='login', model_name='User', timestamp=add_months(month, 1) + timedelta(days=2))
+        self.assertEqual(self.partition_of(early), DEFAULT_PARTITION)
+
+        self.assertIn(partition_name(month), ensure_partitions(months_ahead=12))
+        self.assertEqual(self.partition_of(early), partition_name(month))
+        self.assertEqual(self.partition_of(late), DEFAULT_PARTITION)
+        self.assertEqual(ensure_partitions(months_ahead=12), [])
+        self.assertEqual(read_facets(), _compute())
+
+        out = StringIO()
+        call_command('maintain_history_partitions', '--no-prune', stdout=out)
+        self.assertEqual(out.getvalue(), '')
+
+
+class DeviceImportTests(InventoryTestCase):
+    def setUp(self):
+        Location.objects.create(name='Lab')
+        Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number='SN-OLD')
+
+    def test_csv_rows_are_imported_or_reported_by_line(self):
+        upload = BytesIO(
+            '\ufeffAsset Name,Model/Brand,Serial Number,Location\n'
+            'laptop,Dell,SN-1,lab\n'
+            ',Dell,SN-2,\n'
+            'laptop,Dell,SN-1,\n'
+            '\n'
+            'monitor,LG,SN-3,Attic\n'
+            'monitor,LG,SN-OLD,\n'
+            f'monitor,LG,{"9" * 300},\n'
+            'printer,HP,SN-4,\n'.encode()
+        )
+        result = import_devices(iter_sheet_rows(upload, 'devices.csv'), source='devices.csv')
+        self.assertEqual((result.rows, result.created), (7, 2))
+        self.assertEqual(result.errors, [
+            (3, 'name is required'),
+            (4, 'serial number SN-1 repeats row 2'),
+            (6, "unknown location 'Attic'"),
+            (7, 'serial number SN-OLD already exists'),
+            (8, 'serial_number is longer than 100 characters'),
+        ])
+        self.assertEqual(
+            list(Device.objects.filter(serial_number__in=['SN-1', 'SN-4']).values_list('name', 'location__name').order_by('serial_number')),
+            [('LAPTOP', 'Lab'), ('PRINTER', None)],
+        )
+        self.assertTrue(HistoryLog.objects.filter(details='Imported 2 device(s) from devices.csv; 5 row(s) rejected').exists())
+
+    def test_a_concurrent_insert_is_reported_apart_from_the_rows(self):
+        upload = BytesIO(b'Name,Brand,Serial\nlaptop,Dell,SN-1\n,Dell,SN-2\n')
+        with unittest.mock.patch.object(Device.objects, 'bulk_create', side_effect=IntegrityError):
+            result = import_devices(iter_sheet_rows(upload, 'devices.csv'))
+        self.assertEqual((result.created, result.errors), (0, [(3, 'name is required')]))
+        self.assertEqual(len(result.non_line_errors), 1)
+        self.assertIn('nothing was imported', result.non_line_errors[0])
+
+    def test_command_dry_run_reads_xlsx(self):
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['Device', 'Brand', 'Serial'])
+        workbook.active.append(['laptop', 'Dell', 'SN-1'])
+        workbook.active.append(['laptop', None, 'SN-2'])
+        path = os.path.join(tempfile.mkdtemp(), 'devices.xlsx')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        workbook.save(path)
+
+        out = StringIO()
+        call_command('import_devices', path, '--dry-run', stdout=out)
+        self.assertIn('Row 3: model_brand is required', out.getvalue())
+        self.assertIn('Would import 1 of 2 row(s); 1 rejected.', out.getvalue())
+        self.assertFalse(Device.objects.filter(serial_number='SN-1').exists())
+
+    def test_unusable_files_are_rejected(self):
+        with self.assertRaisesMessage(ImportFormatError, 'Missing column(s): serial_number.'):
+            import_devices(iter_sheet_rows(BytesIO(b'Name,Brand\nlaptop,Dell\n'), 'devices.csv'))
+        with self.assertRaises(ImportFormatError):
+            import_devices(iter_sheet_rows(BytesIO(b''), 'devices.txt'))
+
+
+class BulkBorrowTests(InventoryTestCase):
+    def setUp(self):
+        department = Department.objects.create(name='IT')
+        self.staff = StaffRecord.objects.create(full_name='Ana Santos', email='ana@up.edu', department=department)
+        self.inactive = StaffRecord.objects.create(full_name='Ben Cruz', email='ben@up.edu', department=department, status='inactive')
+        self.devices = [
+            Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number=f'SN-{i}') for i in range(4)
+        ]
+        Device.objects.filter(pk=self.devices[3].pk).update(status='maintenance')
+
+    def test_bulk_issue_and_return_skip_what_they_cannot_do(self):
+        a, b, c, broken = [device.pk for device in self.devices]
+        issued, errors = bulk_issue(
+            [(self.staff.pk, a), (self.staff.pk, b), (self.staff.pk, a), (self.inactive.pk, c), (self.staff.pk, broken), (self.staff.pk, 0)],
+            'PR-7',
+        )
+        self.assertEqual([record.device_id for record in issued], [a, b])
+        self.assertEqual([line for line, _ in errors], [3, 4, 5, 6])
+        self.assertEqual(errors[0], (3, 'device is listed more than once'))
+        self.assertEqual(
+            dict(Device.objects.filter(pk__in=[a, b, c]).values_list('pk', 'status')),
+            {a: 'borrowed', b: 'borrowed', c: 'available'},
+        )
+        self.assertEqual(Device.objects.get(pk=a).current_borrow_id, issued[0].pk)
+        self.assertEqual(read_counters()['borrows:open'], 2)
+        self.assertEqual(HistoryLog.objects.filter(action='borrow', details__startswith='Bulk issued 2 device(s) under PR PR-7').count(), 1)
+
+        returned, errors = bulk_return([issued[0].pk, issued[1].pk, issued[0].pk, 0], 'maintenance', remarks='Dropped')
+        self.assertEqual(len(returned), 2)
+        self.assertEqual(errors, [(0, 'record not found')])
+        self.assertFalse(BorrowRecord.objects.filter(date_returned__isnull=True).exists())
+        self.assertFalse(Device.objects.filter(current_borrow__isnull=False).exists())
+        self.assertEqual(Device.objects.get(pk=b).status, 'maintenance')
+        self.assertEqual(read_counters()['borrows:open'], 0)
+
+        self.assertEqual(bulk_return([issued[0].pk])[1], [(issued[0].pk, 'already returned')])
+        with self.assertRaises(ValueError):
+            bulk_return([issued[0].pk], 'borrowed')
+
+
+class ReceiptTests(InventoryTestCase):
+    def setUp(self):
+        temp_dir_setting(self, 'RECEIPT_CACHE_DIR')
+        self.user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        self.client.force_login(self.user)
+        self.staff = StaffRecord.objects.create(
+            full_name='Ana Santos', email='ana@up.edu', department=Department.objects.create(name='IT')
+        )
+
+    def issue(self, count):
+        return [
+            issue_device(BorrowRecord(
+                staff=self.staff,
+                device=Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number=f'SN-{i}'),
+                pr_number=f'PR-{i}',
+            ))
+            for i in range(count)
+        ]
+
+    def test_cache_hits_until_the_receipt_changes(self):
+        record = receipt_queryset().get(pk=self.issue(1)[0].pk)
+        path = get_receipt(record)
+        os.utime(path, (0, 0))
+        self.assertEqual(get_receipt(receipt_queryset().get(pk=record.pk)), path)
+        self.assertGreater(os.path.getmtime(path), 0)  # a hit counts as a use
+
+        Device.objects.filter(pk=record.device_id).update(model_brand='Lenovo')
+        edited = get_receipt(receipt_queryset().get(pk=record.pk))
+        self.assertNotEqual(edited, path)
+        self.assertFalse(os.path.exists(path))
+
+        return_record(receipt_queryset().get(pk=record.pk), 'available')
+        returned = receipt_queryset().get(pk=record.pk)
+        self.assertNotEqual(receipt_version(returned), receipt_version(record))
+        self.assertEqual(os.listdir(settings.RECEIPT_CACHE_DIR), [os.path.basename(edited)])
+
+    def test_static_references_resolve_through_the_finders(self):
+        logo = f'{settings.STATIC_URL}images/logo.png'
+        html = f'<html><body><img src="{logo}"></body></html>'
+        resources = _resources(html + f'<img src="{settings.STATIC_URL}images/missing.png">')
+        self.assertEqual(resources, {settings.MEDIA_URL: settings.MEDIA_ROOT, logo: finders.find('images/logo.png')})
+        self.assertEqual(len(PdfReader(BytesIO(html_to_pdf(html, resources))).pages[0].images), 1)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = ReceiptCache(settings.RECEIPT_CACHE_DIR, max_bytes=35)
+        for record_id in range(1, 4):
+            os.utime(cache.put(record_id, 'v1', b'x' * 10), (record_id, record_id))
+        cache.get(1, 'v1')
+        cache.put(4, 'v1', b'x' * 10)
+        self.assertEqual(sorted(os.listdir(settings.RECEIPT_CACHE_DIR)), ['1-v1.pdf', '3-v1.pdf', '4-v1.pdf'])
+        self.assertIsNone(cache.get(2, 'v1'))
+
+    @override_settings(RECEIPT_BUNDLE_PDF_MAX=2)
+    def test_bundle_streams_a_zip_and_caps_merged_pdfs(self):
+        records = self.issue(3)
+        response = self.client.get(reverse('receipt_bundle'), {'open': '1'})
+        self.assertTrue(response.streaming)
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as bundle:
+            self.assertEqual(sorted(bundle.namelist()), sorted(receipt_filename(record) for record in records))
+            self.assertTrue(all(bundle.read(name).startswith(b'%PDF') for name in bundle.namelist()))
+
+        response = self.client.get(reverse('receipt_bundle'), {'open': '1', 'format': 'pdf'})
+        self.assertRedirects(response, reverse('inventory'), fetch_redirect_response=False)
+        self.assertIn("a merged PDF holds at most 2", str(list(get_messages(response.wsgi_request))[0]))
+
+        with self.settings(RECEIPT_BUNDLE_PDF_MAX=3):
+            response = self.client.get(reverse('receipt_bundle'), {'open': '1', 'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertGreaterEqual(len(PdfReader(BytesIO(b''.join(response.streaming_content))).pages), 3)
+
+
+class DeviceImageTests(InventoryTestCase):
+    def setUp(self):
+        temp_dir_setting(self, 'MEDIA_ROOT')
+        self.storage = device_image_storage()
+
+    def png(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def stored_name(self, content):
+        return f'device_images/{hashlib.sha256(content).hexdigest()}.png'
+
+    def test_derivatives_are_scaled_down_copies(self):
+        buffer = BytesIO()
+        Image.new('P', (800, 400)).save(buffer, 'PNG', transparency=0)
+        name = self.storage.save('device_images/photo.png', ContentFile(buffer.getvalue()))
+        formats = available_formats()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            schedule_derivatives(name)
+            schedule_derivatives('')
+        self.assertEqual(len(callbacks), 1)
+
+        written = build_derivatives(name)
+        self.assertEqual(len(written), 2 * len(formats))
+        for fmt in formats:
+            self.assertIsNotNone(derivative_url(name, 'thumb', fmt))
+            with self.storage.open(derivative_name(name, 'thumb', fmt)) as fh, Image.open(fh) as thumb:
+                self.assertEqual((thumb.size, thumb.mode), ((160, 80), 'RGBA'))
+        self.assertEqual(build_derivatives(name), [])
+        self.assertEqual(len(build_derivatives(name, force=True)), len(written))
+
+        out = StringIO()
+        call_command('build_image_derivatives', stdout=out)
+        self.assertIn('Built derivatives for 0 of 1 image(s); 0 failed.', out.getvalue())
+
+        delete_derivatives(name)
+        self.assertIsNone(derivative_url(name, 'medium', 'webp'))
+        call_command('build_image_derivatives', stdout=out)
+        self.assertIn('Built derivatives for 1 of 1 image(s); 0 failed.', out.getvalue())
+
+    def test_same_bytes_are_stored_once_and_released_after_commit(self):
+        red = self.png('red')
+        name = self.storage.save('device_images/front.PNG', ContentFile(red))
+        self.assertEqual(self.storage.save('device_images/back.png', ContentFile(red)), name)
+        self.assertEqual(name, self.stored_name(red))
+        self.assertEqual(len(self.storage.listdir('device_images')[1]), 1)
+        first, second = [
+            Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number=f'SN-{i}', image=name) for i in range(2)
+        ]
+
+        with self.settings(DEVICE_IMAGE_GC_GRACE=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                first.delete()
+                release_image(name)
+                self.assertTrue(self.storage.exists(name))  # not before the commit
+            self.assertTrue(self.storage.exists(name))  # still used by the second device
+
+            second.delete()
+            with self.captureOnCommitCallbacks(execute=True):
+                release_image(name)
+            self.assertFalse(self.storage.exists(name))
+
+        # A fresh upload of the same bytes is kept through the grace period.
+        self.storage.save('device_images/again.png', ContentFile(red))
+        with self.captureOnCommitCallbacks(execute=True):
+            release_image(name)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_dedupe_removes_unused_copies_it_made(self):
+        red, blue = self.png('red'), self.png('blue')
+        legacy = FileSystemStorage()  # names as uploads were stored before
+        photo = legacy.save('device_images/photo.png', ContentFile(red))
+        legacy.save('device_images/photo_copy.png', ContentFile(red))
+        legacy.save('device_images/old.png', ContentFile(blue))
+        device = Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number='SN-1', image=photo)
+
+        report = StringIO()
+        call_command('dedupe_device_images', '--dry-run', stdout=report)
+        self.assertIn(f"{self.stored_name(blue)}: unused", report.getvalue())
+        self.assertNotIn(f"{self.stored_name(red)}: unused", report.getvalue())
+        self.assertIn("would remove 1 unused file(s)", report.getvalue())
+
+        call_command('dedupe_device_images', stdout=StringIO())
+        device.refresh_from_db()
+        self.assertEqual(device.image.name, self.stored_name(red))
+        self.assertEqual(self.storage.listdir('device_images')[1], [self.stored_name(red).split('/')[1]])
+
+
+# A long interval keeps the flusher thread (and its own connection) asleep;
+# the tests flush by hand, inside the test transaction.
+@override_settings(AUDIT_LOG_MODE='buffered', AUDIT_LOG_FLUSH_INTERVAL=3600)
+class AuditBufferTests(InventoryTestCase):
+    def tearDown(self):
+        audit_buffer.flush()
+
+    def test_entries_are_queued_when_their_transaction_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                record_action(None, 'login', 'User', details='kept')
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                record_action(None, 'login', 'User', details='rolled back')
+                raise DatabaseError("action failed")
+            self.assertEqual(audit_buffer.pending(), 0)
+        self.assertEqual(len(callbacks), 1)
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(audit_buffer.pending(), 1)
+        self.assertEqual(audit_buffer.flush(), 1)
+        self.assertEqual(list(HistoryLog.objects.values_list('details', flat=True)), ['kept'])
+
+
+@override_settings(QUERY_BUDGETS_STRICT=True)
+class QueryBudgetTests(InventoryTestCase):
+    """
+    Every list page must stay within its @query_budget with enough rows that
+    a per-row lookup (device.location, record.staff, log.user, ...) would
+    blow it; RequestStatsMiddleware raises QueryBudgetExceeded when it doesn't.
+    """
+    ROWS = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        users = [
+            get_user_model().objects.create_user(f'user{i}@up.edu', 'pw', full_name=f'User {i}')
+            for i in range(cls.ROWS)
+        ]
+        for i in range(cls.ROWS):
+            department = Department.objects.create(name=f'Dept {i}')
+            location = Location.objects.create(name=f'Room {i}')
+            staff = StaffRecord.objects.create(full_name=f'Staff {i}', email=f'staff{i}@up.edu', department=department)
+            device = Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number=f'SN-{i}', location=location)
+            record = issue_device(BorrowRecord(staff=staff, device=device, pr_number=f'PR-{i}'))
+            if i % 2:
+                record.date_returned = record.date_issued
+                BorrowRecord.objects.filter(pk=record.pk).update(date_returned=record.date_issued)
+                Device.objects.filter(pk=device.pk).update(status='available', current_borrow=None)
+            record_action(users[i], 'create', 'Device', device.pk, f'Added {device}')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_pages_stay_within_budget(self):
+        for name in ['dashboard', 'inventory', 'staff', 'department', 'devices', 'location', 'history_log', 'create_user']:
+            with self.subTest(page=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNotNone(response.request_stats.budget, f"{name} has no @query_budget")
+                self.assertEqual(response.request_stats.duplicates, 0, response.request_stats.most_repeated())
+
+    def test_search_and_later_pages_stay_within_budget(self):
+        for url in [
+            '/devices/?q=SN&page=2', '/inventory?page=2', '/history/?page=2', '/staff/?q=Staff',
+            '/autocomplete/staff/?q=st', '/autocomplete/devices/?q=SN-1', '/autocomplete/borrow-records/?q=Staff',
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_n_plus_one_view_exceeds_budget(self):
+        @query_budget(3)
+        def view(request):
+            return HttpResponse(', '.join(str(device.location) for device in Device.objects.all()))
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = RequestStatsMiddleware(get_response)
+        with self.assertRaises(QueryBudgetExceeded):
+            middleware(RequestFactory().get('/'))
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        response = self.client.get(reverse('devices'))
+        self.assertEqual(int(response['X-Query-Count']), response.request_stats.queries)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+
+
+class AutocompleteTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        department = Department.objects.create(name='IT')
+        cls.maria = StaffRecord.objects.create(full_name='Maria Santos', email='maria@up.edu', department=department)
+        cls.mark = StaffRecord.objects.create(full_name='Mark Reyes', email='mark@up.edu', status='resigned')
+        cls.laptop = Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number='SN-100')
+        cls.printer = Device.objects.create(name='PRINTER', model_brand='Epson', serial_number='SN-200')
+        cls.record = issue_device(BorrowRecord(staff=cls.maria, device=cls.printer, pr_number='PR-1'))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def results(self, name, **params):
+        return self.client.get(reverse(name), params).json()['results']
+
+    def test_staff_prefix_and_substring(self):
+        self.assertEqual([r['id'] for r in self.results('autocomplete_staff', q='ma')], [self.maria.pk])
+        self.assertEqual([r['id'] for r in self.results('autocomplete_staff', q='reyes', all='1')], [self.mark.pk])
+        self.assertEqual(self.results('autocomplete_staff', q='reyes'), [])
+        self.assertEqual(self.results('autocomplete_staff', q=''), [])
+
+    def test_devices_only_available(self):
+        self.assertEqual([r['id'] for r in self.results('autocomplete_devices', q='SN-')], [self.laptop.pk])
+
+    def test_open_records_by_staff_or_device(self):
+        self.assertEqual([r['id'] for r in self.results('autocomplete_borrow_records', q='santos')], [self.record.pk])
+        self.assertEqual([r['id'] for r in self.results('autocomplete_borrow_records', q='SN-200')], [self.record.pk])
+        self.assertEqual(self.results('autocomplete_borrow_records', q='SN-100'), [])
+
+    def test_borrow_rejects_ids_outside_the_choices(self):
+        response = self.client.post(reverse('inventory'), {
+            'borrow_submit': '1', 'staff': self.mark.pk, 'device': self.printer.pk, 'pr_number': 'PR-2',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(BorrowRecord.objects.count(), 1)
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "EXPLAIN output is PostgreSQL's")
+class QueryPlanTests(InventoryTestCase):
+    """
+    EXPLAIN each list view's page query (the ordered one on its main table,
+    captured from a real request) and fail on a Seq Scan or Sort node. The
+    planner is told to avoid both, so one only shows up when no index can
+    produce the rows in order; the test data is too small for costs to mean
+    anything on their own.
+    """
+    BAD_NODES = {'Seq Scan', 'Sort', 'Incremental Sort'}
+
+    @classmethod
+    def setUpTestData(cls):
+        Generator(devices=300, staff=100, borrows=1000, history=2000, departments=5, locations=10, users=5, seed=2).run()
+        cls.user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        cls.staff = BorrowRecord.objects.filter(date_returned__isnull=True).values_list('staff', flat=True).first()
+        cls.email = HistoryLog.objects.filter(user__isnull=False).values_list('user__email', flat=True).first()
+        issued = BorrowRecord.objects.filter(date_returned__isnull=True).latest('date_issued').date_issued
+        logged = HistoryLog.objects.latest('timestamp').timestamp
+        cls.issued_day = f'{timezone.localdate(issued):%Y-%m-%d}'
+        cls.log_day = f'{timezone.localdate(logged):%Y-%m-%d}'
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def page_queries(self, name, params, table):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(reverse(name), params).status_code, 200)
+        queries = [
+            query['sql'] for query in captured
+            if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql'] and ' ORDER BY ' in query['sql']
+        ]
+        self.assertTrue(queries, f"no ordered query on {table}")
+        return queries
+
+    def plan_nodes(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        nodes, stack = [], [plan[0]['Plan']]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.get('Plans', []))
+        return nodes
+
+    def test_page_queries_use_indexes(self):
+        cases = [
+            ('dashboard', {}, 'inventory_borrowrecord'),
+            ('inventory', {}, 'inventory_borrowrecord'),
+            ('inventory', {'staff_name': self.staff}, 'inventory_borrowrecord'),
+            ('devices', {}, 'inventory_device'),
+            ('devices', {'status': 'available'}, 'inventory_device'),
+            ('staff', {}, 'inventory_staffrecord'),
+            ('staff', {'status': 'active'}, 'inventory_staffrecord'),
+            ('history_log', {}, 'inventory_historylog'),
+            ('history_log', {'action': 'login'}, 'inventory_historylog'),
+            ('history_log', {'model': 'Device'}, 'inventory_historylog'),
+            ('history_log', {'user': self.email}, 'inventory_historylog'),
+            ('history_log', {'date_from': self.log_day, 'date_to': self.log_day}, 'inventory_historylog'),
+            ('inventory', {'date': self.issued_day}, 'inventory_borrowrecord'),
+        ]
+        for name, params, table in cases:
+            for sql in self.page_queries(name, params, table):
+                with self.subTest(view=name, params=params, sql=sql[:120]):
+                    bad = [
+                        f"{node['Node Type']} on {node.get('Relation Name', '-')}"
+                        for node in self.plan_nodes(sql) if node['Node Type'] in self.BAD_NODES
+                    ]
+                    self.assertEqual(bad, [])
+
+
+class DateFilterTests(InventoryTestCase):
+    def test_day_range_is_half_open_in_local_time(self):
+        start, end = day_range('2025-03-01', '2025-03-31')
+        self.assertEqual(start, timezone.make_aware(datetime(2025, 3, 1)))
+        self.assertEqual(end, timezone.make_aware(datetime(2025, 4, 1)))
+        self.assertEqual(day_range('', '2025-03-31')[0], None)
+        self.assertEqual(period_range(2024, 12), (
+            timezone.make_aware(datetime(2024, 12, 1)), timezone.make_aware(datetime(2025, 1, 1)),
+        ))
+        self.assertEqual(period_range('2024', '2', '29')[1], timezone.make_aware(datetime(2024, 3, 1)))
+        for bad in ['2025-02-30', '03/01/2025', 'yesterday']:
+            with self.subTest(value=bad), self.assertRaises(InvalidDate):
+                day_range(bad)
+        with self.assertRaises(InvalidDate):
+            period_range('2024', '13')
+
+    def test_list_and_export_views_filter_on_local_days(self):
+        user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        self.client.force_login(user)
+        last_second = timezone.make_aware(datetime(2025, 3, 31, 23, 59, 59))
+        for serial, created in [('SN-IN', last_second), ('SN-OUT', last_second + timedelta(seconds=1))]:
+            device = Device.objects.create(name='LAPTOP', model_brand='Dell', serial_number=serial)
+            Device.objects.filter(pk=device.pk).update(created_at=created)
+        dates = {'start_date': '2025-03-31', 'end_date': '2025-03-31'}
+
+        response = self.client.get(reverse('devices'), dates)
+        self.assertEqual([device.serial_number for device in response.context['devices']], ['SN-IN'])
+        export = self.client.get(reverse('export_device_excel'), {**dates, 'format': 'csv'})
+        body = b''.join(export.streaming_content).decode()
+        self.assertIn('SN-IN', body)
+        self.assertNotIn('SN-OUT', body)
+
+        response = self.client.get(reverse('devices'), {'start_date': '2025-31-03'})
+        self.assertEqual(len(response.context['devices']), 2)
+        self.assertIn("Invalid date format", [str(m) for m in response.context['messages']][0])
+        self.assertEqual(self.client.get(reverse('create_user'), dates).status_code, 200)
+
+
+class EstimatedCountPaginatorTests(InventoryTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Device.objects.bulk_create(
+            Device(name='LAPTOP', model_brand='Dell', serial_number=f'SN-{i:03d}') for i in range(40)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE inventory_device')
+
+    def paginator(self, **kwargs):
+        return EstimatedCountPaginator(Device.objects.order_by('serial_number'), 15, **kwargs)
+
+    def test_small_results_are_counted(self):
+        page = self.paginator().get_page(1)
+        self.assertTrue(page.has_next())
+        self.assertEqual(page.paginator.count, 40)
+        self.assertFalse(page.paginator.is_approximate)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "estimates come from PostgreSQL statistics")
+    def test_large_results_are_estimated_until_the_last_page(self):
+        paginator = self.paginator(exact_below=0)
+        with self.assertNumQueries(2):
+            page = paginator.get_page(1)
+            self.assertTrue(paginator.is_approximate)
+        self.assertEqual(paginator.count, 40)  # from reltuples after ANALYZE
+        self.assertEqual(page.next_page_number(), 2)
+
+        filtered = EstimatedCountPaginator(Device.objects.filter(status='available').order_by('serial_number'), 15, exact_below=0)
+        filtered.get_page(1)
+        self.assertTrue(filtered.is_approximate)
+
+        with self.assertNumQueries(1):
+            page = paginator.get_page(3)
+            self.assertFalse(page.has_next())
+            self.assertEqual((paginator.count, paginator.is_approximate), (40, False))
+
+    def test_page_past_the_end_falls_back_to_last_page(self):
+        page = self.paginator(exact_below=0).get_page(99)
+        self.assertEqual((page.number, len(page)), (3, 10))
+        self.assertEqual(self.paginator().get_page('x').number, 1)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "the facet triggers are PostgreSQL's")
+class HistoryFacetTests(InventoryTestCase):
+    def assertFacetsCurrent(self):
+        self.assertEqual(read_facets(), _compute())
+
+    def test_triggers_follow_every_write(self):
+        clerk = get_user_model().objects.create_user('clerk@up.edu', 'pw', full_name='Clerk')
+        temp = get_user_model().objects.create_user('temp@up.edu', 'pw', full_name='Temp')
+        record_action(clerk, 'login', 'User', clerk.pk, 'Logged in')
+        HistoryLog.objects.bulk_create([
+            HistoryLog(user=temp, action='create', model_name='Device', details=f'Added {i}') for i in range(3)
+        ])
+        self.assertEqual(read_facets()['action'], {'login': 1, 'create': 3})
+        self.assertEqual(read_facets()['user'], {str(clerk.pk): 1, str(temp.pk): 3})
+
+        temp.delete()  # SET NULL on its entries: an UPDATE
+        HistoryLog.objects.filter(action='login').delete()
+        self.assertEqual(read_facets(), {'action': {'create': 3}, 'model': {'Device': 3}, 'user': {}})
+
+        Generator(devices=20, staff=5, borrows=40, history=300, departments=2, locations=2, users=3, months=6).run()
+        self.assertFacetsCurrent()
+        logged = HistoryLog.objects.count()
+        self.assertTrue(drop_partitions_before(add_months(month_start(timezone.now()), -3)))
+        self.assertLess(HistoryLog.objects.count(), logged)
+        self.assertFacetsCurrent()
+        HistoryFacet.objects.all().delete()
+        rebuild_facets()
+        self.assertFacetsCurrent()
+
+        truncate_history()
+        self.assertFalse(HistoryFacet.objects.exists())
+
+    def test_history_page_lists_facets(self):
+        user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        record_action(user, 'export', 'Device', None, 'Exported')
+        self.client.force_login(user)
+        response = self.client.get(reverse('history_log'))
+        self.assertEqual(response.context['action_choices'], [('export', 'Export', 1)])
+        self.assertEqual(response.context['user_choices'], [(user, 1)])
+        self.assertContains(response, 'Device (1)')
+
+
+class HistoryArchiveTests(InventoryTestCase):
+    def setUp(self):
+        temp_dir_setting(self, 'HISTORY_ARCHIVE_DIR')
+        self.cutoff = add_months(month_start(timezone.now()), -3)
+
+    def generate(self):
+        Generator(devices=10, staff=2, borrows=5, history=400, departments=1, locations=1, users=3, months=6).run()
+
+    def test_archive_file_round_trip(self):
+        rows = [
+            (i, 1_000_000 * i, i % 3 or None, f'user{i % 3}@up.edu', ['login', 'create'][i % 2], 'Device', i, f'Entry {i}', '10.0.0.1')
+            for i in range(1, 11)
+        ]
+        path = os.path.join(archive_dir(), 'round_trip.hlar')
+        with open(path, 'wb') as fh:
+            writer = ArchiveWriter(fh, row_group_size=3)
+            for row in rows:
+                writer.add(row)
+            writer.close()
+
+        with ArchiveFile(path) as archive:
+            self.assertEqual(len(archive.groups), 4)
+            self.assertEqual(list(archive.scan(ArchiveFilter())), rows)
+            logins = ArchiveFilter(action='login')
+            self.assertEqual(archive.group_counts(logins), [1, 2, 1, 1])
+            newest_first = [row for row in reversed(rows) if row[4] == 'login']
+            self.assertEqual(list(archive.scan(logins, reverse=True)), newest_first)
+            for skip in range(6):
+                self.assertEqual(
+                    list(archive.scan(logins, reverse=True, skip=skip, counts=archive.group_counts(logins))),
+                    newest_first[skip:],
+                )
+            self.assertEqual(archive.count(ArchiveFilter(user_email='user1@up.edu', end=from_micros(5_000_000))), 2)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "the partitions and facet triggers are PostgreSQL's")
+    def test_archive_history_moves_old_months(self):
+        self.generate()
+        old = HistoryLog.objects.filter(timestamp__lt=self.cutoff)
+        by_action = dict(old.values_list('action').annotate(n=Count('id')).order_by())
+        old_ids = set(old.values_list('id', flat=True))
+
+        archived = archive_history(self.cutoff)
+        self.assertEqual(sum(archived.values()), len(old_ids))
+        self.assertFalse(old.exists())
+        self.assertTrue(all(month >= self.cutoff for _, month in list_partitions()))
+        self.assertEqual(read_facets(), _compute())
+        self.assertEqual({row[0] for row in ArchiveSearch().rows('id')}, old_ids)
+        for action, count in by_action.items():
+            self.assertEqual(ArchiveSearch(action=action).count(), count)
+
+        # A row that arrives for an archived month waits in the hot table
+        # until the next run merges it into that month's file.
+        month = min(archived)
+        late = HistoryLog.objects.create(action='login', model_name='User', details='Late', timestamp=month + timedelta(hours=1))
+        self.assertEqual(archive_history(self.cutoff)[month], archived[month] + 1)
+        self.assertFalse(old.exists())
+        self.assertIn((late.pk,), ArchiveSearch(action='login').rows('id'))
+        self.assertEqual(read_facets(), _compute())
+
+    def test_pages_run_from_hot_rows_into_the_archive(self):
+        self.generate()
+        logs = HistoryLog.objects.order_by('-timestamp', '-id')
+        rows = list(logs.values_list('timestamp', 'id'))
+        archive_history(self.cutoff)
+        # Back-dated rows belong among the archived ones, not before them.
+        for days in (1, 20, 45):
+            late = HistoryLog.objects.create(action='login', model_name='User', timestamp=self.cutoff - timedelta(days=days))
+            rows.append((late.timestamp, late.id))
+        expected = [pk for _, pk in sorted(rows, reverse=True)]
+
+        for per_page in (7, 50):
+            paginator = EstimatedCountPaginator(LogsWithArchive(logs, ArchiveSearch()), per_page, exact_below=0)
+            seen, number = [], 1
+            while True:
+                page = paginator.page(number)
+                seen += [log.id for log in page]
+                if not page.has_next():
+                    break
+                number += 1
+            self.assertEqual(seen, expected)
+            self.assertEqual((paginator.count, paginator.is_approximate), (len(expected), False))
+
+        # Per-group counts come from the cache on later requests.
+        with unittest.mock.patch.object(ArchiveFile, 'group_counts', side_effect=AssertionError):
+            search = ArchiveSearch()
+            self.assertEqual(search.count(), len(expected) - logs.count())
+            self.assertEqual([log.id for log in search[60:70]], [log.id for log in ArchiveSearch()][60:70])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "the device write counter is a PostgreSQL trigger")
+class DeviceFacetTests(InventoryTestCase):
+    def setUp(self):
+        cache.clear()
+        self.lab, self.office = Location.objects.create(name='Lab'), Location.objects.create(name='Office')
+        Device.objects.bulk_create([
+            Device(name='Laptop', model_brand='Dell', serial_number='SN-1', status='available', location=self.lab),
+            Device(name='LAPTOP', model_brand='Dell', serial_number='SN-2', status='lost', location=self.lab),
+            Device(name='Printer', model_brand='HP', serial_number='SN-3', status='available', location=self.office),
+        ])
+
+    def test_each_facet_ignores_its_own_selection(self):
+        facets = device_facets(status='available')
+        self.assertEqual(facets['status'], {'available': 2, 'lost': 1})
+        self.assertEqual(facets['name'], {'Laptop': 1, 'Printer': 1})
+        self.assertEqual(facets['location'], {self.lab.pk: 1, self.office.pk: 1})
+        facets = device_facets(query='dell', location=str(self.lab.pk))
+        self.assertEqual(facets['location'], {self.lab.pk: 2})
+        self.assertEqual(facets['status'], {'available': 1, 'lost': 1})
+
+    def test_cached_until_a_device_write(self):
+        device_facets(name='laptop ')
+        with CaptureQueriesContext(connection) as queries:
+            facets = device_facets(name='LAPTOP')
+        self.assertEqual(len(queries), 1)  # the write sequence
+        self.assertEqual(facets['status'], {'available': 1, 'lost': 1})
+
+        self.assertEqual(Device.objects.filter(serial_number='SN-9').update(status='lost'), 0)
+        Device.objects.filter(serial_number='SN-2').update(status='available')
+        self.assertEqual(device_facets(name='LAPTOP')['status'], {'available': 1, 'lost': 1})
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")  # what COMMIT would fire
+        self.assertEqual(device_facets(name='LAPTOP')['status'], {'available': 2})
+
+    def test_device_list_shows_counts(self):
+        user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        self.client.force_login(user)
+        response = self.client.get(reverse('devices'), {'status': 'available'})
+        self.assertEqual(response.context['name_choices'], [('LAPTOP', 1), ('PRINTER', 1)])
+        self.assertIn(('lost', 'Lost', 1), response.context['status_choices'])
+        self.assertContains(response, 'Office (1)')
+
+
+class SyntheticDataTests(InventoryTestCase):
+    def test_generated_data_is_consistent(self):
+        Generator(devices=40, staff=10, borrows=100, history=200, departments=3, locations=4, users=2, seed=1).run()
+
+        self.assertEqual(Device.objects.count(), 40)
+        self.assertEqual(BorrowRecord.objects.count(), 100)
+        self.assertEqual(HistoryLog.objects.count(), 200)
+        open_records = BorrowRecord.objects.filter(date_returned__isnull=True)
+        self.assertEqual(Device.objects.filter(current_borrow__in=open_records, status='borrowed').count(), open_records.count())
+        self.assertFalse(BorrowRecord.objects.filter(date_returned__lt=F('date_issued')).exists())
+        self.assertEqual(read_counters()['borrows:open'], open_records.count())
+        # Sequences were moved past the explicit ids.
+        self.assertGreater(Device.objects.create(name='NEW', model_brand='Dell', serial_number='SN-NEW').pk, 40)
+
+    def test_benchmarks_run_and_compare(self):
+        Generator(devices=10, staff=5, borrows=20, history=50, departments=2, locations=2, users=1).run()
+        user = get_user_model().objects.create_superuser('clerk@up.edu', 'pw', full_name='Clerk')
+        client = Client()
+        client.force_login(user)
+
+        benchmark = next(b for b in default_benchmarks() if b.name == 'devices')
+        result = run_benchmark(client, benchmark, runs=2, warmup=0)
+        self.assertEqual(result['status'], 200)
+        self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+        self.assertGreater(result['queries'], 0)
+        self.assertEqual(regressions(result, result, 1.25), [])
+        slower = {**result, 'p50_ms': result['p50_ms'] * 2 + 1, 'queries': result['queries'] + 5}
+        self.assertEqual(len(regressions(slower, result, 1.25)), 2)
@@ -28,6 +28,7 @@ urlpatterns = [
 
     path('devices/', views.device_list, name='devices'),
     path('devices/add/', views.add_device, name='add_device'),
+    path('devices/import/', views.import_devices_view, name='import_devices'),
     path('devices/update/<int:pk>/', views.update_device, name='update_device'),
     path('devices/delete/<int:pk>/', views.delete_device, name='delete_device'),
     path('devices/export/', views.export_device_excel, name='export_device_excel'),
@@ -38,9 +39,15 @@ urlpatterns = [
 
     path('borrow-return/', views.inventory_view, name='borrow_return'),
     path('inventory/export_excel/', views.export_inventory_excel, name='export_inventory_excel'),
+    path('inventory/bulk-borrow/', views.bulk_borrow_view, name='bulk_borrow'),
+    path('inventory/bulk-return/', views.bulk_return_view, name='bulk_return'),
+    path('autocomplete/staff/', views.autocomplete_staff_view, name='autocomplete_staff'),
+    path('autocomplete/devices/', views.autocomplete_devices_view, name='autocomplete_devices'),
+    path('autocomplete/borrow-records/', views.autocomplete_borrow_records_view, name='autocomplete_borrow_records'),
     path('return/edit/<int:pk>/', views.return_edit_view, name='return_edit'),
     path('return/delete/<int:pk>/', views.return_delete_view, name='return_delete'),
     path('download-inventory-pdf/', views.download_inventory_pdf, name='download_inventory_pdf'),
+    path('receipts/bundle/', views.download_receipt_bundle, name='receipt_bundle'),
 
 
 
@@ -58,6 +65,13 @@ urlpatterns = [
     path('history/clear/', views.clear_history_logs, name='clear_history_logs'),
     path('history/export/', views.export_history_excel, name='export_history_excel'),
 
+
+
+
+    path('exports/<str:kind>/start/', views.start_export_job, name='start_export_job'),
+    path('exports/<int:pk>/status/', views.export_job_status, name='export_job_status'),
+    path('exports/<int:pk>/download/', views.download_export_job, name='download_export_job'),
+
     # In your urls.py
     path('devices/<int:pk>/view/', views.view_device, name='view_device'),
 ]
\ No newline at end of file
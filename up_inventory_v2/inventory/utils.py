@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from inventory.models import HistoryLog
+from inventory.audit import write_entry
 from django.utils import timezone
 from ipware import get_client_ip
 
@@ -11,8 +12,13 @@ def log_action(request, action, model_name, object_id=None, details=""):
     """
     user = request.user if request.user.is_authenticated else None
     ip_address, _ = get_client_ip(request)
-    
-    HistoryLog.objects.create(
+    record_action(user, action, model_name, object_id, details, ip_address)
+
+def record_action(user, action, model_name, object_id=None, details="", ip_address=None):
+    """
+    Log an action that happens outside a request (background jobs, commands)
+    """
+    write_entry(HistoryLog(
         user=user,
         action=action,
         model_name=model_name,
@@ -20,4 +26,4 @@ def log_action(request, action, model_name, object_id=None, details=""):
         details=details,
         ip_address=ip_address,
         timestamp=timezone.now()
-    )
\ No newline at end of file
+    ))
@@ -1,26 +1,45 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import StaffRecord, Department, Device, BorrowRecord, HistoryLog, DEVICE_STATUS_CHOICES, Location
+from django.urls import reverse
+from .models import StaffRecord, Department, Device, BorrowRecord, HistoryLog, DEVICE_STATUS_CHOICES, Location, ExportJob
 from .forms import StaffRecordForm, DepartmentForm, DeviceForm, BorrowForm, ReturnForm, ReturnEditForm, LocationForm
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Q
-import openpyxl
-from django.http import HttpResponse, Http404
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.contrib import messages
 from datetime import datetime
-from django.db import models
 from inventory.utils import log_action
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa # type: ignore
-from io import BytesIO
 from django.conf import settings
 import os
+import tempfile
+from io import BytesIO
+from itertools import chain
+from pypdf import PdfWriter
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib.auth import get_user_model
-from django.db.models import Case, When, BooleanField
-from django.http import JsonResponse, HttpResponse
+from django.db.models import Exists, OuterRef
+from django.db import transaction
 from django.views.decorators.http import require_POST
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+from .search import (
+    AUTOCOMPLETE_LIMIT, autocomplete_devices, autocomplete_open_records, autocomplete_staff, search_devices, search_staff,
+)
+from .exports import COPY_FORMATS, Sheet, copy_response, iter_zip, queryset_rows, xlsx_response
+from .jobs import fail_stale_export_jobs, submit_export_job
+from .counters import device_status_counts, read_counters
+from .facets import device_facets, device_filter_choices, filter_choices, read_facets
+from .partitions import truncate_history
+from .archive import ArchiveSearch, LogsWithArchive
+from .imports import ImportFormatError, import_devices, iter_sheet_rows
+from .receipts import ReceiptError, get_receipt, iter_receipts, prerender_receipt, receipt_filename, receipt_queryset
+from .pdfpool import RenderQueueFull
+from .images import schedule_derivatives
+from .storage import release_image
+from .instrumentation import query_budget
+from .dates import InvalidDate, day_range, filter_days, filter_range, filter_request_days, period_range
+from .borrowing import (
+    RETURN_STATUSES, AlreadyReturned, DeviceUnavailable, bulk_issue, bulk_return, issue_device, return_record,
+)
+from ipware import get_client_ip
 
 
 
@@ -30,23 +49,17 @@ def home_view(request):
 def test_view(request):
     return render(request, 'test_modal.html')
 
+@query_budget(5)
 @login_required
 def staff_list(request):
     query = request.GET.get("q", "")
     department = request.GET.get("department", "")
     status = request.GET.get("status", "")
-    start_date = request.GET.get("start_date", "")
-    end_date = request.GET.get("end_date", "")
 
     staff_records = StaffRecord.objects.all().order_by('-created_at')
 
     if query:
-        staff_records = staff_records.filter(
-            Q(full_name__icontains=query) |
-            Q(email__icontains=query) |
-            Q(status__icontains=query) |
-            Q(department__name__icontains=query)
-        )
+        staff_records = search_staff(staff_records, query)
 
     if department:
         staff_records = staff_records.filter(department__id=department)
@@ -54,11 +67,7 @@ def staff_list(request):
     if status:
         staff_records = staff_records.filter(status=status)
 
-    if start_date and end_date:
-        staff_records = staff_records.filter(
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
+    staff_records = filter_request_days(request, staff_records, 'created_at')
 
     form = StaffRecordForm()
     departments = Department.objects.all()
@@ -77,6 +86,10 @@ def staff_list(request):
             )
             return redirect('staff')
 
+    keys = ('rank', 'created_at', 'pk') if query else ('created_at', 'pk')
+    paginator = KeysetPaginator(staff_records, 15, keys=keys, select_related=('department',))
+    staff_records = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+
     return render(request, 'staff.html', {
         'staff_records': staff_records,
         'form': form,
@@ -139,18 +152,11 @@ def export_staff_excel(request):
     query = request.GET.get("q", "")
     department = request.GET.get("department", "")
     status = request.GET.get("status", "")
-    start_date = request.GET.get("start_date", "")
-    end_date = request.GET.get("end_date", "")
 
     staff_records = StaffRecord.objects.all().order_by('-created_at')
 
     if query:
-        staff_records = staff_records.filter(
-            Q(full_name__icontains=query) |
-            Q(email__icontains=query) |
-            Q(status__icontains=query) |
-            Q(department__name__icontains=query)
-        )
+        staff_records = search_staff(staff_records, query)
 
     if department:
         staff_records = staff_records.filter(department__id=department)
@@ -158,11 +164,7 @@ def export_staff_excel(request):
     if status:
         staff_records = staff_records.filter(status=status)
 
-    if start_date and end_date:
-        staff_records = staff_records.filter(
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
+    staff_records = filter_request_days(request, staff_records, 'created_at')
 
     log_action(
         request,
@@ -172,25 +174,34 @@ def export_staff_excel(request):
         f"Exported staff records with filters: query={query}, department={department}, status={status}"
     )
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Staff Records"
-    ws.append(["Full Name", "Email", "Status", "Department", "Date Created"])
+    export_format = request.GET.get("format", "")
+    if export_format in COPY_FORMATS:
+        return copy_response('staff_records', staff_records, [
+            ("Full Name", 'full_name'),
+            ("Email", 'email'),
+            ("Status", 'status'),
+            ("Department", 'department__name'),
+            ("Date Created", 'created_at'),
+        ], export_format)
+
+    rows = (
+        [
+            full_name,
+            email,
+            status,
+            department_name or '',
+            created_at.strftime("%Y-%m-%d %H:%M:%S") if created_at else '',
+        ]
+        for full_name, email, status, department_name, created_at in queryset_rows(
+            staff_records, 'full_name', 'email', 'status', 'department__name', 'created_at'
+        )
+    )
 
-    for staff in staff_records:
-        ws.append([
-            staff.full_name,
-            staff.email,
-            staff.status,
-            staff.department.name if staff.department else '',
-            staff.created_at.strftime("%Y-%m-%d %H:%M:%S") if staff.created_at else '',
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=staff_records.xlsx'
-    wb.save(response)
-    return response
+    return xlsx_response('staff_records.xlsx', [
+        Sheet("Staff Records", ["Full Name", "Email", "Status", "Department", "Date Created"], rows),
+    ])
 
+@query_budget(5)
 @login_required
 def department_list(request):
     query = request.GET.get("q", "")
@@ -203,25 +214,7 @@ def department_list(request):
     if query:
         departments = departments.filter(name__icontains=query)
     
-    if start_date and end_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            departments = departments.filter(created_at__date__range=[start_date, end_date])
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
-    elif start_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            departments = departments.filter(created_at__date__gte=start_date)
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
-    elif end_date:
-        try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            departments = departments.filter(created_at__date__lte=end_date)
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
+    departments = filter_request_days(request, departments, 'created_at')
 
 
     paginator = Paginator(departments, 15)  
@@ -293,6 +286,7 @@ def delete_department(request, pk):
 def export_department_excel(request):
     query = request.GET.get("q", "")
     departments = Department.objects.filter(name__icontains=query) if query else Department.objects.all().order_by('-created_at')
+    departments = filter_request_days(request, departments, 'created_at')
 
     log_action(
         request,
@@ -302,21 +296,21 @@ def export_department_excel(request):
         f"Exported department records with filter: query={query}"
     )
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Departments"
-    ws.append(["Department Name", "Date Created"])
+    export_format = request.GET.get("format", "")
+    if export_format in COPY_FORMATS:
+        return copy_response('departments', departments, [
+            ("Department Name", 'name'),
+            ("Date Created", 'created_at'),
+        ], export_format)
 
-    for dept in departments:
-        ws.append([
-            dept.name,
-            dept.created_at.strftime("%Y-%m-%d %H:%M:%S") if dept.created_at else ''
-        ])
+    rows = (
+        [name, created_at.strftime("%Y-%m-%d %H:%M:%S") if created_at else '']
+        for name, created_at in queryset_rows(departments, 'name', 'created_at')
+    )
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=departments.xlsx'
-    wb.save(response)
-    return response
+    return xlsx_response('departments.xlsx', [
+        Sheet("Departments", ["Department Name", "Date Created"], rows),
+    ])
 
 
 
@@ -328,6 +322,7 @@ def export_department_excel(request):
 
 
 
+@query_budget(6)
 @login_required
 def device_list(request):
     query = request.GET.get("q", "")
@@ -340,18 +335,8 @@ def device_list(request):
     devices = Device.objects.all().order_by('-created_at')
 
 
-    returned_device_ids = BorrowRecord.objects.filter(
-        date_returned__isnull=False
-    ).values_list('device_id', flat=True).distinct()
-
     if query:
-        devices = devices.filter(
-            Q(name__icontains=query) |
-            Q(model_brand__icontains=query) |
-            Q(serial_number__icontains=query) |
-            Q(status__icontains=query) |
-            Q(location__name__icontains=query)
-        )
+        devices = search_devices(devices, query)
     
     if status_filter:
         devices = devices.filter(status=status_filter)
@@ -362,29 +347,17 @@ def device_list(request):
     if name_filter:
         devices = devices.filter(name__iexact=name_filter)
     
-    if start_date and end_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            devices = devices.filter(created_at__date__range=[start_date, end_date])
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
-    elif start_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            devices = devices.filter(created_at__date__gte=start_date)
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
-    elif end_date:
-        try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            devices = devices.filter(created_at__date__lte=end_date)
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
+    devices = filter_request_days(request, devices, 'created_at')
 
-    unique_names = Device.objects.values_list('name', flat=True).distinct()
+    try:
+        created_start, created_end = day_range(start_date, end_date)
+    except InvalidDate:
+        created_start = created_end = None
+    facets = device_facets(
+        query, created_start, created_end, name=name_filter, status=status_filter, location=location_filter,
+    )
     form = DeviceForm()
-    locations = Location.objects.all()
+    locations = list(Location.objects.all())
 
     if request.method == 'POST' and request.POST.get("id"):
         device = get_object_or_404(Device, pk=request.POST["id"])
@@ -407,21 +380,23 @@ def device_list(request):
             messages.error(request, "Error updating device. Please check the form.")
 
 
+    # Correlated EXISTS on the borrowrecord device index, evaluated only for
+    # the rows on the current page.
     devices = devices.annotate(
-        is_returned=Case(
-            When(id__in=returned_device_ids, then=True),
-            default=False,
-            output_field=BooleanField()
-        )
+        is_returned=Exists(BorrowRecord.objects.filter(device=OuterRef('pk'), date_returned__isnull=False))
     )
 
+    keys = ('rank', 'created_at', 'pk') if query else ('created_at', 'pk')
+    paginator = KeysetPaginator(devices, 15, keys=keys, select_related=('location',))
+    devices = paginator.get_page(after=request.GET.get('after'), before=request.GET.get('before'))
+
     return render(request, 'devices.html', {
         'devices': devices,
         'form': form,
         'DEVICE_STATUS_CHOICES': DEVICE_STATUS_CHOICES,
         'locations': locations,
         'query': query,
-        'unique_names': unique_names,
+        **device_filter_choices(facets, locations, name_filter, status_filter, location_filter),
         'status_filter': status_filter,
         'location_filter': location_filter,
         'name_filter': name_filter,
@@ -441,6 +416,7 @@ def add_device(request):
             device.status = 'available'
             try:
                 device.save()
+                schedule_derivatives(device.image.name)
                 messages.success(request, "Device added successfully.")
                 return redirect('devices')
             except Exception as e:
@@ -453,11 +429,45 @@ def add_device(request):
             messages.error(request, " ".join(error_messages))
     return redirect('devices')
 
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def import_devices_view(request):
+    if request.method != 'POST':
+        return redirect('devices')
+
+    upload = request.FILES.get('file')
+    if not upload:
+        messages.error(request, "Choose an .xlsx or .csv file to import.")
+        return redirect('devices')
+
+    ip_address, _ = get_client_ip(request)
+    try:
+        result = import_devices(
+            iter_sheet_rows(upload, upload.name),
+            user=request.user,
+            ip_address=ip_address,
+            source=upload.name,
+            dry_run=request.POST.get('dry_run') == 'on',
+        )
+    except ImportFormatError as e:
+        messages.error(request, str(e))
+        return redirect('devices')
+    except Exception as e:
+        messages.error(request, f"Error reading {upload.name}: {str(e)}")
+        return redirect('devices')
+
+    return render(request, 'device_import_report.html', {
+        'filename': upload.name,
+        'result': result,
+        'dry_run': request.POST.get('dry_run') == 'on',
+    })
+
 @login_required
 @user_passes_test(lambda u: u.is_superuser)
 def update_device(request, pk):
     device = get_object_or_404(Device, pk=pk)
     if request.method == 'POST':
+        old_image = device.image.name
         form = DeviceForm(request.POST, request.FILES, instance=device)
         status = request.POST.get('status', 'available')
         if form.is_valid():
@@ -465,6 +475,10 @@ def update_device(request, pk):
             device.name = device.name.upper()
             device.status = status
             device.save()
+            if 'image' in form.changed_data:
+                schedule_derivatives(device.image.name)
+                if old_image != device.image.name:
+                    release_image(old_image)
             log_action(
                 request,
                 'update',
@@ -502,6 +516,7 @@ def delete_device(request, pk):
         f"Deleted device {device.name} (SN: {device.serial_number})"
     )
     device.delete()
+    release_image(device.image.name)
     messages.success(request, "Device deleted successfully.")
     return redirect('devices')
 
@@ -520,13 +535,7 @@ def export_device_excel(request):
     devices = Device.objects.all()
     
     if query:
-        devices = devices.filter(
-            Q(name__icontains=query) |
-            Q(model_brand__icontains=query) |
-            Q(serial_number__icontains=query) |
-            Q(status__icontains=query) |
-            Q(location__name__icontains=query)
-        )
+        devices = search_devices(devices, query)
     
     if status_filter:
         devices = devices.filter(status=status_filter)
@@ -537,6 +546,8 @@ def export_device_excel(request):
     if name_filter:
         devices = devices.filter(name__iexact=name_filter)
 
+    devices = filter_request_days(request, devices, 'created_at')
+
     log_action(
         request,
         'export',
@@ -545,33 +556,37 @@ def export_device_excel(request):
         f"Exported device records with filters: query={query}, status={status_filter}, location={location_filter}, name={name_filter}"
     )
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Devices"
-    
+    export_format = request.GET.get("format", "")
+    if export_format in COPY_FORMATS:
+        return copy_response('devices_export_{}'.format(datetime.now().strftime("%Y%m%d_%H%M%S")), devices, [
+            ("Name", 'name'),
+            ("Model/Brand", 'model_brand'),
+            ("Serial Number", 'serial_number'),
+            ("Status", 'status'),
+            ("Location", 'location__name'),
+            ("Created Date", 'created_at'),
+        ], export_format)
+
     headers = ["Name", "Model/Brand", "Serial Number", "Status", "Location", "Created Date"]
-    ws.append(headers)
-    
     column_widths = [20, 20, 20, 15, 20, 20]
-    for i, width in enumerate(column_widths, 1):
-        ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = width
-
-    for device in devices:
-        ws.append([
-            device.name,
-            device.model_brand,
-            device.serial_number,
-            device.get_status_display(),
-            device.location.name if device.location else '',
-            device.created_at.strftime("%Y-%m-%d %H:%M"),
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=devices_export_{}.xlsx'.format(
-        datetime.now().strftime("%Y%m%d_%H%M%S")
+    status_labels = dict(DEVICE_STATUS_CHOICES)
+
+    rows = (
+        [
+            name,
+            model_brand,
+            serial_number,
+            status_labels.get(status, status),
+            location_name or '',
+            created_at.strftime("%Y-%m-%d %H:%M"),
+        ]
+        for name, model_brand, serial_number, status, location_name, created_at in queryset_rows(
+            devices, 'name', 'model_brand', 'serial_number', 'status', 'location__name', 'created_at'
+        )
     )
-    wb.save(response)
-    return response
+
+    filename = 'devices_export_{}.xlsx'.format(datetime.now().strftime("%Y%m%d_%H%M%S"))
+    return xlsx_response(filename, [Sheet("Devices", headers, rows, column_widths)])
 
 
 
@@ -584,12 +599,13 @@ def export_device_excel(request):
 
 
 
+@query_budget(10)
 @login_required
 def inventory_view(request):
-    active_staff = StaffRecord.objects.filter(status='active')
-    all_staff = StaffRecord.objects.all()
-    borrowed_devices = BorrowRecord.objects.filter(date_returned__isnull=True).values_list('device_id', flat=True)
-    available_devices = Device.objects.filter(status='available').exclude(id__in=borrowed_devices).exclude(status='condemned')
+    # Only used to validate the submitted ids; the pickers load their options
+    # from the autocomplete endpoints.
+    active_staff = StaffRecord.objects.filter(status='active').select_related('department')
+    available_devices = Device.objects.filter(status='available', current_borrow__isnull=True).select_related('location')
 
     filter_date = request.GET.get('date')
     staff_filter = request.GET.get('staff_name')
@@ -601,17 +617,19 @@ def inventory_view(request):
 
     if filter_date:
         try:
-            parsed_date = datetime.strptime(filter_date, "%Y-%m-%d").date()
-            borrowed_records = borrowed_records.filter(date_issued__date=parsed_date)
-            returned_records = returned_records.filter(date_returned__date=parsed_date)
-        except ValueError:
+            start, end = day_range(filter_date, filter_date)
+            borrowed_records = filter_range(borrowed_records, 'date_issued', start, end)
+            returned_records = filter_range(returned_records, 'date_returned', start, end)
+        except InvalidDate:
             pass
 
+    selected_staff = None
     if staff_filter:
         try:
             staff_id = int(staff_filter)
             borrowed_records = borrowed_records.filter(staff_id=staff_id)
             returned_records = returned_records.filter(staff_id=staff_id)
+            selected_staff = StaffRecord.objects.filter(pk=staff_id).first()
         except (ValueError, TypeError):
             pass
 
@@ -623,23 +641,9 @@ def inventory_view(request):
     borrowed_records = borrowed_records.select_related('staff', 'device', 'staff__department', 'device__location').order_by('-date_issued')
     returned_records = returned_records.select_related('staff', 'device', 'staff__department', 'device__location').order_by('-date_returned')
 
-    # Add pagination
-    borrowed_paginator = Paginator(borrowed_records, 15)  
-    returned_paginator = Paginator(returned_records, 15)  
-
-    try:
-        borrowed_records = borrowed_paginator.page(page)
-    except PageNotAnInteger:
-        borrowed_records = borrowed_paginator.page(1)
-    except EmptyPage:
-        borrowed_records = borrowed_paginator.page(borrowed_paginator.num_pages)
-
-    try:
-        returned_records = returned_paginator.page(page)
-    except PageNotAnInteger:
-        returned_records = returned_paginator.page(1)
-    except EmptyPage:
-        returned_records = returned_paginator.page(returned_paginator.num_pages)
+    # Add pagination; the totals are estimated once they get large.
+    borrowed_records = EstimatedCountPaginator(borrowed_records, 15).get_page(page)
+    returned_records = EstimatedCountPaginator(returned_records, 15).get_page(page)
 
     borrow_form = BorrowForm(available_devices=available_devices, active_staff=active_staff)
     return_form = ReturnForm()
@@ -650,52 +654,178 @@ def inventory_view(request):
             if borrow_form.is_valid():
                 borrow_record = borrow_form.save(commit=False)
                 borrow_record.date_issued = timezone.now()
-                device = borrow_record.device
-                device.status = 'borrowed'
-                device.save()
-                borrow_record.save()
-                log_action(
-                    request,
-                    'borrow',
-                    'BorrowRecord',
-                    borrow_record.id,
-                    f"Borrowed {device.name} (SN: {device.serial_number}) to {borrow_record.staff.full_name}"
-                )
-                messages.success(request, "Device borrowed successfully.")
-                return redirect('inventory')
+                try:
+                    issue_device(borrow_record)
+                except DeviceUnavailable as e:
+                    borrow_form.add_error('device', str(e))
+                    messages.error(request, str(e))
+                else:
+                    device = borrow_record.device
+                    log_action(
+                        request,
+                        'borrow',
+                        'BorrowRecord',
+                        borrow_record.id,
+                        f"Borrowed {device.name} (SN: {device.serial_number}) to {borrow_record.staff.full_name}"
+                    )
+                    prerender_receipt(borrow_record.id)
+                    messages.success(request, "Device borrowed successfully.")
+                    return redirect('inventory')
 
         elif 'return_submit' in request.POST:
             return_form = ReturnForm(request.POST)
             if return_form.is_valid():
                 record = return_form.cleaned_data['borrow_record']
-                record.date_returned = timezone.now()
-                record.remarks = return_form.cleaned_data['return_remarks']
-                device = record.device
-                device.status = return_form.cleaned_data['device_status']
-                device.save()
-                record.save()
-                log_action(
-                    request,
-                    'return',
-                    'BorrowRecord',
-                    record.id,
-                    f"Returned {device.name} (SN: {device.serial_number}) from {record.staff.full_name}"
-                )
-                messages.success(request, "Device returned successfully.")
-                return redirect('inventory')
+                try:
+                    return_record(
+                        record,
+                        return_form.cleaned_data['device_status'],
+                        return_form.cleaned_data['return_remarks'],
+                    )
+                except AlreadyReturned as e:
+                    return_form.add_error('borrow_record', str(e))
+                    messages.error(request, str(e))
+                else:
+                    device = record.device
+                    log_action(
+                        request,
+                        'return',
+                        'BorrowRecord',
+                        record.id,
+                        f"Returned {device.name} (SN: {device.serial_number}) from {record.staff.full_name}"
+                    )
+                    prerender_receipt(record.id)
+                    messages.success(request, "Device returned successfully.")
+                    return redirect('inventory')
 
     context = {
         'borrowed_records': borrowed_records,
         'returned_records': returned_records,
+        'borrowed_page_range': _page_window(borrowed_records),
+        'returned_page_range': _page_window(returned_records),
         'borrow_form': borrow_form,
         'return_form': return_form, 
-        'active_staff': active_staff,
-        'available_devices': available_devices,
         'filter_date': filter_date,
-        'all_staff': all_staff,
+        'selected_staff': selected_staff,
     }
     return render(request, 'inventory.html', context)
 
+
+def _page_window(page, on_each_side=2):
+    """Page numbers around the current one, without walking the whole page_range."""
+    last = page.paginator.num_pages
+    return range(max(1, page.number - on_each_side), min(last, page.number + on_each_side) + 1)
+
+
+def _autocomplete_limit(request):
+    try:
+        return max(1, min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), 50))
+    except ValueError:
+        return AUTOCOMPLETE_LIMIT
+
+
+@query_budget(3)
+@login_required
+def autocomplete_staff_view(request):
+    results = []
+    staff_records = autocomplete_staff(
+        request.GET.get('q', ''), _autocomplete_limit(request), active_only=not request.GET.get('all')
+    )
+    for staff in staff_records:
+        department = staff.department.name if staff.department else ''
+        results.append({
+            'id': staff.id,
+            'text': f"{staff.full_name} ({department or 'No department'})",
+            'name': staff.full_name,
+            'department': department,
+        })
+    return JsonResponse({'results': results})
+
+
+@query_budget(3)
+@login_required
+def autocomplete_devices_view(request):
+    results = []
+    for device in autocomplete_devices(request.GET.get('q', ''), _autocomplete_limit(request)):
+        location = device.location.name if device.location else ''
+        results.append({
+            'id': device.id,
+            'text': f"{device.name} - {device.model_brand} ({device.serial_number}) - {location or 'No location'}",
+            'name': device.name,
+            'model': device.model_brand,
+            'serial': device.serial_number,
+            'location': location,
+        })
+    return JsonResponse({'results': results})
+
+
+@query_budget(3)
+@login_required
+def autocomplete_borrow_records_view(request):
+    results = [
+        {
+            'id': record.id,
+            'text': f"{record.staff.full_name} - {record.device.name} ({record.device.serial_number})",
+        }
+        for record in autocomplete_open_records(request.GET.get('q', ''), _autocomplete_limit(request))
+    ]
+    return JsonResponse({'results': results})
+
+def _report_bulk(request, verb, result, label):
+    if result.done:
+        messages.success(request, f"{verb} {len(result.done)} device(s).")
+    for key, message in result.errors[:20]:
+        messages.error(request, f"{label} {key}: {message}")
+    if len(result.errors) > 20:
+        messages.error(request, f"...and {len(result.errors) - 20} more problem(s).")
+
+@require_POST
+@login_required
+def bulk_borrow_view(request):
+    staff_ids = request.POST.getlist('staff')
+    device_ids = request.POST.getlist('device')
+    pr_number = request.POST.get('pr_number', '').strip()
+    if not pr_number:
+        messages.error(request, "PR Number is required.")
+        return redirect('inventory')
+    try:
+        pairs = [(int(staff_id), int(device_id)) for staff_id, device_id in zip(staff_ids, device_ids, strict=True)]
+    except ValueError:
+        messages.error(request, "Every line needs a staff member and an asset.")
+        return redirect('inventory')
+    if not pairs:
+        messages.error(request, "Add at least one line to distribute.")
+        return redirect('inventory')
+
+    ip_address, _ = get_client_ip(request)
+    result = bulk_issue(
+        pairs, pr_number, request.POST.get('remarks', ''), user=request.user, ip_address=ip_address
+    )
+    _report_bulk(request, "Distributed", result, "Line")
+    return redirect('inventory')
+
+@require_POST
+@login_required
+def bulk_return_view(request):
+    try:
+        record_ids = [int(record_id) for record_id in request.POST.getlist('record')]
+    except ValueError:
+        record_ids = []
+    device_status = request.POST.get('device_status', 'available')
+    if not record_ids:
+        messages.error(request, "Select at least one record to return.")
+        return redirect('inventory')
+    if device_status not in RETURN_STATUSES:
+        messages.error(request, "Invalid device status.")
+        return redirect('inventory')
+
+    ip_address, _ = get_client_ip(request)
+    result = bulk_return(
+        record_ids, device_status, request.POST.get('return_remarks', ''), user=request.user, ip_address=ip_address
+    )
+    _report_bulk(request, "Returned", result, "Record")
+    return redirect('inventory')
+
 @login_required
 def return_edit_view(request, pk):
     record = get_object_or_404(BorrowRecord, pk=pk, date_returned__isnull=False)
@@ -707,7 +837,8 @@ def return_edit_view(request, pk):
                 'remarks': record.remarks,
                 'device_status': record.device.status
             }
-            form.save()
+            with transaction.atomic():
+                form.save()
             new_data = {
                 'date_returned': record.date_returned,
                 'remarks': record.remarks,
@@ -726,6 +857,7 @@ def return_edit_view(request, pk):
                 record.id,
                 f"Updated return record for {record.device.name}: {', '.join(changes)}"
             )
+            prerender_receipt(record.id)
             messages.success(request, "Returned record updated successfully.")
             return redirect('inventory')
     else:
@@ -742,91 +874,191 @@ def return_delete_view(request, pk):
     record = get_object_or_404(BorrowRecord, pk=pk, date_returned__isnull=False)
     if request.method == 'POST':
         device = record.device
-        device.status = 'available'
-        device.save()
-        log_action(
-            request,
-            'delete',
-            'BorrowRecord',
-            record.id,
-            f"Deleted return record for {device.name} (SN: {device.serial_number})"
-        )
-        record.delete()
+        with transaction.atomic():
+            # Only free the device if it has not been lent out again since.
+            Device.objects.filter(pk=device.pk, current_borrow__isnull=True).update(status='available')
+            log_action(
+                request,
+                'delete',
+                'BorrowRecord',
+                record.id,
+                f"Deleted return record for {device.name} (SN: {device.serial_number})"
+            )
+            record.delete()
         messages.success(request, "Returned record deleted successfully.")
         return redirect('inventory')
 
     context = {'record': record}
     return render(request, 'inventory_return_delete_confirm.html', context)
 
+def filter_receipts(params):
+    """
+    BorrowRecords for a receipt bundle: `open=1` for every open borrow,
+    otherwise an optional `staff` id and an issue-date range
+    `date_from`..`date_to` (inclusive, YYYY-MM-DD).
+    """
+    records = receipt_queryset().order_by('date_issued', 'id')
+    if params.get('open'):
+        records = records.filter(date_returned__isnull=True)
+    staff_id = params.get('staff')
+    if staff_id:
+        try:
+            records = records.filter(staff_id=int(staff_id))
+        except ValueError:
+            raise Http404("Unknown staff member")
+    try:
+        records = filter_days(records, 'date_issued', params.get('date_from'), params.get('date_to'))
+    except InvalidDate:
+        pass
+    return records
+
 @login_required
-def export_inventory_excel(request):
-    year = request.GET.get('year')
-    month = request.GET.get('month')
-    day = request.GET.get('day')
+def download_receipt_bundle(request):
+    records = filter_receipts(request.GET)
+    if not (request.GET.get('open') or request.GET.get('staff') or request.GET.get('date_from') or request.GET.get('date_to')):
+        messages.error(request, "Choose open borrows, a staff member or a date range for the receipt bundle.")
+        return redirect('inventory')
+
+    limit = getattr(settings, 'RECEIPT_BUNDLE_MAX', 1000)
+    count = records.count()
+    if count == 0:
+        messages.error(request, "No receipts match those filters.")
+        return redirect('inventory')
+    if count > limit:
+        messages.error(request, f"{count} receipts match; narrow the filters to at most {limit}.")
+        return redirect('inventory')
+
+    if request.GET.get('format') == 'pdf':
+        # pypdf assembles the whole merged document in memory before writing
+        # it out, so merged PDFs get a much smaller cap than the streamed ZIP.
+        pdf_limit = getattr(settings, 'RECEIPT_BUNDLE_PDF_MAX', 100)
+        if count > pdf_limit:
+            messages.error(
+                request,
+                f"{count} receipts match; a merged PDF holds at most {pdf_limit}. "
+                f"Download them as a ZIP or narrow the filters.",
+            )
+            return redirect('inventory')
+        merged = PdfWriter()
+        for _, data in iter_receipts(records):
+            merged.append(BytesIO(data))
+        output = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+        merged.write(output)
+        output.seek(0)
+        return FileResponse(output, as_attachment=True, filename='receipts.pdf', content_type='application/pdf')
+
+    response = StreamingHttpResponse(
+        iter_zip((receipt_filename(record), data) for record, data in iter_receipts(records)),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = 'attachment; filename=receipts.zip'
+    return response
+
+def filter_inventory_export(params):
+    """
+    Borrowed records by issue date and returned records by return date,
+    within the inventory page's `date`, a `date_from`..`date_to` range or a
+    calendar `year` (optionally `month` and `day`).
+    """
+    filter_date = params.get('date')
+    date_from = params.get('date_from') or filter_date
+    date_to = params.get('date_to') or filter_date
+    year = params.get('year')
+    month = params.get('month')
+    day = params.get('day')
 
     borrowed_records = BorrowRecord.objects.filter(date_returned__isnull=True)
     returned_records = BorrowRecord.objects.filter(date_returned__isnull=False)
 
+    try:
+        start, end = period_range(year, month, day) if year else day_range(date_from, date_to)
+    except InvalidDate:
+        start = end = None
+    borrowed_records = filter_range(borrowed_records, 'date_issued', start, end)
+    returned_records = filter_range(returned_records, 'date_returned', start, end)
+
     if year:
-        borrowed_records = borrowed_records.filter(date_issued__year=year)
-        returned_records = returned_records.filter(date_returned__year=year)
-    if month:
-        borrowed_records = borrowed_records.filter(date_issued__month=month)
-        returned_records = returned_records.filter(date_returned__month=month)
-    if day:
-        borrowed_records = borrowed_records.filter(date_issued__day=day)
-        returned_records = returned_records.filter(date_returned__day=day)
+        details = f"Exported inventory records with filters: year={year}, month={month}, day={day}"
+    else:
+        details = f"Exported inventory records with filters: date_from={date_from}, date_to={date_to}"
+    return borrowed_records, returned_records, details
+
+def inventory_export_sheets(borrowed_records, returned_records):
+    borrowed_rows = (
+        [
+            full_name,
+            department_name or "",
+            device_name,
+            model_brand,
+            date_issued.strftime('%Y-%m-%d %H:%M'),
+            serial_number,
+            pr_number,
+            remarks,
+        ]
+        for full_name, department_name, device_name, model_brand, date_issued, serial_number, pr_number, remarks
+        in queryset_rows(
+            borrowed_records,
+            'staff__full_name', 'staff__department__name', 'device__name', 'device__model_brand',
+            'date_issued', 'device__serial_number', 'pr_number', 'remarks',
+        )
+    )
+
+    returned_rows = (
+        [
+            full_name,
+            department_name or "",
+            device_name,
+            model_brand,
+            date_issued.strftime('%Y-%m-%d %H:%M'),
+            date_returned.strftime('%Y-%m-%d %H:%M'),
+            serial_number,
+            pr_number,
+            remarks,
+        ]
+        for full_name, department_name, device_name, model_brand, date_issued, date_returned, serial_number,
+        pr_number, remarks in queryset_rows(
+            returned_records,
+            'staff__full_name', 'staff__department__name', 'device__name', 'device__model_brand',
+            'date_issued', 'date_returned', 'device__serial_number', 'pr_number', 'remarks',
+        )
+    )
+
+    return [
+        Sheet("Add Asset", ['Name of Staff', 'Department', 'Equipment', 'Model/Brand',
+                            'Date Issued', 'Serial Number', 'PR Number', 'Remarks'], borrowed_rows),
+        Sheet("Returned Asset", ['Name of Staff', 'Department', 'Equipment', 'Model/Brand',
+                                 'Date Issued', 'Date Returned', 'Serial Number', 'PR Number', 'Remarks'], returned_rows),
+    ]
+
+@login_required
+def export_inventory_excel(request):
+    borrowed_records, returned_records, details = filter_inventory_export(request.GET)
 
     log_action(
         request,
         'export',
         'Inventory',
         None,
-        f"Exported inventory records with filters: year={year}, month={month}, day={day}"
+        details
     )
 
-    wb = openpyxl.Workbook()
-    
+    export_format = request.GET.get('format', '')
+    if export_format in COPY_FORMATS:
+        # One flat file instead of two sheets; open borrows have an empty Date Returned.
+        records = borrowed_records.union(returned_records, all=True).order_by('-date_issued')
+        return copy_response('inventory_export', records, [
+            ('Name of Staff', 'staff__full_name'),
+            ('Department', 'staff__department__name'),
+            ('Equipment', 'device__name'),
+            ('Model/Brand', 'device__model_brand'),
+            ('Date Issued', 'date_issued'),
+            ('Date Returned', 'date_returned'),
+            ('Serial Number', 'device__serial_number'),
+            ('PR Number', 'pr_number'),
+            ('Remarks', 'remarks'),
+        ], export_format)
 
-    ws1 = wb.active
-    ws1.title = "Add Asset"
-    ws1.append(['Name of Staff', 'Department', 'Equipment', 'Model/Brand',
-                'Date Issued', 'Serial Number', 'PR Number', 'Remarks'])
-
-    for record in borrowed_records.select_related('staff__department', 'device'):
-        ws1.append([
-            record.staff.full_name,
-            record.staff.department.name if record.staff.department else "",
-            record.device.name,
-            record.device.model_brand,
-            record.date_issued.strftime('%Y-%m-%d %H:%M'),
-            record.device.serial_number,
-            record.pr_number,
-            record.remarks,
-        ])
-
-
-    ws2 = wb.create_sheet(title="Returned Asset")
-    ws2.append(['Name of Staff', 'Department', 'Equipment', 'Model/Brand',
-                'Date Issued', 'Date Returned', 'Serial Number', 'PR Number', 'Remarks'])
-
-    for record in returned_records.select_related('staff__department', 'device'):
-        ws2.append([
-            record.staff.full_name,
-            record.staff.department.name if record.staff.department else "",
-            record.device.name,
-            record.device.model_brand,
-            record.date_issued.strftime('%Y-%m-%d %H:%M'),
-            record.date_returned.strftime('%Y-%m-%d %H:%M'),
-            record.device.serial_number,
-            record.pr_number,
-            record.remarks,
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=inventory_export.xlsx'
-    wb.save(response)
-    return response
+    return xlsx_response('inventory_export.xlsx', inventory_export_sheets(borrowed_records, returned_records))
 
 
 
@@ -837,58 +1069,26 @@ def download_inventory_pdf(request):
     record_type = request.POST.get('record_type')
     
     try:
-        record = BorrowRecord.objects.get(pk=record_id)
-        
-        if record_type == 'borrowed' and record.date_returned is not None:
-            raise Http404("This is not a currently borrowed record")
-            
-
-        if record.date_returned is None:
-            template = 'inventory-pdf/borrowed_pdf.html'
-        else:
-            template = 'inventory-pdf/returned_pdf.html'
-        
-        context = {
-            'record': record,
-            'now': timezone.now(),
-            'MEDIA_URL': settings.MEDIA_URL,
-            'STATIC_URL': settings.STATIC_URL,
-        }
-        
-
-        template = get_template(template)
-        html = template.render(context)
-        
-
-        result = BytesIO()
-        
-        def fetch_resources(uri, rel):
-            if uri.startswith(settings.MEDIA_URL):
-                path = os.path.join(settings.MEDIA_ROOT, uri.replace(settings.MEDIA_URL, ''))
-            elif uri.startswith(settings.STATIC_URL):
-                path = os.path.join(settings.STATIC_ROOT, uri.replace(settings.STATIC_URL, ''))
-            else:
-                path = None
-            return path
-        
-        pdf = pisa.pisaDocument(
-            BytesIO(html.encode("UTF-8")), 
-            result,
-            encoding='UTF-8',
-            link_callback=fetch_resources
-        )
-        
-        if not pdf.err:
-            response = HttpResponse(result.getvalue(), content_type='application/pdf')
-            status = "borrowed" if record.date_returned is None else "returned"
-            filename = f"{status}_record_{record_id}.pdf"
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            return response
-        
-    except BorrowRecord.DoesNotExist:
+        record = receipt_queryset().get(pk=record_id)
+    except (BorrowRecord.DoesNotExist, ValueError):
         raise Http404("Record not found")
-    
-    return HttpResponse("Error generating PDF", status=400)
+
+    if record_type == 'borrowed' and record.date_returned is not None:
+        raise Http404("This is not a currently borrowed record")
+
+    try:
+        path = get_receipt(record)
+    except ReceiptError:
+        return HttpResponse("Error generating PDF", status=400)
+    except RenderQueueFull as e:
+        return HttpResponse(str(e), status=503)
+
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=receipt_filename(record),
+        content_type='application/pdf',
+    )
 
 
 
@@ -903,26 +1103,23 @@ def download_inventory_pdf(request):
 
 
 
+@query_budget(6)
 @login_required
 def dashboard_view(request):
-    total_devices = Device.objects.count()
-    total_staff = StaffRecord.objects.count()
-    borrowed_devices = BorrowRecord.objects.filter(date_returned__isnull=True).count()
-    available_devices = Device.objects.filter(status='available').count()
-    
-    recent_borrowed = BorrowRecord.objects.filter(date_returned__isnull=True).order_by('-date_issued')[:5]
-    recent_returns = BorrowRecord.objects.filter(date_returned__isnull=False).order_by('-date_returned')[:5]
+    counters = read_counters()
     
-    device_status_counts = Device.objects.values('status').annotate(count=models.Count('id')).order_by('-count')
+    recent_borrowed = BorrowRecord.objects.filter(date_returned__isnull=True).select_related('staff', 'device').order_by('-date_issued')[:5]
+    recent_returns = BorrowRecord.objects.filter(date_returned__isnull=False).select_related('staff', 'device').order_by('-date_returned')[:5]
     
     context = {
-        'total_devices': total_devices,
-        'total_staff': total_staff,
-        'borrowed_devices': borrowed_devices,
-        'available_devices': available_devices,
+        'total_devices': counters.get('devices', 0),
+        'total_staff': counters.get('staff', 0),
+        'active_staff': counters.get('staff:active', 0),
+        'borrowed_devices': counters.get('borrows:open', 0),
+        'available_devices': counters.get('devices:available', 0),
         'recent_borrowed': recent_borrowed,
         'recent_returns': recent_returns,
-        'device_status_counts': device_status_counts,
+        'device_status_counts': device_status_counts(counters),
     }
     return render(request, 'dashboard.html', context)
 
@@ -952,6 +1149,7 @@ def dashboard_view(request):
 
 CustomUser = get_user_model()
 
+@query_budget(7)
 @login_required
 def history_log(request):
     logs = HistoryLog.objects.all().select_related('user').order_by('-timestamp')
@@ -959,29 +1157,29 @@ def history_log(request):
     action_filter = request.GET.get('action')
     model_filter = request.GET.get('model')
     user_filter = request.GET.get('user')
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
     
     if action_filter:
         logs = logs.filter(action=action_filter)
     if model_filter:
         logs = logs.filter(model_name=model_filter)
     if user_filter:
-        logs = logs.filter(user__email=user_filter)
-    if date_from:
-        logs = logs.filter(timestamp__date__gte=date_from)
-    if date_to:
-        logs = logs.filter(timestamp__date__lte=date_to)
+        # A scalar subquery rather than a join, so the (user, timestamp)
+        # index returns the rows already in order.
+        logs = logs.filter(user=CustomUser.objects.filter(email=user_filter).values('pk')[:1])
+    logs = filter_request_days(request, logs, 'timestamp', 'date_from', 'date_to')
+
+    archived = archived_history(request.GET)
+    if archived is not None:
+        logs = LogsWithArchive(logs, archived)
     
-    paginator = Paginator(logs, 25)  
+    paginator = EstimatedCountPaginator(logs, 25)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
     context = {
         'page_obj': page_obj,
-        'action_choices': HistoryLog.ACTION_CHOICES,
-        'model_choices': sorted(set(HistoryLog.objects.values_list('model_name', flat=True))),
-        'user_choices': CustomUser.objects.filter(historylog__isnull=False).distinct(),
+        'page_range': _page_window(page_obj),
+        **filter_choices(read_facets()),
     }
     return render(request, 'history_log.html', context)
 
@@ -1001,63 +1199,143 @@ def delete_history_log(request, log_id):
 @login_required
 def clear_history_logs(request):
     try:
-        count = HistoryLog.objects.all().count()
-        HistoryLog.objects.all().delete()
+        count = truncate_history()
         return JsonResponse({'success': True, 'count': count})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-@login_required
-def export_history_excel(request):
+def filter_history_export(params):
     logs = HistoryLog.objects.all().select_related('user').order_by('-timestamp')
     
-    action_filter = request.GET.get('action')
-    model_filter = request.GET.get('model')
-    user_filter = request.GET.get('user')
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
+    action_filter = params.get('action')
+    model_filter = params.get('model')
+    user_filter = params.get('user')
+    date_from = params.get('date_from')
+    date_to = params.get('date_to')
     
     if action_filter:
         logs = logs.filter(action=action_filter)
     if model_filter:
         logs = logs.filter(model_name=model_filter)
     if user_filter:
-        logs = logs.filter(user__email=user_filter)
-    if date_from:
-        logs = logs.filter(timestamp__date__gte=date_from)
-    if date_to:
-        logs = logs.filter(timestamp__date__lte=date_to)
-
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "History Log"
-    
+        # A scalar subquery rather than a join, so the (user, timestamp)
+        # index returns the rows already in order.
+        logs = logs.filter(user=CustomUser.objects.filter(email=user_filter).values('pk')[:1])
+    try:
+        logs = filter_days(logs, 'timestamp', date_from, date_to)
+    except InvalidDate:
+        pass
+
+    details = (
+        f"Exported history logs with filters: action={action_filter}, model={model_filter}, "
+        f"user={user_filter}, date_from={date_from}, date_to={date_to}"
+    )
+    return logs, details
 
+def archived_history(params):
+    """
+    ArchiveSearch over the same filters as filter_history_export() when
+    date_from reaches back into an archived month, otherwise None.
+    """
+    try:
+        start, end = day_range(params.get('date_from'), params.get('date_to'))
+    except InvalidDate:
+        return None
+    if start is None:
+        return None
+
+    archived = ArchiveSearch(
+        action=params.get('action') or None,
+        model_name=params.get('model') or None,
+        user_email=params.get('user') or None,
+        start=start,
+        end=end,
+    )
+    return archived if archived.months else None
+
+def history_export_sheets(logs, archived=None):
     headers = [
         'Timestamp', 'User', 'Action', 'Model', 
         'Details', 'IP Address', 'Object ID'
     ]
-    ws.append(headers)
-    
+    action_labels = dict(HistoryLog.ACTION_CHOICES)
+
+    fields = ('timestamp', 'user__email', 'action', 'model_name', 'details', 'ip_address', 'object_id')
+    source = queryset_rows(logs, *fields)
+    if archived is not None:
+        source = chain(source, archived.rows(*fields))
+
+    rows = (
+        [
+            timestamp.strftime('%Y-%m-%d %H:%M'),
+            user_email or 'System',
+            action_labels.get(action, action),
+            model_name,
+            details,
+            ip_address or '-',
+            object_id or '-'
+        ]
+        for timestamp, user_email, action, model_name, details, ip_address, object_id in source
+    )
 
-    for log in logs:
-        ws.append([
-            log.timestamp.strftime('%Y-%m-%d %H:%M'),
-            log.user.email if log.user else 'System',
-            log.get_action_display(),
-            log.model_name,
-            log.details,
-            log.ip_address or '-',
-            log.object_id or '-'
-        ])
-    
+    return [Sheet("History Log", headers, rows)]
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=history_log_export.xlsx'
-    wb.save(response)
-    
-    return response
+@login_required
+def export_history_excel(request):
+    logs, _ = filter_history_export(request.GET)
+    archived = archived_history(request.GET)
+
+    export_format = request.GET.get('format', '')
+    if export_format in COPY_FORMATS:
+        return copy_response('history_log_export', logs, [
+            ('Timestamp', 'timestamp'),
+            ('User', 'user__email'),
+            ('Action', 'action'),
+            ('Model', 'model_name'),
+            ('Details', 'details'),
+            ('IP Address', 'ip_address'),
+            ('Object ID', 'object_id'),
+        ], export_format, extra_rows=archived.rows(
+            'timestamp', 'user__email', 'action', 'model_name', 'details', 'ip_address', 'object_id'
+        ) if archived is not None else None)
+
+    return xlsx_response('history_log_export.xlsx', history_export_sheets(logs, archived))
+
+@require_POST
+@login_required
+def start_export_job(request, kind):
+    if kind not in dict(ExportJob.KIND_CHOICES):
+        raise Http404("Unknown export")
+
+    ip_address, _ = get_client_ip(request)
+    job = submit_export_job(request.user, kind, request.GET.dict(), ip_address)
+    return JsonResponse({
+        'id': job.id,
+        'status_url': reverse('export_job_status', args=[job.id]),
+    }, status=202)
+
+@login_required
+def export_job_status(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+    if fail_stale_export_jobs(ExportJob.objects.filter(pk=job.pk)):
+        job.refresh_from_db()
+    return JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_written': job.rows_written,
+        'rows_total': job.rows_total,
+        'error': job.error,
+        'download_url': reverse('download_export_job', args=[job.id]) if job.status == 'done' else None,
+        'expires_at': job.expires_at,
+    })
 
+@login_required
+def download_export_job(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user, status='done')
+    if not job.file or job.expires_at <= timezone.now():
+        raise Http404("This export has expired")
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=os.path.basename(job.file.name))
 
 
 
@@ -1069,6 +1347,9 @@ def export_history_excel(request):
 
 
 
+
+
+@query_budget(5)
 @login_required
 def location_list(request):
     query = request.GET.get("q", "")
@@ -1081,25 +1362,7 @@ def location_list(request):
     if query:
         locations = locations.filter(name__icontains=query)
     
-    if start_date and end_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            locations = locations.filter(created_at__date__range=[start_date, end_date])
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
-    elif start_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            locations = locations.filter(created_at__date__gte=start_date)
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
-    elif end_date:
-        try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            locations = locations.filter(created_at__date__lte=end_date)
-        except ValueError:
-            messages.error(request, "Invalid date format. Please use YYYY-MM-DD.")
+    locations = filter_request_days(request, locations, 'created_at')
 
     paginator = Paginator(locations, 15)
     try:
@@ -1170,6 +1433,7 @@ def delete_location(request, pk):
 def export_location_excel(request):
     query = request.GET.get("q", "")
     locations = Location.objects.filter(name__icontains=query) if query else Location.objects.all().order_by('-created_at')
+    locations = filter_request_days(request, locations, 'created_at')
 
     log_action(
         request,
@@ -1179,18 +1443,18 @@ def export_location_excel(request):
         f"Exported location records with filter: query={query}"
     )
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Locations"
-    ws.append(["Location Name", "Date Created"])
-
-    for loc in locations:
-        ws.append([
-            loc.name,
-            loc.created_at.strftime("%Y-%m-%d %H:%M:%S") if loc.created_at else ''
-        ])
-
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename=locations.xlsx'
-    wb.save(response)
-    return response
\ No newline at end of file
+    export_format = request.GET.get("format", "")
+    if export_format in COPY_FORMATS:
+        return copy_response('locations', locations, [
+            ("Location Name", 'name'),
+            ("Date Created", 'created_at'),
+        ], export_format)
+
+    rows = (
+        [name, created_at.strftime("%Y-%m-%d %H:%M:%S") if created_at else '']
+        for name, created_at in queryset_rows(locations, 'name', 'created_at')
+    )
+
+    return xlsx_response('locations.xlsx', [
+        Sheet("Locations", ["Location Name", "Date Created"], rows),
+    ])
\ No newline at end of file